@@ -16,8 +16,20 @@ class LinearFeatureBaseline(Baseline):
     def set_param_values(self, val, **tags):
         self._coeffs = val
 
+    def _observations(self, path):
+        """
+        Observations of the path as features: one row per step, clipped to [-10, 10]. Stacks of uint8 frames
+        (AtariEnv with uint8_frame_stack) are flattened and rescaled to [-1, 1], as the env rescales them otherwise.
+        """
+        o = path["observations"]
+        if o.ndim > 2:
+            o = np.reshape(o, (len(o), -1))
+        if o.dtype == np.uint8:
+            o = (o / 255.0) * 2.0 - 1.0
+        return np.clip(o, -10, 10)
+
     def _features(self, path):
-        o = np.clip(path["observations"], -10, 10)
+        o = self._observations(path)
         l = len(path["rewards"])
         al = np.arange(l).reshape(-1, 1) / 100.0
         return np.concatenate([o, o ** 2, al, al ** 2, al ** 3, np.ones((l, 1))], axis=1)
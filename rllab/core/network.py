@@ -278,7 +278,11 @@ class ConvNetwork(object):
                  # conv_W_init=LI.GlorotUniform(), conv_b_init=LI.Constant(0.),
                  hidden_nonlinearity=LN.rectify,
                  output_nonlinearity=LN.softmax,
-                 name=None, input_var=None):
+                 name=None, input_var=None, uint8_input=False):
+        """
+        :param uint8_input: whether the inputs are frames in [0, 255] (e.g. from AtariEnv with uint8_frame_stack),
+        which are rescaled to [-1, 1] in the graph
+        """
 
         if name is None:
             prefix = ""
@@ -295,6 +299,8 @@ class ConvNetwork(object):
         else:
             l_in = L.InputLayer(shape=(None,) + input_shape, input_var=input_var)
             l_hid = l_in
+        if uint8_input:
+            l_hid = L.ExpressionLayer(l_hid, lambda x: x * (2.0 / 255.0) - 1.0)
         for idx, conv_filter, filter_size, stride, pad in zip(
                 range(len(conv_filters)),
                 conv_filters,
@@ -68,6 +68,22 @@ def stack_tensor_list(tensor_list):
     # return np.vstack(tensor_list)
 
 
+def stack_frame_windows(frames, n_frames):
+    """
+    Flattened stacks of n_frames consecutive frames, as a read-only strided view of frames: row t is
+    frames[t:t + n_frames].ravel(), so each frame is stored once instead of n_frames times.
+    """
+    frames = np.ascontiguousarray(frames)
+    frame_size = int(np.prod(frames.shape[1:]))
+    windows = np.lib.stride_tricks.as_strided(
+        frames,
+        shape=(len(frames) - n_frames + 1, n_frames * frame_size),
+        strides=(frame_size * frames.itemsize, frames.itemsize),
+    )
+    windows.flags.writeable = False
+    return windows
+
+
 def stack_tensor_dict_list(tensor_dict_list):
     """
     Stack a list of dictionaries of {tensors or dictionary of tensors}.
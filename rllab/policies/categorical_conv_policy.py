@@ -27,6 +27,7 @@ class CategoricalConvPolicy(StochasticPolicy, LasagnePowered, Serializable):
             prob_network=None,
             feature_layer_index=-2,
             eps=0,
+            uint8_observations=False,
     ):
         """
         The policy consists of several convolution layers followed by fc layers and softmax
@@ -38,6 +39,8 @@ class CategoricalConvPolicy(StochasticPolicy, LasagnePowered, Serializable):
         are ignored
         :param feature_layer_index: index of the feature layer. Default -2 means the last layer before fc-softmax
         :param eps: mixture weight on uniform distribution; useful to force exploration
+        :param uint8_observations: whether observations are uint8 frames (AtariEnv with uint8_frame_stack); they are
+        converted and rescaled to [-1, 1] by the network, once per batch
         :return:
         """
         Serializable.quick_init(self, locals())
@@ -58,6 +61,7 @@ class CategoricalConvPolicy(StochasticPolicy, LasagnePowered, Serializable):
                 hidden_nonlinearity=hidden_nonlinearity,
                 output_nonlinearity=NL.softmax,
                 name="prob_network",
+                uint8_input=uint8_observations,
             )
 
         self._l_prob = prob_network.output_layer
@@ -1,11 +1,15 @@
 from rllab.sampler.utils import rollout
 from rllab.sampler.stateful_pool import singleton_pool, SharedGlobal
+from rllab.sampler.shm_transport import ParamBroadcast
 from rllab.misc import ext
 from rllab.misc import logger
 from rllab.misc import tensor_utils
 import pickle
 import numpy as np
 
+# ParamBroadcast of the policy parameters of each populated scope, when there are workers
+_param_broadcasts = dict()
+
 
 def _worker_init(G, id):
     if singleton_pool.n_parallel > 1:
@@ -15,8 +19,12 @@ def _worker_init(G, id):
     G.worker_id = id
 
 
-def initialize(n_parallel):
-    singleton_pool.initialize(n_parallel)
+def initialize(n_parallel, path_transport="pickle"):
+    """
+    :param path_transport: "shm" returns the arrays of the sampled paths through shared memory instead of pickling
+    them (see StatefulPool.initialize)
+    """
+    singleton_pool.initialize(n_parallel, transport=path_transport)
     singleton_pool.run_each(_worker_init, [(id,) for id in range(singleton_pool.n_parallel)])
 
 
@@ -31,10 +39,13 @@ def _get_scoped_G(G, scope):
     return G.scopes[scope]
 
 
-def _worker_populate_task(G, env, policy, scope=None):
+def _worker_populate_task(G, env, policy, scope=None, param_broadcast=None):
     G = _get_scoped_G(G, scope)
     G.env = pickle.loads(env)
     G.policy = pickle.loads(policy)
+    G.param_broadcast = param_broadcast
+    # the pickled policy has the parameters of the current version
+    G.param_version = None if param_broadcast is None else int(param_broadcast.version[0])
 
 
 def _worker_terminate_task(G, scope=None):
@@ -45,15 +56,24 @@ def _worker_terminate_task(G, scope=None):
     if getattr(G, "policy", None):
         G.policy.terminate()
         G.policy = None
+    G.param_broadcast = None
 
 
 def populate_task(env, policy, scope=None):
     logger.log("Populating workers...")
     if singleton_pool.n_parallel > 1:
-        singleton_pool.run_each(
-            _worker_populate_task,
-            [(pickle.dumps(env), pickle.dumps(policy), scope)] * singleton_pool.n_parallel
-        )
+        params = policy.get_param_values()
+        param_broadcast = ParamBroadcast(len(params), params.dtype)
+        param_broadcast.write(params)
+        try:
+            singleton_pool.run_each(
+                _worker_populate_task,
+                [(pickle.dumps(env), pickle.dumps(policy), scope, param_broadcast)] * singleton_pool.n_parallel
+            )
+        finally:
+            # every worker has mapped the file
+            param_broadcast.unlink()
+        _param_broadcasts[scope] = param_broadcast
     else:
         # avoid unnecessary copying
         G = _get_scoped_G(singleton_pool.G, scope)
@@ -63,6 +83,7 @@ def populate_task(env, policy, scope=None):
 
 
 def terminate_task(scope=None):
+    _param_broadcasts.pop(scope, None)
     singleton_pool.run_each(
         _worker_terminate_task,
         [(scope,)] * singleton_pool.n_parallel
@@ -89,13 +110,24 @@ def _worker_set_env_params(G,params,scope=None):
     G = _get_scoped_G(G, scope)
     G.env.set_param_values(params)
 
+def _worker_update_policy_params(G):
+    """ picks up the parameters last broadcast by sample_paths, if the policy does not have them yet """
+    if getattr(G, "param_broadcast", None) is None:
+        return
+    update = G.param_broadcast.read_if_newer(G.param_version)
+    if update is not None:
+        G.param_version, params = update
+        G.policy.set_param_values(params)
+
 def _worker_collect_one_path(G, max_path_length, scope=None):
     G = _get_scoped_G(G, scope)
+    _worker_update_policy_params(G)
     path = rollout(G.env, G.policy, max_path_length)
     return path, len(path["rewards"])
 
 def _worker_collect_one_path_snn(G, max_path_length, switch_lat_every=0, scope=None):
     G = _get_scoped_G(G, scope)
+    _worker_update_policy_params(G)
     path = rollout_snn(G.env, G.policy, max_path_length, switch_lat_every=switch_lat_every)
     return path, len(path["rewards"])
 
@@ -113,10 +145,14 @@ def sample_paths(
     :param max_path_length: horizon / maximum length of a single trajectory
     :return: a list of collected paths
     """
-    singleton_pool.run_each(
-        _worker_set_policy_params,
-        [(policy_params, scope)] * singleton_pool.n_parallel
-    )
+    if scope in _param_broadcasts:
+        # the workers pick them up at the start of their next rollout
+        _param_broadcasts[scope].write(policy_params)
+    else:
+        singleton_pool.run_each(
+            _worker_set_policy_params,
+            [(policy_params, scope)] * singleton_pool.n_parallel
+        )
     if env_params is not None:
         singleton_pool.run_each(
             _worker_set_env_params,
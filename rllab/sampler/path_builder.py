@@ -0,0 +1,147 @@
+import numpy as np
+
+# initial buffers take at most this many bytes, whatever the size hint
+MAX_INITIAL_BUFFER_BYTES = 16 * 1024 ** 2
+
+
+class TensorBuffer(object):
+    """
+    The values of one field over the steps of a path, written into a preallocated array whose shape and dtype are
+    those of the first value. When the array is full, a new one as large as all previous ones together is allocated,
+    and get() concatenates them; the full arrays are not copied while sampling, which would take three times the
+    memory of the values at the time. The dtype is promoted if a later value needs it (e.g. a float reward after int
+    ones). Values of another shape fall back to a list, stacked by get() as tensor_utils.stack_tensor_list does.
+    """
+
+    def __init__(self, first_value, size_hint=None):
+        first_value = np.asarray(first_value)
+        dtype = first_value.dtype
+        if dtype.kind in "USO":
+            # strings and arbitrary objects, e.g. ALE ids or states
+            dtype = np.dtype(object)
+        row_bytes = max(first_value.size * dtype.itemsize, 1)
+        if size_hint is None or np.isinf(size_hint):
+            capacity = 64
+        else:
+            capacity = int(max(1, min(size_hint, MAX_INITIAL_BUFFER_BYTES // row_bytes)))
+        self.buffer = np.empty((capacity,) + first_value.shape, dtype=dtype)
+        self.shape = first_value.shape
+        # full buffers
+        self.chunks = []
+        self.list = None
+        self.n = 0
+
+    def append(self, value):
+        if self.list is not None:
+            self.list.append(value)
+            return
+        if self.n == len(self.buffer):
+            self.chunks.append(self.buffer)
+            n_values = sum(len(chunk) for chunk in self.chunks)
+            self.buffer = np.empty((n_values,) + self.shape, dtype=self.buffer.dtype)
+            self.n = 0
+        if self.buffer.dtype != object:
+            array = np.asarray(value)
+            if array.shape != self.shape:
+                self._fall_back_to_list(value)
+                return
+            if array.dtype != self.buffer.dtype:
+                if array.dtype.kind in "USO":
+                    self._fall_back_to_list(value)
+                    return
+                dtype = np.promote_types(self.buffer.dtype, array.dtype)
+                if dtype != self.buffer.dtype:
+                    self.chunks = [chunk.astype(dtype) for chunk in self.chunks]
+                    self.buffer = self.buffer.astype(dtype)
+            self.buffer[self.n] = array
+        elif self.shape == ():
+            self.buffer[self.n] = value
+        else:
+            self._fall_back_to_list(value)
+            return
+        self.n += 1
+
+    def _values(self):
+        return self.chunks + [self.buffer[:self.n]]
+
+    def _fall_back_to_list(self, value):
+        self.list = [x for values in self._values() for x in values] + [value]
+        self.chunks = []
+        self.buffer = None
+
+    def last(self):
+        if self.list is not None:
+            return self.list[-1]
+        if self.n == 0:
+            return self.chunks[-1][-1]
+        return self.buffer[self.n - 1]
+
+    def get(self):
+        """
+        The values of all steps. If they fit in the first buffer and fill at least half of it, this is a view of the
+        buffer; otherwise it is a copy, so that short paths do not keep large buffers alive.
+        """
+        if self.list is not None:
+            return np.array(self.list)
+        if len(self.chunks) > 0:
+            return np.concatenate(self._values())
+        if 2 * self.n >= len(self.buffer):
+            return self.buffer[:self.n]
+        return self.buffer[:self.n].copy()
+
+
+class TensorDictBuffer(object):
+    """
+    TensorBuffers for the keys of a (nested) dictionary of tensors, e.g. agent_infos or env_infos; the keys are those
+    of the first dictionary.
+    """
+
+    def __init__(self, first_dict, size_hint=None):
+        self.buffers = dict(
+            (k, make_buffer(v, size_hint))
+            for k, v in first_dict.items()
+        )
+
+    def append(self, value):
+        for k, buffer in self.buffers.items():
+            buffer.append(value[k])
+
+    def last(self):
+        return dict((k, buffer.last()) for k, buffer in self.buffers.items())
+
+    def get(self):
+        return dict((k, buffer.get()) for k, buffer in self.buffers.items())
+
+
+def make_buffer(first_value, size_hint=None):
+    if isinstance(first_value, dict):
+        return TensorDictBuffer(first_value, size_hint)
+    return TensorBuffer(first_value, size_hint)
+
+
+class PathBuilder(object):
+    """
+    Collects the fields of a path step by step into preallocated buffers, instead of lists of per-step values stacked
+    at the end of the path.
+    :param size_hint: expected number of values per field (e.g. max_path_length), used to size the buffers
+    """
+
+    def __init__(self, size_hint=None):
+        self.size_hint = size_hint
+        self.buffers = dict()
+
+    def append(self, field, value):
+        """ value is a tensor or a dictionary of tensors, as in the first step """
+        buffer = self.buffers.get(field)
+        if buffer is None:
+            self.buffers[field] = make_buffer(value, self.size_hint)
+        self.buffers[field].append(value)
+
+    def last(self, field):
+        return self.buffers[field].last()
+
+    def get(self, field, default=None):
+        """ the stacked values of a field, or default if nothing has been appended to it """
+        if field not in self.buffers:
+            return default
+        return self.buffers[field].get()
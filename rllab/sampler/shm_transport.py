@@ -0,0 +1,164 @@
+import multiprocessing as mp
+import numpy as np
+import os
+import tempfile
+from collections import namedtuple
+
+# arrays smaller than this are pickled along with the descriptors
+MIN_SHARED_BYTES = 1024
+# offsets of the arrays in a segment are multiples of this
+ALIGNMENT = 64
+
+# an array written into a segment, at the given offset in bytes
+ArrayDescriptor = namedtuple("ArrayDescriptor", ["offset", "dtype", "shape"])
+
+
+def default_segment_dir():
+    """ /dev/shm where it exists, so that segments stay in memory; the temp dir otherwise """
+    if os.path.isdir("/dev/shm"):
+        return "/dev/shm"
+    return tempfile.gettempdir()
+
+
+class SharedCounter(object):
+    """
+    An integer in shared memory with its own lock, in place of a Manager Value and RLock, which take a round trip
+    to the manager process for each access. Like mp.RawValue, it has to be created before the workers are forked.
+    """
+
+    def __init__(self, value=0):
+        self._value = mp.RawValue('l', value)
+        self._lock = mp.Lock()
+
+    @property
+    def value(self):
+        # reads are atomic for an aligned long; only the updates take the lock
+        return self._value.value
+
+    def reset(self, value=0):
+        with self._lock:
+            self._value.value = value
+
+    def add(self, increment):
+        """ :return: the value after the increment """
+        with self._lock:
+            self._value.value += increment
+            return self._value.value
+
+
+def _map_arrays(obj, fn):
+    if isinstance(obj, np.ndarray):
+        return fn(obj)
+    if isinstance(obj, dict):
+        return dict((k, _map_arrays(v, fn)) for k, v in obj.items())
+    if type(obj) in (list, tuple):
+        return type(obj)(_map_arrays(x, fn) for x in obj)
+    return obj
+
+
+def pack(obj, segment_dir=None):
+    """
+    Writes the numeric arrays of obj (nested in dicts, lists and tuples, e.g. a list of paths) into one file in
+    segment_dir, and replaces them by ArrayDescriptors.
+    :return: the file name (None if no array was written) and obj with the descriptors
+    """
+    arrays = []
+
+    def describe(array):
+        if array.dtype.kind not in "biufc" or array.nbytes < MIN_SHARED_BYTES:
+            return array
+        offset = 0
+        if len(arrays) > 0:
+            last_offset, last_array = arrays[-1]
+            offset = -(-(last_offset + last_array.nbytes) // ALIGNMENT) * ALIGNMENT
+        arrays.append((offset, array))
+        return ArrayDescriptor(offset, array.dtype.str, array.shape)
+
+    packed = _map_arrays(obj, describe)
+    if len(arrays) == 0:
+        return None, packed
+    fd, file_name = tempfile.mkstemp(prefix="rllab_paths_", suffix=".dat", dir=segment_dir or default_segment_dir())
+    with os.fdopen(fd, "wb") as f:
+        for offset, array in arrays:
+            f.seek(offset)
+            f.write(np.ascontiguousarray(array).data)
+    return file_name, packed
+
+
+def unpack(file_name, packed):
+    """
+    Maps the file written by pack and replaces the descriptors in packed by views of it. The file is removed; its
+    memory is released when the last view is gone.
+    """
+    if file_name is None:
+        return packed
+    try:
+        segment = np.asarray(np.memmap(file_name, dtype=np.uint8, mode="r+"))
+    finally:
+        os.remove(file_name)
+
+    def restore(obj):
+        if isinstance(obj, ArrayDescriptor):
+            dtype = np.dtype(obj.dtype)
+            n_bytes = int(np.prod(obj.shape)) * dtype.itemsize
+            return segment[obj.offset:obj.offset + n_bytes].view(dtype).reshape(obj.shape)
+        if isinstance(obj, dict):
+            return dict((k, restore(v)) for k, v in obj.items())
+        if type(obj) in (list, tuple):
+            return type(obj)(restore(x) for x in obj)
+        return obj
+
+    return restore(packed)
+
+
+class ParamBroadcast(object):
+    """
+    A flat parameter vector with a version number, in a file in segment_dir mapped by the master and the workers.
+    The master write()s new parameters; a worker calls read_if_newer() when it needs them (e.g. at the start of a
+    rollout), so that broadcasting does not wait for the workers. The master must not write while the workers read,
+    which holds when it only writes between two run_collect calls.
+    Pickling sends the file name, so the file has to exist until every worker has unpickled the broadcast; after
+    that, unlink() removes it and the mappings stay valid.
+    """
+
+    def __init__(self, size, dtype=np.float64, segment_dir=None):
+        self.size = size
+        self.dtype = np.dtype(dtype)
+        fd, self.file_name = tempfile.mkstemp(
+            prefix="rllab_params_", suffix=".dat", dir=segment_dir or default_segment_dir())
+        with os.fdopen(fd, "wb") as f:
+            # the version takes the first 8 bytes
+            f.truncate(8 + size * self.dtype.itemsize)
+        self._open()
+
+    def _open(self):
+        segment = np.memmap(self.file_name, dtype=np.uint8, mode="r+")
+        self.version = segment[:8].view(np.int64)
+        self.params = segment[8:].view(self.dtype)
+
+    def __getstate__(self):
+        return dict(size=self.size, dtype=self.dtype.str, file_name=self.file_name)
+
+    def __setstate__(self, d):
+        self.size = d["size"]
+        self.dtype = np.dtype(d["dtype"])
+        self.file_name = d["file_name"]
+        self._open()
+
+    def write(self, params):
+        self.params[:] = params
+        self.version[0] += 1
+
+    def read_if_newer(self, version):
+        """
+        :param version: version of the parameters the caller has
+        :return: the current version and a copy of the parameters, or None if they are not newer
+        """
+        current_version = int(self.version[0])
+        if current_version == version:
+            return None
+        return current_version, np.array(self.params)
+
+    def unlink(self):
+        if os.path.exists(self.file_name):
+            os.remove(self.file_name)
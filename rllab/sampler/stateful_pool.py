@@ -1,6 +1,7 @@
 from joblib.pool import MemmapingPool
 import multiprocessing as mp
 from rllab.misc import logger
+from rllab.sampler import shm_transport
 import pyprind
 import time
 import traceback
@@ -41,10 +42,21 @@ class StatefulPool(object):
         self.pool = None
         self.queue = None
         self.worker_queue = None
+        self.counter = None
+        self.transport = "pickle"
+        self.segment_dir = None
         self.G = SharedGlobal()
 
-    def initialize(self, n_parallel):
+    def initialize(self, n_parallel, transport="pickle", segment_dir=None):
+        """
+        :param transport: how run_collect returns the collected objects from the workers. "pickle" sends them through
+        the pool's result pipe; "shm" writes their numeric arrays into files in segment_dir (/dev/shm by default), which
+        the master maps, and only pickles the rest.
+        """
+        assert transport in ["pickle", "shm"]
         self.n_parallel = n_parallel
+        self.transport = transport
+        self.segment_dir = segment_dir
         if self.pool is not None:
             print("Warning: terminating existing pool")
             self.pool.terminate()
@@ -54,6 +66,8 @@ class StatefulPool(object):
         if n_parallel > 1:
             self.queue = mp.Queue()
             self.worker_queue = mp.Queue()
+            # shared with the workers by forking
+            self.counter = shm_transport.SharedCounter()
             # FIXME: memmap is slow.
             # self.pool = MemmapingPool(
             #     self.n_parallel,
@@ -122,29 +136,29 @@ class StatefulPool(object):
         if args is None:
             args = tuple()
         if self.pool:
-            manager = mp.Manager()
-            counter = manager.Value('i', 0)
-            lock = manager.RLock()
+            self.counter.reset()
             results = self.pool.map_async(
                 _worker_run_collect,
-                [(collect_once, counter, lock, threshold, args)] * self.n_parallel
+                [(collect_once, threshold, args, self.transport, self.segment_dir)] * self.n_parallel
             )
             if show_prog_bar:
                 pbar = ProgBarCounter(threshold)
             last_value = 0
             while True:
-                time.sleep(0.1)
-                with lock:
-                    if counter.value >= threshold:
-                        if show_prog_bar:
-                            pbar.stop()
-                        break
+                results.wait(0.1)
+                value = self.counter.value
+                if value >= threshold or results.ready():
                     if show_prog_bar:
-                        pbar.inc(counter.value - last_value)
-                    last_value = counter.value
+                        pbar.stop()
+                    break
+                if show_prog_bar:
+                    pbar.inc(value - last_value)
+                last_value = value
             print('Done sampling.')
             start = time.time()
-            out = sum(results.get(), [])
+            out = []
+            for file_name, collected in results.get():
+                out.extend(shm_transport.unpack(file_name, collected))
             stop = time.time()
             print('Returning results ({} sec).'.format(stop - start))
             return out
@@ -181,18 +195,17 @@ def _worker_run_each(all_args):
 
 def _worker_run_collect(all_args):
     try:
-        collect_once, counter, lock, threshold, args = all_args
+        collect_once, threshold, args, transport, segment_dir = all_args
+        counter = singleton_pool.counter
         collected = []
-        while True:
-            with lock:
-                if counter.value >= threshold:
-                    return collected
+        while counter.value < threshold:
             result, inc = collect_once(singleton_pool.G, *args)
             collected.append(result)
-            with lock:
-                counter.value += inc
-                if counter.value >= threshold:
-                    return collected
+            if counter.add(inc) >= threshold:
+                break
+        if transport == "shm":
+            return shm_transport.pack(collected, segment_dir)
+        return None, collected
     except Exception:
         raise Exception("".join(traceback.format_exception(*sys.exc_info())))
 
@@ -1,14 +1,49 @@
 import numpy as np
 from rllab.misc import tensor_utils
+from rllab.sampler.path_builder import PathBuilder
 import time
 
 
-def rollout(env, agent, max_path_length=np.inf, animated=False, speedup=1):
-    observations = []
-    actions = []
-    rewards = []
-    agent_infos = []
-    env_infos = []
+def rollout(env, agent, max_path_length=np.inf, animated=False, speedup=1,
+            key_computations=None, key_chunk_size=1, drop_env_infos=(), stacked_frames=False,
+            step_claimer=None, claim_chunk_size=100):
+    """
+    :param key_computations: optional list of (fields, count_target, compute_keys_list), where count_target is
+    "observations" or a key of env_info and compute_keys_list maps a batch of count targets to one array of keys
+    per field. The keys are computed every key_chunk_size steps while sampling and stored as path[field].
+    :param drop_env_infos: keys of env_info that are not stored in the path (e.g. count targets that are only
+    needed to compute the keys)
+    :param stacked_frames: whether observations are stacks of frames along their first axis that shift by one frame
+    per step (e.g. AtariEnv with uint8_frame_stack). Each frame is then stored once in path["frames"], and
+    path["observations"] is a strided view of it.
+    :param step_claimer: optional function called with the number of steps taken since its last call, every
+    claim_chunk_size steps and at the end of the path (e.g. a StepClaimer). The path ends when it returns False.
+
+    Envs with path_env_infos() (e.g. AtariEnv) record some env_info fields into arrays of the path rather than into
+    the env_info of each step; they are added to path["env_infos"] at the end of the path.
+    """
+    if key_computations is None:
+        key_computations = []
+    # count targets of the steps since the last key computation
+    pending_targets = dict((count_target, []) for _, count_target, _ in key_computations)
+    # count targets that the env records into arrays of the path
+    recorded_targets = set()
+    keys = dict((field, []) for fields, _, _ in key_computations for field in fields)
+    path_env_infos = getattr(env, "path_env_infos", None)
+
+    def compute_pending_keys(start, end):
+        for fields, count_target, compute_keys_list in key_computations:
+            if count_target in recorded_targets:
+                targets = env.recorded_env_info(count_target)[start:end]
+            else:
+                targets = np.asarray(pending_targets[count_target])
+            new_keys_list = compute_keys_list(targets)
+            for field, new_keys in zip(fields, new_keys_list):
+                keys[field].append(np.asarray(new_keys))
+        for targets in pending_targets.values():
+            del targets[:]
+
+    path_builder = PathBuilder(size_hint=max_path_length)
     o = env.reset()
     agent.reset()
     path_length = 0
@@ -17,12 +52,36 @@ def rollout(env, agent, max_path_length=np.inf, animated=False, speedup=1):
     while path_length < max_path_length:
         a, agent_info = agent.get_action(o)
         next_o, r, d, env_info = env.step(a)
-        observations.append(env.observation_space.flatten(o))
-        rewards.append(r)
-        actions.append(env.action_space.flatten(a))
-        agent_infos.append(agent_info)
-        env_infos.append(env_info)
+        if not stacked_frames:
+            path_builder.append("observations", env.observation_space.flatten(o))
+        elif path_length == 0:
+            n_frames = len(o)
+            for frame in o:
+                path_builder.append("frames", frame)
+        else:
+            path_builder.append("frames", o[-1])
+        path_builder.append("rewards", r)
+        path_builder.append("actions", env.action_space.flatten(a))
+        path_builder.append("agent_infos", agent_info)
+        for count_target, targets in pending_targets.items():
+            if count_target == "observations":
+                if stacked_frames:
+                    targets.append(env.observation_space.flatten(o))
+                else:
+                    targets.append(path_builder.last("observations"))
+            elif count_target in env_info:
+                targets.append(env_info[count_target])
+            else:
+                recorded_targets.add(count_target)
+        if len(drop_env_infos) > 0:
+            env_info = dict((k, v) for k, v in env_info.items() if k not in drop_env_infos)
+        path_builder.append("env_infos", env_info)
         path_length += 1
+        if len(key_computations) > 0 and path_length % key_chunk_size == 0:
+            compute_pending_keys(path_length - key_chunk_size, path_length)
+        if step_claimer is not None and path_length % claim_chunk_size == 0:
+            if not step_claimer(claim_chunk_size):
+                break
         if d:
             break
         o = next_o
@@ -32,11 +91,134 @@ def rollout(env, agent, max_path_length=np.inf, animated=False, speedup=1):
             time.sleep(timestep / speedup)
     if animated:
         env.render(close=True)
+    if len(key_computations) > 0 and path_length % key_chunk_size != 0:
+        compute_pending_keys(path_length - path_length % key_chunk_size, path_length)
+    if step_claimer is not None and path_length % claim_chunk_size != 0:
+        step_claimer(path_length % claim_chunk_size)
 
-    return dict(
-        observations=tensor_utils.stack_tensor_list(observations),
-        actions=tensor_utils.stack_tensor_list(actions),
-        rewards=tensor_utils.stack_tensor_list(rewards),
-        agent_infos=tensor_utils.stack_tensor_dict_list(agent_infos),
-        env_infos=tensor_utils.stack_tensor_dict_list(env_infos),
+    path = dict(
+        observations=path_builder.get("observations", np.zeros(0)),
+        actions=path_builder.get("actions", np.zeros(0)),
+        rewards=path_builder.get("rewards", np.zeros(0)),
+        agent_infos=path_builder.get("agent_infos", dict()),
+        env_infos=path_builder.get("env_infos", dict()),
     )
+    if path_env_infos is not None:
+        for k, v in path_env_infos().items():
+            if k not in drop_env_infos:
+                path["env_infos"][k] = v
+    if stacked_frames and path_length > 0:
+        path["frames"] = path_builder.get("frames")
+        path["observations"] = tensor_utils.stack_frame_windows(path["frames"], n_frames)
+    for field, field_keys in keys.items():
+        path[field] = np.concatenate(field_keys)
+    return path
+
+
+class StepClaimer(object):
+    """
+    A step_claimer for rollout, for samplers that collect batch_size steps together (e.g. the work stealing mode of
+    WorkerBatchSampler in sandbox/haoran/parallel_trpo): the steps of the path are added to a SharedCounter of all
+    samplers, and the path ends once the counter reaches batch_size, unless keep_all.
+    n_kept is the number of steps of the path counted before batch_size (all of them if keep_all); the sampler
+    truncates the path to n_kept steps.
+    """
+
+    def __init__(self, counter, batch_size, keep_all=False):
+        self.counter = counter
+        self.batch_size = batch_size
+        self.keep_all = keep_all
+        self.n_kept = 0
+
+    def __call__(self, n_steps):
+        n_steps_left = self.batch_size - (self.counter.add(n_steps) - n_steps)
+        if self.keep_all:
+            self.n_kept += n_steps
+            return True
+        self.n_kept += min(n_steps, max(n_steps_left, 0))
+        return n_steps < n_steps_left
+
+
+def vectorized_rollout(vec_env, agent, n_samples, max_path_length=np.inf,
+                       key_computations=None, key_chunk_size=1, drop_env_infos=(), stacked_frames=False):
+    """
+    Sample paths from the envs of vec_env (e.g. VecAtariEnv) in lockstep, with one agent.get_actions() call per step
+    for all of them. vec_env resets an env as soon as its path is done; the paths still running once n_samples steps
+    have been taken in total are cut there, as if they had reached max_path_length, so that exactly n_samples steps
+    are returned (the last lockstep step is only kept for as many envs as needed).
+    The arguments are those of rollout, except that the keys of key_computations are computed at the end of each path.
+    :return: a list of paths, in the order they ended
+    """
+    assert not getattr(agent, "recurrent", False)
+    if key_computations is None:
+        key_computations = []
+
+    def end_path(i):
+        path_builder = path_builders[i]
+        path = dict(
+            observations=path_builder.get("observations"),
+            actions=path_builder.get("actions"),
+            rewards=path_builder.get("rewards"),
+            agent_infos=path_builder.get("agent_infos"),
+            env_infos=path_builder.get("env_infos"),
+        )
+        path_length = path_lengths[i]
+        if hasattr(vec_env, "path_env_infos"):
+            # (they may include the step of env i that was taken but not kept once n_samples was reached)
+            path["env_infos"].update(
+                (k, v[:path_length]) for k, v in vec_env.path_env_infos(i).items())
+        if stacked_frames:
+            path["frames"] = path_builder.get("frames")
+            path["observations"] = tensor_utils.stack_frame_windows(path["frames"], n_frames)
+        k = max(int(min(path_length, key_chunk_size)), 1)
+        for fields, count_target, compute_keys_list in key_computations:
+            if count_target == "observations":
+                targets = path["observations"]
+            else:
+                targets = path["env_infos"][count_target]
+            chunk_keys_list = [compute_keys_list(targets[start:start + k]) for start in range(0, path_length, k)]
+            for j, field in enumerate(fields):
+                path[field] = np.concatenate([np.asarray(keys_list[j]) for keys_list in chunk_keys_list])
+        for field in drop_env_infos:
+            path["env_infos"].pop(field, None)
+        paths.append(path)
+        path_builders[i] = PathBuilder(size_hint=max_path_length)
+        path_lengths[i] = 0
+
+    paths = []
+    path_builders = [PathBuilder(size_hint=max_path_length) for _ in range(vec_env.n_envs)]
+    path_lengths = [0] * vec_env.n_envs
+    observations = vec_env.reset()
+    n_frames = observations.shape[1]
+    agent.reset()
+    n_steps = 0
+    while n_steps < n_samples:
+        actions, agent_infos = agent.get_actions(observations)
+        next_observations, rewards, dones, env_infos = vec_env.step(actions)
+        for i, path_builder in enumerate(path_builders):
+            if not stacked_frames:
+                path_builder.append("observations", vec_env.observation_space.flatten(observations[i]))
+            elif path_lengths[i] == 0:
+                for frame in observations[i]:
+                    path_builder.append("frames", frame)
+            else:
+                path_builder.append("frames", observations[i][-1])
+            path_builder.append("actions", vec_env.action_space.flatten(actions[i]))
+            path_builder.append("rewards", rewards[i])
+            path_builder.append("agent_infos", dict((k, v[i]) for k, v in agent_infos.items()))
+            path_builder.append("env_infos", env_infos[i])
+            path_lengths[i] += 1
+            n_steps += 1
+            if dones[i]:
+                end_path(i)
+            elif path_lengths[i] >= max_path_length:
+                next_observations[i] = vec_env.reset_env(i)
+                end_path(i)
+            if n_steps == n_samples:
+                # (the steps of the remaining envs are dropped)
+                break
+        observations = next_observations
+    for i in range(vec_env.n_envs):
+        if path_lengths[i] > 0:
+            end_path(i)
+    return paths
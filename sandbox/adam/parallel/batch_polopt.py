@@ -1,6 +1,7 @@
 
 import multiprocessing as mp
 import numpy as np
+import time
 
 from rllab.algos.base import RLAlgorithm
 import rllab.misc.logger as logger
@@ -8,6 +9,8 @@ import rllab.plotter as plotter
 from rllab.misc import ext
 from sandbox.adam.parallel.sampler import WorkerBatchSampler
 from sandbox.adam.parallel.util import SimpleContainer
+from rllab.sampler.shm_transport import SharedCounter
+from sandbox.adam.parallel.sampling_pipeline import SamplingPipeline
 # from rllab.policies.base import Policy
 
 
@@ -41,6 +44,8 @@ class ParallelBatchPolopt(RLAlgorithm):
             set_cpu_affinity=False,
             cpu_assignments=None,
             serial_compile=True,
+            work_stealing=False,
+            sampling_staleness=0,
             **kwargs
     ):
         """
@@ -62,6 +67,11 @@ class ParallelBatchPolopt(RLAlgorithm):
         :param positive_adv: Whether to shift the advantages so that they are always positive. When used in
         conjunction with center_adv the advantages will be standardized before shifting.
         :param store_paths: Whether to save all paths data to the snapshot.
+        :param work_stealing: Whether the ranks collect batch_size samples together, each rank sampling until the
+        total reaches batch_size, instead of batch_size // n_parallel samples each.
+        :param sampling_staleness: If positive, every rank has a sampler process that collects the next batches while
+        the rank optimizes on the current one, with a policy at most this many updates behind (see SamplingPipeline).
+        The algo should then correct for the samples coming from an older policy (see ParallelTRPO).
         """
         self.env = env
         self.policy = policy
@@ -83,8 +93,14 @@ class ParallelBatchPolopt(RLAlgorithm):
         self.set_cpu_affinity = set_cpu_affinity
         self.cpu_assignments = cpu_assignments
         self.serial_compile = serial_compile
+        self.work_stealing = work_stealing
         self.worker_batch_size = batch_size // n_parallel
         self.n_steps_collected = 0  # (set by sampler)
+        self.sampling_time = 0.  # (set by sampler)
+        self.sampling_staleness = sampling_staleness
+        self.batch_staleness = 0  # (set by sampling pipeline)
+        self.sampling_wait_time = 0.  # (set by sampling pipeline)
+        self.itr_n_steps = 0  # (rank 0, set by the diagnostics)
         self.sampler = WorkerBatchSampler(self)
 
     def __getstate__(self):
@@ -113,10 +129,15 @@ class ParallelBatchPolopt(RLAlgorithm):
             num_steps=mp.RawArray('i', n),
             num_valids=mp.RawArray('d', n),
             sum_ent=mp.RawArray('d', n),
+            sampling_time=mp.RawArray('d', n),
+            n_steps_claimed=[SharedCounter(), SharedCounter()],
         )
         barriers = SimpleContainer(
             dgnstc=mp.Barrier(n),
+            sampling=mp.Barrier(n),
         )
+        if self.sampling_staleness > 0:
+            shareds.append(sampling_pipeline=SamplingPipeline(self.policy, n, self.sampling_staleness))
         self._par_objs = (shareds, barriers)
         self.baseline.init_par_objs(n_parallel=n)
 
@@ -180,12 +201,17 @@ class ParallelBatchPolopt(RLAlgorithm):
 
     def _train(self, rank):
         self.init_rank(rank)
+        if self.sampling_staleness > 0:
+            self._par_objs[0].sampling_pipeline.start(self)
         for itr in range(self.current_itr, self.n_itr):
+            itr_start_time = time.time()
             with logger.prefix('itr #%d | ' % itr):
-                paths = self.sampler.obtain_samples()
+                paths = self.obtain_samples()
                 samples_data, dgnstc_data = self.sampler.process_samples(paths)
                 self.log_diagnostics(itr, samples_data, dgnstc_data)  # (parallel)
                 self.optimize_policy(itr, samples_data)  # (parallel)
+                if self.sampling_staleness > 0 and rank == 0:
+                    self._par_objs[0].sampling_pipeline.broadcast(self.policy.get_param_values())
                 if rank == 0:
                     logger.log("fitting baseline...")
                 self.baseline.fit(paths)  # (parallel)
@@ -199,6 +225,7 @@ class ParallelBatchPolopt(RLAlgorithm):
                         params["paths"] = samples_data["paths"]
                     logger.save_itr_params(itr, params)
                     logger.log("saved")
+                    self.record_itr_time(itr_start_time)
                     logger.dump_tabular(with_prefix=False)
                     if self.plot:
                         self.update_plot()
@@ -206,6 +233,23 @@ class ParallelBatchPolopt(RLAlgorithm):
                             input("Plotting evaluation run: Press Enter to "
                                       "continue...")
                 self.current_itr = itr + 1
+        if self.sampling_staleness > 0:
+            self._par_objs[0].sampling_pipeline.join()
+
+    def obtain_samples(self):
+        if self.sampling_staleness > 0:
+            return self._par_objs[0].sampling_pipeline.receive(self)
+        return self.sampler.obtain_samples()
+
+    def record_itr_time(self, itr_start_time):
+        """ (rank 0, after log_diagnostics) """
+        itr_time = time.time() - itr_start_time
+        logger.record_tabular('ItrTime', itr_time)
+        logger.record_tabular('SamplesPerSec', self.itr_n_steps / itr_time)
+        if self.sampling_staleness > 0:
+            # the time rank 0 waited for its sampler, and how many updates its batch is behind
+            logger.record_tabular('SamplingWaitTime', self.sampling_wait_time)
+            logger.record_tabular('BatchStaleness', self.batch_staleness)
 
     #
     # Parallelized methods and related.
@@ -220,6 +264,7 @@ class ParallelBatchPolopt(RLAlgorithm):
             undiscounted_returns = [sum(path["rewards"]) for path in samples_data["paths"]]
             shareds.num_traj[i] = len(undiscounted_returns)
             shareds.num_steps[i] = self.n_steps_collected
+            shareds.sampling_time[i] = self.sampling_time
             # shareds.num_steps[i] = sum([len(path["rewards"]) for path in samples_data["paths"]])
             shareds.sum_return[i] = np.sum(undiscounted_returns)
             shareds.min_return[i] = np.min(undiscounted_returns)
@@ -243,6 +288,8 @@ class ParallelBatchPolopt(RLAlgorithm):
 
             if self.rank == 0:
                 num_traj = sum(shareds.num_traj)
+                # (the ranks may write the next iteration's before record_itr_time)
+                self.itr_n_steps = sum(shareds.num_steps)
                 average_discounted_return = \
                     sum(shareds.sum_discounted_return) / num_traj
                 average_return = sum(shareds.sum_return) / num_traj
@@ -263,6 +310,11 @@ class ParallelBatchPolopt(RLAlgorithm):
                 # logger.record_tabular('StdReturn', np.std(undiscounted_returns))
                 logger.record_tabular('MaxReturn', max_return)
                 logger.record_tabular('MinReturn', min_return)
+                # the fastest rank waits for the slowest one for the difference
+                logger.record_tabular('SamplingTimeMax', max(shareds.sampling_time))
+                logger.record_tabular('SamplingTimeMin', min(shareds.sampling_time))
+                logger.record_tabular('RankNumSamplesMax', max(shareds.num_steps))
+                logger.record_tabular('RankNumSamplesMin', min(shareds.num_steps))
 
         # NOTE: These others might only work if all path data is collected
         # centrally, could provide this as an option...might be easiest to build
@@ -61,13 +61,22 @@ class ParallelPerlmutterHvp(Serializable):
 
             xs = tuple(self.target.flat_to_params(x, trainable=True))
 
-            shareds.grads_2d[:, self.pd.rank] = self.pd.avg_fac * \
-                sliced_fun(self.opt_fun["f_Hx_plain"], self._num_slices)(inputs, xs)
-            barriers.Hx[0].wait()
-
-            shareds.Hx[self.pd.vb[0]:self.pd.vb[1]] = \
-                self.reg_coeff * x[self.pd.vb[0]:self.pd.vb[1]] + \
-                np.sum(shareds.grads_2d[self.pd.vb[0]:self.pd.vb[1], :], axis=1)
+            if self.pd.reduction == "reduce_scatter":
+                shareds.grads_rows[self.pd.rank] = self.pd.avg_fac * \
+                    sliced_fun(self.opt_fun["f_Hx_plain"], self._num_slices)(inputs, xs)
+                barriers.Hx[0].wait()
+
+                np.sum(shareds.grads_rows[:, self.pd.vb[0]:self.pd.vb[1]], axis=0, dtype=shareds.Hx.dtype,
+                    out=shareds.Hx[self.pd.vb[0]:self.pd.vb[1]])
+                shareds.Hx[self.pd.vb[0]:self.pd.vb[1]] += self.reg_coeff * x[self.pd.vb[0]:self.pd.vb[1]]
+            else:
+                shareds.grads_2d[:, self.pd.rank] = self.pd.avg_fac * \
+                    sliced_fun(self.opt_fun["f_Hx_plain"], self._num_slices)(inputs, xs)
+                barriers.Hx[0].wait()
+
+                shareds.Hx[self.pd.vb[0]:self.pd.vb[1]] = \
+                    self.reg_coeff * x[self.pd.vb[0]:self.pd.vb[1]] + \
+                    np.sum(shareds.grads_2d[self.pd.vb[0]:self.pd.vb[1], :], axis=1)
             barriers.Hx[1].wait()
             return shareds.Hx  # (or can just access this persistent var elsewhere)
 
@@ -142,6 +151,17 @@ class ParallelConjugateGradientOptimizer(Serializable):
 
     Only the optimize() method changes for parallel implementation, but some
     options of serial implementation may not be available.
+
+    The gradient and the Hessian-vector products are summed over the ranks in shared memory, each rank summing an
+    equal share of the elements (a reduce-scatter; the sums are shared, so no allgather is needed). With
+    reduction="columns", the ranks write their vectors into the columns of an (n_params, n_parallel) buffer, i.e.
+    with a stride of n_parallel elements; with reduction="reduce_scatter", into the contiguous rows of an
+    (n_parallel, n_params) buffer, optionally in float32 (the sums are accumulated in the dtype of the result).
+
+    With precision="float32", the shared vectors (gradient, Hessian-vector products, CG vectors, parameters of
+    the line search) and the losses are float32 like the outputs of the Theano functions (floatX=float32), so
+    they are not upcast and copied, and the reductions move half the bytes; only the dot products of CG and of
+    the step size are accumulated in float64.
     """
 
     def __init__(
@@ -153,7 +173,10 @@ class ParallelConjugateGradientOptimizer(Serializable):
             max_backtracks=15,
             accept_violation=False,
             hvp_approach=None,
-            num_slices=1):
+            num_slices=1,
+            reduction="columns",
+            reduction_dtype=None,
+            precision="float64"):
         """
 
         :param cg_iters: The number of CG iterations used to calculate A^-1 g
@@ -162,8 +185,18 @@ class ParallelConjugateGradientOptimizer(Serializable):
         computation time for the descent direction dominates, this can greatly reduce the overall computation time.
         :param accept_violation: whether to accept the descent step if it violates the line search condition after
         exhausting all backtracking budgets
+        :param reduction: "columns" or "reduce_scatter": layout of the buffer where the ranks write their gradients
+        and Hessian-vector products to be summed (see above)
+        :param reduction_dtype: dtype of that buffer, the same as precision by default; can differ from it with
+        reduce_scatter only
+        :param precision: "float64" or "float32": dtype of the shared vectors and of CG (see above)
         :return:
         """
+        assert reduction in ["columns", "reduce_scatter"]
+        assert precision in ["float64", "float32"]
+        if reduction_dtype is None:
+            reduction_dtype = precision
+        assert reduction_dtype == precision or reduction == "reduce_scatter"
         Serializable.quick_init(self, locals())
         self._cg_iters = cg_iters
         self._reg_coeff = reg_coeff
@@ -171,6 +204,9 @@ class ParallelConjugateGradientOptimizer(Serializable):
         self._backtrack_ratio = backtrack_ratio
         self._max_backtracks = max_backtracks
         self._num_slices = num_slices
+        self._reduction = reduction
+        self._reduction_dtype = np.dtype(reduction_dtype)
+        self._dtype = np.dtype(precision)
 
         self._opt_fun = None
         self._target = None
@@ -252,24 +288,36 @@ class ParallelConjugateGradientOptimizer(Serializable):
             rank=None,
             avg_fac=1.0 / n_parallel,
             vb=[(vb_idx[i], vb_idx[i + 1]) for i in range(n_parallel)],
+            reduction=self._reduction,
         )
         self.pd = par_data
         self._hvp_approach.pd = par_data
 
+        typecode = self._dtype.char
+
+        def shared_vector():
+            return np.frombuffer(mp.RawArray(typecode, size_grad), dtype=self._dtype)
+
         shareds = SimpleContainer(
-            flat_g=np.frombuffer(mp.RawArray('d', size_grad)),
-            grads_2d=np.reshape(
-                np.frombuffer(mp.RawArray('d', size_grad * n_parallel)),
-                (size_grad, n_parallel)),
-            Hx=np.frombuffer(mp.RawArray('d', size_grad)),
-            loss=mp.RawArray('d', n_parallel),
-            constraint_val=mp.RawArray('d', n_parallel),
-            descent=np.frombuffer(mp.RawArray('d', size_grad)),
-            prev_param=np.frombuffer(mp.RawArray('d', size_grad)),
-            cur_param=np.frombuffer(mp.RawArray('d', size_grad)),
-            cg_p=np.frombuffer(mp.RawArray('d', size_grad)),
+            flat_g=shared_vector(),
+            Hx=shared_vector(),
+            loss=mp.RawArray(typecode, n_parallel),
+            constraint_val=mp.RawArray(typecode, n_parallel),
+            descent=shared_vector(),
+            prev_param=shared_vector(),
+            cur_param=shared_vector(),
+            cg_p=shared_vector(),
             n_steps_collected=mp.RawArray('i', n_parallel),
         )
+        if self._reduction == "reduce_scatter":
+            shareds.append(grads_rows=np.reshape(
+                np.frombuffer(mp.RawArray(self._reduction_dtype.char, size_grad * n_parallel),
+                    dtype=self._reduction_dtype),
+                (n_parallel, size_grad)))
+        else:
+            shareds.append(grads_2d=np.reshape(
+                np.frombuffer(mp.RawArray(typecode, size_grad * n_parallel), dtype=self._dtype),
+                (size_grad, n_parallel)))
         barriers = SimpleContainer(
             avg_fac=mp.Barrier(n_parallel),
             flat_g=[mp.Barrier(n_parallel) for _ in range(2)],
@@ -280,8 +328,10 @@ class ParallelConjugateGradientOptimizer(Serializable):
         )
         self._par_objs = (shareds, barriers)
 
+        # OK to use the same memory.
         shareds_hvp = SimpleContainer(
-            grads_2d=shareds.grads_2d,  # OK to use the same memory.
+            grads_2d=getattr(shareds, "grads_2d", None),
+            grads_rows=getattr(shareds, "grads_rows", None),
             Hx=shareds.Hx,
         )
         barriers_hvp = SimpleContainer(
@@ -292,7 +342,7 @@ class ParallelConjugateGradientOptimizer(Serializable):
         # For passing into krylov.cg
         cg_par_objs = {
             'z': shareds.Hx,  # (location of result of Hx)
-            'p': np.frombuffer(mp.RawArray('d', size_grad)),
+            'p': shared_vector(),
             'x': shareds.descent,  # (location to write krylov.cg result)
             'brk': mp.RawValue('i'),
             'barrier': mp.Barrier(n_parallel),
@@ -349,14 +399,22 @@ class ParallelConjugateGradientOptimizer(Serializable):
         Parallelized: returns the same values in all workers.
         """
         shareds, barriers = self._par_objs
-        # Each worker records result available to all.
-        shareds.grads_2d[:, self.rank] = self.avg_fac * \
-            sliced_fun(self._opt_fun["f_grad"], self._num_slices)(inputs, extra_inputs)
-        barriers.flat_g[0].wait()
-        # Each worker sums over an equal share of the grad elements across
-        # workers (row major storage--sum along rows).
-        shareds.flat_g[self.vb[0]:self.vb[1]] = \
-            np.sum(shareds.grads_2d[self.vb[0]:self.vb[1], :], axis=1)
+        if self._reduction == "reduce_scatter":
+            shareds.grads_rows[self.rank] = self.avg_fac * \
+                sliced_fun(self._opt_fun["f_grad"], self._num_slices)(inputs, extra_inputs)
+            barriers.flat_g[0].wait()
+            # Each worker sums its share of the grad elements over the rows.
+            np.sum(shareds.grads_rows[:, self.vb[0]:self.vb[1]], axis=0, dtype=shareds.flat_g.dtype,
+                out=shareds.flat_g[self.vb[0]:self.vb[1]])
+        else:
+            # Each worker records result available to all.
+            shareds.grads_2d[:, self.rank] = self.avg_fac * \
+                sliced_fun(self._opt_fun["f_grad"], self._num_slices)(inputs, extra_inputs)
+            barriers.flat_g[0].wait()
+            # Each worker sums over an equal share of the grad elements across
+            # workers (row major storage--sum along rows).
+            shareds.flat_g[self.vb[0]:self.vb[1]] = \
+                np.sum(shareds.grads_2d[self.vb[0]:self.vb[1], :], axis=1)
         barriers.flat_g[1].wait()
         # No return (elsewhere, access shareds.flat_g)
 
@@ -418,7 +476,7 @@ class ParallelConjugateGradientOptimizer(Serializable):
 
         initial_step_size = np.sqrt(
             2.0 * self._max_constraint_val *
-            (1. / (shareds.descent.dot(shareds.flat_g) + 1e-8))
+            (1. / (krylov.dot(shareds.descent, shareds.flat_g) + 1e-8))
         )
         if np.isnan(initial_step_size):
             initial_step_size = 1.
@@ -427,7 +485,7 @@ class ParallelConjugateGradientOptimizer(Serializable):
         shareds.prev_param[:] = self._target.get_param_values(trainable=True)
 
         for n_iter, ratio in enumerate(self._backtrack_ratio ** np.arange(self._max_backtracks)):
-            shareds.cur_param[:] = shareds.prev_param - ratio * shareds.descent
+            shareds.cur_param[:] = shareds.prev_param - self._dtype.type(ratio) * shareds.descent
             barriers.bktrk.wait()
             self._target.set_param_values(shareds.cur_param, trainable=True)
             loss, constraint_val = self._loss_constraint(inputs, extra_inputs)  # (parallel)
@@ -27,6 +27,7 @@ class ParallelFirstOrderOptimizer(Serializable):
             callback=None,
             verbose=False,
             num_slices=1,
+            precision="float64",
             **kwargs):
         """
         :param max_epochs: number of testing / logging epochs
@@ -34,6 +35,7 @@ class ParallelFirstOrderOptimizer(Serializable):
         :param batch_size: within an epoch, each iteration samples a minibatch (shuffle first and then read sequentially) and do gradient descent; "None" means using all data to compute a gradient step
         :param callback: log info for each epoch
         :param num_slices: divide the dataset and aggregate the results, useful if want to use a huge batch size for a single gradient step
+        :param precision: "float64" or "float32": dtype of the shared gradients, parameters and losses; float32 matches the outputs of the Theano functions (floatX=float32), which are then not upcast
         :return:
         """
         Serializable.quick_init(self, locals())
@@ -48,6 +50,8 @@ class ParallelFirstOrderOptimizer(Serializable):
         self._update_method = update_method
         self._verbose = verbose
         self._num_slices = num_slices
+        assert precision in ["float64", "float32"]
+        self._dtype = np.dtype(precision)
 
     def init_rank(self,rank):
         self.rank = rank
@@ -65,14 +69,15 @@ class ParallelFirstOrderOptimizer(Serializable):
         )
         self.pd = par_data
 
+        typecode = self._dtype.char
         shareds = SimpleContainer(
-            flat_g=np.frombuffer(mp.RawArray('d', size_grad)),
+            flat_g=np.frombuffer(mp.RawArray(typecode, size_grad), dtype=self._dtype),
             grads_2d=np.reshape(
-                np.frombuffer(mp.RawArray('d', size_grad * n_parallel)),
+                np.frombuffer(mp.RawArray(typecode, size_grad * n_parallel), dtype=self._dtype),
                 (size_grad, n_parallel)),
-            loss=mp.RawArray('d', n_parallel),
+            loss=mp.RawArray(typecode, n_parallel),
             n_steps_collected=mp.RawArray('i', n_parallel),
-            cur_param=np.frombuffer(mp.RawArray('d', size_grad)),
+            cur_param=np.frombuffer(mp.RawArray(typecode, size_grad), dtype=self._dtype),
         )
         barriers = SimpleContainer(
             avg_fac=mp.Barrier(n_parallel),
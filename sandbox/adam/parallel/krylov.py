@@ -2,6 +2,16 @@
 import numpy as np
 
 
+def dot(a, b):
+    """
+    a.dot(b), accumulated in float64 also when a and b are float32 (einsum
+    converts them blockwise instead of copying them).
+    """
+    if a.dtype == np.float64 and b.dtype == np.float64:
+        return a.dot(b)
+    return np.einsum('i,i->', a, b, dtype=np.float64)
+
+
 def cg(f_Ax, b, par_objs, rank, cg_iters=10, callback=None, verbose=False, residual_tol=1e-10):
     """
     Demmel p 312
@@ -19,7 +29,9 @@ def cg(f_Ax, b, par_objs, rank, cg_iters=10, callback=None, verbose=False, resid
     'brk': shared int
     'barrier': one multiprocessing barrier (for n_parallel)
 
-    z, p, and x must all be the same size as the input b.
+    z, p, and x must all be the same size as the input b. The vectors can be
+    float32: the dot products are accumulated in float64, and the updates of
+    x, r and p are done in the dtype of b.
     """
     if rank == 0:
         _cg_master(f_Ax, b, par_objs, cg_iters, callback, verbose, residual_tol)
@@ -33,12 +45,13 @@ def _cg_master(f_Ax, b, par_objs, cg_iters, callback, verbose, residual_tol):
     x = par_objs['x']
     brk = par_objs['brk']
     barrier = par_objs['barrier']
+    scalar = b.dtype.type
 
     p[:] = b
     barrier.wait()
     r = b.copy()
     x.fill(0.)
-    rdotr = r.dot(r)
+    rdotr = dot(r, r)
     brk.value = 0
 
     if verbose:
@@ -53,11 +66,11 @@ def _cg_master(f_Ax, b, par_objs, cg_iters, callback, verbose, residual_tol):
             print(fmtstr % (i, rdotr, np.linalg.norm(x)))
         # z = f_Ax(p)
         f_Ax(p)  # (parallel, writes to persistent shared variable, z)
-        v = rdotr / p.dot(z)
+        v = scalar(rdotr / dot(p, z))
         x += v * p
         r -= v * z
-        newrdotr = r.dot(r)
-        mu = newrdotr / rdotr
+        newrdotr = dot(r, r)
+        mu = scalar(newrdotr / rdotr)
         # p = r + mu * p
         p[:] = r + mu * p
         rdotr = newrdotr
@@ -102,7 +102,7 @@ class ParallelLinearFeatureBaseline(LinearFeatureBaseline):
         t2 = t ** 2
         t3 = t ** 3
         for path in paths:
-            obs = np.clip(path["observations"], -10, 10)
+            obs = self._observations(path)
             for o, al, al2, al3, ret in zip(obs, t, t2, t3, path["returns"]):
                 self.path_vec[:] = np.concatenate([o, o ** 2, al, al2, al3, [1.]])
                 self.feat_mat += self.path_vec.T.dot(self.path_vec)
@@ -1,9 +1,10 @@
 
 import numpy as np
+import time
 
 from rllab.misc import special, tensor_utils
 from rllab.algos import util
-from rllab.sampler.utils import rollout
+from rllab.sampler.utils import rollout, vectorized_rollout, StepClaimer
 
 
 class WorkerBatchSampler(object):
@@ -14,41 +15,107 @@ class WorkerBatchSampler(object):
         """
         self.algo = algo
         self.worker_batch_size = algo.worker_batch_size
+        # number of calls of _obtain_samples_work_stealing
+        self._n_calls = 0
 
     def obtain_samples(self, n_samples=None):
+        """
+        Collects worker_batch_size samples (or n_samples), or, with algo.work_stealing, samples until all ranks
+        together have batch_size. Sets algo.n_steps_collected and algo.sampling_time.
+        """
+        start = time.time()
+        if n_samples is None and self.algo.work_stealing:
+            paths = self._obtain_samples_work_stealing()
+        else:
+            paths = self._obtain_samples(n_samples)
+        self.algo.n_steps_collected = sum(len(path["rewards"]) for path in paths)
+        self.algo.sampling_time = time.time() - start
+        return paths
+
+    def _obtain_samples(self, n_samples=None):
         if n_samples is None:
             n_samples = self.worker_batch_size
         n_steps_collected = 0
         paths = []
         # TODO: progbar for rank 0?
+        if getattr(self.algo.env, "vectorized", False):
+            # e.g. VecAtariEnv: one policy evaluation per step for all its envs
+            paths = vectorized_rollout(self.algo.env, self.algo.policy, n_samples, self.algo.max_path_length)
+            n_steps_collected = sum(len(path["rewards"]) for path in paths)
         while n_steps_collected < n_samples:
             paths.append(rollout(self.algo.env, self.algo.policy, self.algo.max_path_length))
             n_steps_collected += len(paths[-1]["rewards"])
         if self.algo.whole_paths:
-            self.algo.n_steps_collected = n_steps_collected
             return paths
         else:
             paths_truncated = self._truncate_paths(paths)
             return paths_truncated
 
-    def _truncate_paths(self, paths):
+    def _obtain_samples_work_stealing(self):
+        """
+        Every rank adds the steps of its paths to a counter shared by all ranks while sampling (see StepClaimer),
+        and starts another path while the counter is below batch_size, so that the ranks whose paths are short
+        collect more of them instead of waiting for the others. Every rank collects at least one path.
+        With whole_paths=False, a path ends when the counter reaches batch_size, except the first path of a rank.
+        A vectorized env collects in rounds of an equal share of the samples still missing, counted at their end.
+        """
+        shareds, barriers = self.algo._par_objs
+        # calls alternate between two counters: once every rank has entered this call, none uses the other one
+        # until the next call, so rank 0 resets it for then
+        counter = shareds.n_steps_claimed[self._n_calls % 2]
+        next_counter = shareds.n_steps_claimed[(self._n_calls + 1) % 2]
+        self._n_calls += 1
+        batch_size = self.algo.batch_size
+        barriers.sampling.wait()
+        if self.algo.rank == 0:
+            next_counter.reset()
+        paths = []
+        while len(paths) == 0 or counter.value < batch_size:
+            if getattr(self.algo.env, "vectorized", False):
+                n_samples = -(-max(batch_size - counter.value, 1) // self.algo.n_parallel)
+                new_paths = vectorized_rollout(
+                    self.algo.env, self.algo.policy, n_samples, self.algo.max_path_length)
+                n_steps = sum(len(path["rewards"]) for path in new_paths)
+                n_steps_left = batch_size - (counter.add(n_steps) - n_steps)
+                if not self.algo.whole_paths and n_steps > n_steps_left:
+                    if n_steps_left > 0:
+                        new_paths = self._truncate_paths(new_paths, n_steps_left)
+                    elif len(paths) > 0:
+                        break
+            else:
+                # the steps are counted while sampling, so that no rank starts a path that is not needed
+                step_claimer = StepClaimer(counter, batch_size, keep_all=self.algo.whole_paths or len(paths) == 0)
+                path = rollout(
+                    self.algo.env, self.algo.policy, self.algo.max_path_length,
+                    step_claimer=step_claimer)
+                if step_claimer.n_kept == 0:
+                    break
+                if step_claimer.n_kept < len(path["rewards"]):
+                    path = self._truncate_paths([path], step_claimer.n_kept)[0]
+                new_paths = [path]
+            paths.extend(new_paths)
+        return paths
+
+    def _truncate_paths(self, paths, max_samples=None):
         """
         Truncate the list of paths so that the total number of samples is exactly
-        equal to worker_batch_size. This is done by removing extra paths at the end
+        equal to worker_batch_size (or max_samples). This is done by removing extra paths at the end
         of the list, and make the last path shorter if necessary
         :param paths: a list of paths
         :return: a list of paths, truncated so that the number of samples adds up to max-samples
         """
+        if max_samples is None:
+            max_samples = self.worker_batch_size
         # chop samples collected by extra paths
         # make a copy
         paths = list(paths)
         total_n_samples = sum(len(path["rewards"]) for path in paths)
-        while len(paths) > 0 and total_n_samples - len(paths[-1]["rewards"]) >= self.worker_batch_size:
+        while len(paths) > 0 and total_n_samples - len(paths[-1]["rewards"]) >= max_samples:
             total_n_samples -= len(paths.pop(-1)["rewards"])
         if len(paths) > 0:
             last_path = paths.pop(-1)
             truncated_last_path = dict()
-            truncated_len = len(last_path["rewards"]) - (total_n_samples - self.worker_batch_size)
+            truncated_len = len(last_path["rewards"]) - (total_n_samples - max_samples)
             for k, v in last_path.items():
                 if k in ["observations", "actions", "rewards"]:
                     truncated_last_path[k] = tensor_utils.truncate_tensor_list(v, truncated_len)
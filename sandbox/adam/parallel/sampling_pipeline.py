@@ -0,0 +1,77 @@
+import multiprocessing as mp
+import time
+
+from rllab.sampler import shm_transport
+
+
+class SamplingPipeline(object):
+    """
+    Sampler processes for ParallelBatchPolopt that collect the next batches while the ranks optimize on the current
+    one. Each rank forks one sampler (start()), which samples the rank's share of every iteration with its own copy
+    of the algo and sends the paths back through shared memory (see shm_transport). Rank 0 broadcasts the policy
+    parameters after every update; the batch of iteration j (counted from the first iteration of this run) is
+    sampled with the newest parameters once they include update j - staleness, so that with staleness=1 the
+    batch of iteration j + 1 is collected while the ranks optimize on that of iteration j.
+    Must be created before forking the ranks.
+    """
+
+    def __init__(self, policy, n_parallel, staleness=1, segment_dir=None):
+        assert staleness >= 1
+        self.staleness = staleness
+        self.segment_dir = segment_dir
+        params = policy.get_param_values()
+        self.param_broadcast = shm_transport.ParamBroadcast(len(params), params.dtype, segment_dir)
+        # the ranks and samplers inherit the mapping when forked, so the file is not needed anymore
+        self.param_broadcast.unlink()
+        # version 1: the parameters before the first update
+        self.param_broadcast.write(params)
+        self.params_updated = mp.Condition()
+        self.queues = [mp.Queue() for _ in range(n_parallel)]
+        self.process = None
+        self.n_batches_received = 0
+
+    def start(self, algo):
+        """ (in the rank) Forks the rank's sampler, which samples until algo.n_itr. """
+        self.process = mp.Process(target=self._run, args=(algo,))
+        # killed with its rank if the rank fails
+        self.process.daemon = True
+        self.process.start()
+
+    def _run(self, algo):
+        queue = self.queues[algo.rank]
+        for j, itr in enumerate(range(algo.current_itr, algo.n_itr)):
+            with self.params_updated:
+                self.params_updated.wait_for(lambda: self.param_broadcast.version[0] >= j + 1 - self.staleness)
+                version, params = self.param_broadcast.read_if_newer(0)
+            algo.policy.set_param_values(params)
+            if hasattr(algo, "update_algo_params"):
+                algo.update_algo_params(itr)
+            paths = algo.sampler.obtain_samples()
+            file_name, packed = shm_transport.pack(paths, self.segment_dir)
+            queue.put((file_name, packed, algo.n_steps_collected, algo.sampling_time, version))
+
+    def broadcast(self, params):
+        """ (rank 0, after every policy update) """
+        with self.params_updated:
+            self.param_broadcast.write(params)
+            self.params_updated.notify_all()
+
+    def receive(self, algo):
+        """
+        (in the rank) Waits for the next batch of the rank's sampler. Sets algo.n_steps_collected and
+        algo.sampling_time as the sampler does, and algo.batch_staleness to the number of updates the policy
+        that sampled the batch is behind.
+        :return: the paths
+        """
+        start = time.time()
+        file_name, packed, n_steps_collected, sampling_time, version = self.queues[algo.rank].get()
+        paths = shm_transport.unpack(file_name, packed)
+        self.n_batches_received += 1
+        algo.n_steps_collected = n_steps_collected
+        algo.sampling_time = sampling_time
+        algo.sampling_wait_time = time.time() - start
+        algo.batch_staleness = self.n_batches_received - version
+        return paths
+
+    def join(self):
+        self.process.join()
@@ -22,6 +22,11 @@ class ParallelTRPO(ParallelBatchPolopt):
         - Inherits from parallelized base class
         - Holds a parallelized optimizer
         - Has an init_par_objs() method (working on base class and optimizer)
+
+    With sampling_staleness > 0, the samples may come from an older policy than the current one (the behavior
+    policy): the KL constraint and the likelihood ratio are then taken w.r.t. the current policy, and the surrogate
+    weights every sample by the importance weight pi_current(a|s) / pi_behavior(a|s), passed through
+    is_weight_correction (e.g. lambda w: np.minimum(w, 1) to truncate the weights) if given.
     """
 
     def __init__(
@@ -31,6 +36,7 @@ class ParallelTRPO(ParallelBatchPolopt):
             step_size=0.01,
             truncate_local_is_ratio=None,
             mkl_num_threads=1,
+            is_weight_correction=None,
             **kwargs):
         if optimizer is None:
             if optimizer_args is None:
@@ -40,6 +46,7 @@ class ParallelTRPO(ParallelBatchPolopt):
         self.step_size = step_size
         self.truncate_local_is_ratio = truncate_local_is_ratio
         self.mkl_num_threads = mkl_num_threads
+        self.is_weight_correction = is_weight_correction
         super(ParallelTRPO, self).__init__(**kwargs)
 
     @overrides
@@ -93,6 +100,29 @@ class ParallelTRPO(ParallelBatchPolopt):
         lr = dist.likelihood_ratio_sym(action_var, old_dist_info_vars, dist_info_vars)
         if self.truncate_local_is_ratio is not None:
             lr = TT.minimum(self.truncate_local_is_ratio, lr)
+        if self.sampling_staleness > 0:
+            assert not is_recurrent
+            # (computed in prep_samples)
+            is_weight_var = ext.new_tensor(
+                'is_weight',
+                ndim=1,
+                dtype=theano.config.floatX
+            )
+            lr = lr * is_weight_var
+            behavior_dist_info_vars = {
+                k: ext.new_tensor(
+                    'behavior_%s' % k,
+                    ndim=2,
+                    dtype=theano.config.floatX
+                ) for k in dist.dist_info_keys
+            }
+            behavior_dist_info_vars_list = [behavior_dist_info_vars[k] for k in dist.dist_info_keys]
+            self.f_stale_inputs = ext.compile_function(
+                inputs=[obs_var, action_var] + state_info_vars_list + behavior_dist_info_vars_list,
+                outputs=[dist_info_vars[k] for k in dist.dist_info_keys] + [
+                    dist.likelihood_ratio_sym(action_var, behavior_dist_info_vars, dist_info_vars)],
+                log_name="f_stale_inputs",
+            )
         if is_recurrent:
             mean_kl = TT.sum(kl * valid_var) / TT.sum(valid_var)
             surr_loss = - TT.sum(lr * advantage_var * valid_var) / TT.sum(valid_var)
@@ -106,6 +136,8 @@ class ParallelTRPO(ParallelBatchPolopt):
                       ] + state_info_vars_list + old_dist_info_vars_list
         if is_recurrent:
             input_list.append(valid_var)
+        if self.sampling_staleness > 0:
+            input_list.append(is_weight_var)
 
         self.optimizer.update_opt(
             loss=surr_loss,
@@ -125,14 +157,22 @@ class ParallelTRPO(ParallelBatchPolopt):
         agent_infos = samples_data["agent_infos"]
         state_info_list = [agent_infos[k] for k in self.policy.state_info_keys]
         dist_info_list = [agent_infos[k] for k in self.policy.distribution.dist_info_keys]
+        if self.sampling_staleness > 0:
+            # the old dist infos are those of the current policy, and the behavior policy's enter the weights
+            outputs = self.f_stale_inputs(*(all_input_values[:2] + tuple(state_info_list) + tuple(dist_info_list)))
+            dist_info_list, is_weights = outputs[:-1], outputs[-1]
+            if self.is_weight_correction is not None:
+                is_weights = self.is_weight_correction(is_weights)
         all_input_values += tuple(state_info_list) + tuple(dist_info_list)
         if self.policy.recurrent:
             all_input_values += (samples_data["valids"],)
+        if self.sampling_staleness > 0:
+            all_input_values += (is_weights,)
         return all_input_values
 
     @overrides
     def optimize_policy(self, itr, samples_data):
-        if self.whole_paths:
+        if self.whole_paths or self.work_stealing:
             self.optimizer.set_avg_fac(self.n_steps_collected)  # (parallel)
         all_input_values = self.prep_samples(samples_data)
         self.optimizer.optimize(all_input_values)  # (parallel)
@@ -5,6 +5,7 @@ from sandbox.rocky.tf.misc import tensor_utils
 from rllab.misc import logger
 from rllab.misc import special
 from rllab.algos import util
+from sandbox.haoran.hashing.bonus_trpo.bonus_evaluators.hash.memmap_count_store import MemmapCountStore
 import numpy as np
 
 
@@ -17,6 +18,8 @@ class BonusTRPO(TRPO):
         super(BonusTRPO, self).__init__(*args, **kwargs)
 
     def get_itr_snapshot(self, itr, samples_data):
+        # (train() saves the params right after this) persistent count tables only write the pages changed since the last iteration
+        MemmapCountStore.snapshot_all()
         return dict(
             itr=itr,
             policy=self.policy,
@@ -32,7 +35,12 @@ class BonusTRPO(TRPO):
 
     def process_samples(self, itr, paths):
         logger.log("fitting bonus evaluator before processing...")
-        self.bonus_evaluator.fit_before_process_samples(paths)
+        if hasattr(self.bonus_evaluator, "compute_bonuses"):
+            # fits and computes the bonuses in one pass over the batch
+            all_bonuses = self.bonus_evaluator.compute_bonuses(paths)
+        else:
+            self.bonus_evaluator.fit_before_process_samples(paths)
+            all_bonuses = [self.bonus_evaluator.predict(path) for path in paths]
         self.extra_bonus_evaluator.fit_before_process_samples(paths)
         logger.log("fitted")
 
@@ -40,8 +48,7 @@ class BonusTRPO(TRPO):
         # self.bonus_evaluator.
         baselines = []
         returns = []
-        for path in paths:
-            bonuses = self.bonus_evaluator.predict(path)
+        for path, bonuses in zip(paths, all_bonuses):
             path["bonus_rewards"] = self.bonus_coeff * bonuses
             path["raw_rewards"] = path["rewards"]
             if self.clip_reward:
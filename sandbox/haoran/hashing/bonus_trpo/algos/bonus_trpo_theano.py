@@ -5,6 +5,7 @@ from rllab.misc import tensor_utils
 from rllab.misc import logger
 from rllab.misc import special
 from rllab.algos import util
+from sandbox.haoran.hashing.bonus_trpo.bonus_evaluators.hash.memmap_count_store import MemmapCountStore
 import numpy as np
 
 
@@ -40,6 +41,8 @@ class BonusTRPO(TRPO):
                 params["algo"] = self
                 if self.store_paths:
                     params["paths"] = samples_data["paths"]
+                # persistent count tables only write the pages changed since the last iteration
+                MemmapCountStore.snapshot_all()
                 logger.save_itr_params(itr, params)
                 logger.log("saved")
                 logger.dump_tabular(with_prefix=False)
@@ -56,7 +59,12 @@ class BonusTRPO(TRPO):
 
     def process_samples(self, itr, paths):
         logger.log("fitting bonus evaluator before processing...")
-        self.bonus_evaluator.fit_before_process_samples(paths)
+        if hasattr(self.bonus_evaluator, "compute_bonuses"):
+            # fits and computes the bonuses in one pass over the batch
+            all_bonuses = self.bonus_evaluator.compute_bonuses(paths)
+        else:
+            self.bonus_evaluator.fit_before_process_samples(paths)
+            all_bonuses = [self.bonus_evaluator.predict(path) for path in paths]
         self.extra_bonus_evaluator.fit_before_process_samples(paths)
         logger.log("fitted")
 
@@ -64,8 +72,7 @@ class BonusTRPO(TRPO):
         # self.bonus_evaluator.
         baselines = []
         returns = []
-        for path in paths:
-            bonuses = self.bonus_evaluator.predict(path)
+        for path, bonuses in zip(paths, all_bonuses):
             path["bonus_rewards"] = self.bonus_coeff * bonuses
             path["raw_rewards"] = path["rewards"]
             if self.clip_reward:
@@ -0,0 +1,103 @@
+"""
+AtariEnv steps/sec with the default Montezuma's Revenge configuration, sampled by rollout with uniformly random actions: the previous step (deep copy of an env_info dict built before every action, which clones the ALE state every step since record_internal_state=True) vs. the current one (EnvInfoRecorder: the internal states are only cloned on request (or at every step with --count_resetter), and the RAM, lives and rewards are written into arrays of the path).
+--record_ram also records the RAM of every step, which the previous step copies into a new array per step.
+--count_resetter resets through an AtariCountResetter (which has no candidates yet, so it always resets to the default state). That resetter asks for the internal states at every step, so both steps clone the ALE state at every step: the cloneState saving only applies without a count resetter.
+The env_infos that both record are compared; the previous step is kept below as a reference.
+Usage: PYTHONPATH=. python sandbox/haoran/hashing/bonus_trpo/benchmarks/bench_atari_env_info.py --n_steps 5000
+"""
+import argparse
+import copy
+import time
+import numpy as np
+
+from rllab.sampler.utils import rollout
+from sandbox.haoran.hashing.bonus_trpo.envs.atari_env import AtariEnv
+from sandbox.haoran.hashing.bonus_trpo.resetter.atari_count_resetter import AtariCountResetter
+from sandbox.haoran.hashing.bonus_trpo.benchmarks.util import print_table
+
+class PreviousAtariEnv(AtariEnv):
+    def path_env_infos(self):
+        return dict()
+
+    @property
+    def env_info(self):
+        env_info = {}
+        if self.record_ram:
+            ram = np.copy(self.ale.getRAM())
+            ram = ram.reshape((1,len(ram),1)) # make it like an image
+            env_info["ram_states"] = ram
+        if self.record_image and self.obs_type != "image":
+            env_info["images"] = np.copy(np.asarray(list(self.last_screens)))
+        if self.record_internal_state:
+            env_info["internal_states"] = self.ale.cloneState()
+        env_info["lives_lost"] = self.lives_lost
+        return env_info
+
+    def step(self, action):
+        cur_env_info = copy.deepcopy(self.env_info)
+        rewards = []
+        for i in range(self.frame_skip):
+            if i == (self.frame_skip - 1):
+                self.last_raw_screen = self.ale.getScreenRGB()
+            rewards.append(self.ale.act(self.legal_actions[action]))
+            if self.start_lives > self.ale.lives():
+                self.lives_lost = True
+            else:
+                self.lives_lost = False
+            if self.is_terminal:
+                break
+        self._reward = sum(rewards)
+        cur_env_info["prior_reward"] = 0
+        if not self.is_terminal:
+            self.last_screens.append(self.current_screen())
+            if self.record_ram:
+                self.last_rams.append(np.copy(self.ale.getRAM()))
+        return self.observation, self.reward, self.is_terminal, cur_env_info
+
+class RandomAgent(object):
+    def __init__(self, n_actions, seed=0):
+        self.n_actions = n_actions
+        self.rng = np.random.RandomState(seed)
+
+    def reset(self):
+        pass
+
+    def get_action(self, observation):
+        return self.rng.randint(self.n_actions), dict()
+
+def sample(env_class, n_steps, max_path_length, record_ram, count_resetter):
+    resetter = AtariCountResetter(restored_state_folder=None) if count_resetter else None
+    env = env_class(game="montezuma_revenge", seed=0, record_ram=record_ram, resetter=resetter)
+    agent = RandomAgent(len(env.legal_actions))
+    paths = []
+    n_steps_collected = 0
+    start = time.time()
+    while n_steps_collected < n_steps:
+        paths.append(rollout(env, agent, max_path_length))
+        n_steps_collected += len(paths[-1]["rewards"])
+    return n_steps_collected / (time.time() - start), paths
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--n_steps', type=int, default=5000)
+    parser.add_argument('--max_path_length', type=int, default=4500)
+    parser.add_argument('--record_ram', action='store_true', default=False)
+    parser.add_argument('--count_resetter', action='store_true', default=False)
+    args = parser.parse_args()
+
+    rows = []
+    previous_paths = None
+    for name, env_class in [("previous", PreviousAtariEnv), ("EnvInfoRecorder", AtariEnv)]:
+        steps_per_sec, paths = sample(
+            env_class, args.n_steps, args.max_path_length, args.record_ram, args.count_resetter)
+        if previous_paths is None:
+            previous_paths = paths
+        else:
+            for previous_path, path in zip(previous_paths, paths):
+                assert np.array_equal(previous_path["actions"], path["actions"])
+                assert np.array_equal(previous_path["rewards"], path["rewards"])
+                for k in ["lives_lost", "prior_reward", "ram_states"]:
+                    if k in previous_path["env_infos"]:
+                        assert np.array_equal(previous_path["env_infos"][k], path["env_infos"][k])
+        rows.append([name, "%.0f" % steps_per_sec])
+    print_table(["env_info", "steps / sec"], rows)
@@ -0,0 +1,60 @@
+"""
+BassFeatureExtractor throughput on RGB 210x160 frames: the batch methods vectorized_v2 (nested lists of np.sum slices over an int64 copy) and vectorized_v1 (dense img_len x feature_len 0/1 matrix, only with --methods vectorized_v1 since the matrix takes gigabytes) vs. reshape (cell sums by reshaping, in uint16/uint32).
+With --scale != 1, the frames are either resized in every feature call, or resized once beforehand as AtariEnv does with recorded_rgb_image_scale.
+The features of all methods are compared.
+Usage: PYTHONPATH=. python sandbox/haoran/hashing/bonus_trpo/benchmarks/bench_bass_feature_extractor.py --batch_sizes 100 1000 --cell_size 8
+"""
+import argparse
+import numpy as np
+import cv2
+
+from sandbox.haoran.hashing.feature_extractors.bass_feature_extractor import BassFeatureExtractor
+from sandbox.haoran.hashing.bonus_trpo.benchmarks.util import measure, print_table
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--batch_sizes', type=int, nargs='+', default=[100, 1000])
+    parser.add_argument('--methods', type=str, nargs='+', default=["vectorized_v2", "reshape"])
+    parser.add_argument('--cell_size', type=int, default=8)
+    parser.add_argument('--n_bin', type=int, default=8)
+    parser.add_argument('--scale', type=float, default=1.0)
+    args = parser.parse_args()
+
+    image_shape = (210, 160, 3)
+    extractors = dict([
+        (method, BassFeatureExtractor(
+            image_shape=image_shape,
+            cell_size=args.cell_size,
+            n_bin=args.n_bin,
+            batch_method=method,
+            scale=args.scale,
+        ))
+        for method in args.methods
+    ])
+    rng = np.random.RandomState(0)
+    rows = []
+    for batch_size in args.batch_sizes:
+        # blocky frames, like Atari screens
+        images = np.repeat(np.repeat(
+            rng.randint(256, size=(batch_size, 42, 32, 3)),
+            5, axis=1), 5, axis=2).astype(np.uint8)
+        inputs = [("full", images)]
+        if abs(args.scale - 1.0) > 1e-4:
+            scaled_images = np.asarray([
+                cv2.resize(image, dsize=(0,0), fx=args.scale, fy=args.scale)
+                for image in images
+            ])
+            inputs.append(("pre-scaled", scaled_images))
+
+        reference = None
+        for input_name, input_images in inputs:
+            for method in args.methods:
+                t, mem, features = measure(lambda: extractors[method].compute_features_nary(input_images))
+                if reference is None:
+                    reference = features
+                assert np.array_equal(reference, features)
+                rows.append([
+                    batch_size, input_name, method,
+                    "%.4f" % t, "%.0f" % (batch_size / t), "%.1f" % (mem / 1024. ** 2),
+                ])
+    print_table(["batch size", "input", "method", "sec", "frames / sec", "peak MB"], rows)
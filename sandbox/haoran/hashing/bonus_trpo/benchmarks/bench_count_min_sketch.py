@@ -0,0 +1,74 @@
+"""
+Error vs. memory of CountMinSketch configurations against the int64 tables of NaryHash / SimHash.
+Items follow a Zipf distribution (frequently revisited states); each item is mapped to bucket indices by its code modulo the bucket sizes, as SimHash does.
+Reported: memory, increment time, mean / max overestimation of the queried counts, and the relative error of total_state_count().
+Usage: PYTHONPATH=. python sandbox/haoran/hashing/bonus_trpo/benchmarks/bench_count_min_sketch.py --n_samples 1000000
+"""
+import argparse
+import numpy as np
+
+from sandbox.haoran.hashing.bonus_trpo.bonus_evaluators.hash.nary_hash import NaryHash
+from sandbox.haoran.hashing.bonus_trpo.bonus_evaluators.hash.count_min_sketch import CountMinSketch
+from sandbox.haoran.hashing.bonus_trpo.benchmarks.util import measure, print_table
+
+BUCKET_SIZES = {
+    "6M": [999931, 999953, 999959, 999961, 999979, 999983],
+    "600K": [99991, 99989, 99971, 99961, 99929, 99923],
+    "60K": [9973, 9967, 9949, 9941, 9931, 9929],
+}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--n_samples', type=int, default=1000000)
+    parser.add_argument('--batch_size', type=int, default=100000)
+    parser.add_argument('--zipf_a', type=float, default=1.2)
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(0)
+    item_ids = rng.zipf(args.zipf_a, size=args.n_samples)
+    _, item_ids = np.unique(item_ids, return_inverse=True)
+    item_codes = rng.randint(2**62, size=item_ids.max() + 1)[item_ids]
+    true_counts = np.bincount(item_ids)[item_ids]
+    n_distinct = len(np.unique(item_ids))
+
+    configs = [("tables (int64)", "6M", None)]
+    for size in ["6M", "600K", "60K"]:
+        for dtype in [np.uint32, np.uint16]:
+            for conservative_update in [False, True]:
+                configs.append((
+                    "cms %s%s" % (np.dtype(dtype).name, " +cu" if conservative_update else ""),
+                    size,
+                    dict(dtype=dtype, conservative_update=conservative_update),
+                ))
+
+    rows = []
+    for name, size, sketch_args in configs:
+        bucket_sizes = BUCKET_SIZES[size]
+        keys = np.stack([item_codes % b for b in bucket_sizes], axis=1)
+        if sketch_args is None:
+            counter = NaryHash(n=2, dim_key=1, bucket_sizes=bucket_sizes)
+            memory = counter.tables.nbytes
+        else:
+            sketch = CountMinSketch(bucket_sizes=bucket_sizes, **sketch_args)
+            counter = NaryHash(n=2, dim_key=1, sketch=sketch)
+            memory = sketch.memory_size()
+
+        def inc_all():
+            counter.reset()
+            for i in range(0, args.n_samples, args.batch_size):
+                counter.inc_keys(keys[i:i + args.batch_size])
+        t, _, _ = measure(inc_all, n_repeat=1)
+
+        errors = np.asarray(counter.query_keys(keys)) - true_counts
+        total = counter.total_state_count()
+        rows.append([
+            name,
+            size,
+            "%.1f" % (memory / 1024.**2),
+            "%.2f" % t,
+            "%.3f" % np.mean(errors),
+            np.max(errors),
+            "%.3f" % (abs(total - n_distinct) / float(n_distinct)),
+        ])
+    print("samples: %d, distinct items: %d" % (args.n_samples, n_distinct))
+    print_table(["counter", "buckets", "MB", "inc sec", "mean overest.", "max overest.", "total count rel. err"], rows)
@@ -0,0 +1,152 @@
+"""
+Time per policy update of ParallelConjugateGradientOptimizer (sandbox/adam/parallel) with n_parallel ranks, precision="float64" (shared vectors and CG in float64) vs. precision="float32" (float32 throughout, dot products accumulated in float64), with either reduction.
+The policy is a linear softmax over n_actions with obs_dim inputs, whose surrogate loss, KL, gradient and Hessian-vector products are computed in float32 with numpy, as the Theano functions are with floatX=float32, so that only the optimizer changes between the modes. Every iteration, each rank draws random observations, actions and advantages (the same in every mode) and takes the current policy as the old one, as TRPO does after sampling. The surrogate loss and mean KL after each update of the float32 modes are checked against those of float64 within rtol.
+Usage: PYTHONPATH=. python sandbox/haoran/hashing/bonus_trpo/benchmarks/bench_float32_optimizer.py --n_parallel 2 --obs_dim 20000 --n_actions 18 --n_samples 500 --n_itr 10
+"""
+import argparse
+import multiprocessing as mp
+import time
+import numpy as np
+
+import rllab.misc.logger as logger
+from sandbox.adam.parallel.conjugate_gradient_optimizer import ParallelConjugateGradientOptimizer
+from sandbox.haoran.hashing.bonus_trpo.benchmarks.util import print_table
+
+MODES = [("float64", "columns"), ("float32", "columns"), ("float32", "reduce_scatter")]
+STEP_SIZE = 0.01
+
+def softmax(z):
+    e = np.exp(z - np.max(z, axis=1, keepdims=True))
+    return e / np.sum(e, axis=1, keepdims=True)
+
+class LinearSoftmaxPolicy(object):
+    def __init__(self, obs_dim, n_actions):
+        self.shape = (obs_dim, n_actions)
+        self.W = np.zeros(self.shape, dtype=np.float32)
+
+    def get_param_values(self, trainable=True):
+        return self.W.ravel().copy()
+
+    def set_param_values(self, flat_params, trainable=True):
+        self.W[:] = np.reshape(flat_params, self.shape)
+
+    def flat_to_params(self, flat_params, trainable=True):
+        return [np.reshape(np.asarray(flat_params, dtype=np.float32), self.shape)]
+
+    def probs(self, obs):
+        return softmax(obs.dot(self.W))
+
+    # The Theano functions of TRPO: inputs (obs, actions, advantages, old probs)
+
+    def f_loss(self, obs, actions, advantages, old_probs):
+        return self.f_loss_constraint(obs, actions, advantages, old_probs)[0]
+
+    def f_constraint(self, obs, actions, advantages, old_probs):
+        return self.f_loss_constraint(obs, actions, advantages, old_probs)[1]
+
+    def f_loss_constraint(self, obs, actions, advantages, old_probs):
+        probs = self.probs(obs)
+        idx = np.arange(len(actions))
+        ratio = probs[idx, actions] / old_probs[idx, actions]
+        kl = np.sum(old_probs * (np.log(old_probs) - np.log(probs)), axis=1)
+        return -np.mean(ratio * advantages), np.mean(kl)
+
+    def f_grad(self, obs, actions, advantages, old_probs):
+        probs = self.probs(obs)
+        idx = np.arange(len(actions))
+        ratio = probs[idx, actions] / old_probs[idx, actions]
+        grad_logits = -probs
+        grad_logits[idx, actions] += 1.
+        grad_logits *= -(ratio * advantages / len(actions))[:, None]
+        return obs.T.dot(grad_logits).ravel()
+
+    def f_Hx_plain(self, obs, actions, advantages, old_probs, V):
+        # Hessian of the KL w.r.t. the logits: diag(p) - p p^T
+        probs = self.probs(obs)
+        u = obs.dot(V)
+        Hu = probs * (u - np.sum(probs * u, axis=1, keepdims=True))
+        return obs.T.dot(Hu / len(actions)).ravel()
+
+def batch(args, policy, rank, itr):
+    rng = np.random.RandomState(itr * 1000 + rank)
+    obs = rng.uniform(-1., 1., (args.n_samples, args.obs_dim)).astype(np.float32)
+    actions = rng.randint(args.n_actions, size=args.n_samples)
+    advantages = rng.normal(size=args.n_samples).astype(np.float32)
+    return obs, actions, advantages, policy.probs(obs)
+
+def run_rank(optimizer, policy, rank, args, barrier, results):
+    optimizer.init_rank(rank)
+    optimizer.set_avg_fac(args.n_samples)
+    opt_times = []
+    trajectory = []
+    for itr in range(args.n_itr):
+        inputs = batch(args, policy, rank, itr)
+        barrier.wait()
+        start = time.time()
+        optimizer.optimize(inputs)
+        opt_times.append(time.time() - start)
+        trajectory.append(optimizer._loss_constraint(inputs, ()))
+    results.put((rank, opt_times, trajectory, policy.get_param_values() if rank == 0 else None))
+
+def run(args, precision, reduction):
+    policy = LinearSoftmaxPolicy(args.obs_dim, args.n_actions)
+    optimizer = ParallelConjugateGradientOptimizer(
+        cg_iters=args.cg_iters, reduction=reduction, precision=precision)
+    # (instead of update_opt, which compiles the Theano functions)
+    optimizer._opt_fun = dict(
+        f_loss=policy.f_loss, f_grad=policy.f_grad, f_constraint=policy.f_constraint,
+        f_loss_constraint=policy.f_loss_constraint,
+    )
+    optimizer._target = policy
+    optimizer._max_constraint_val = STEP_SIZE
+    optimizer._constraint_name = "mean_kl"
+    hvp = optimizer._hvp_approach
+    hvp.target = policy
+    hvp.reg_coeff = optimizer._reg_coeff
+    hvp.opt_fun = dict(f_Hx_plain=policy.f_Hx_plain)
+    optimizer.init_par_objs(args.n_parallel, policy.W.size)
+
+    barrier = mp.Barrier(args.n_parallel)
+    results = mp.Queue()
+    processes = [
+        mp.Process(target=run_rank, args=(optimizer, policy, rank, args, barrier, results))
+        for rank in range(args.n_parallel)
+    ]
+    for p in processes:
+        p.start()
+    rank_results = [results.get() for _ in processes]
+    for p in processes:
+        p.join()
+    # per iteration, the slowest rank; the first iteration is left out (first touch of the shared pages)
+    opt_times = np.max([t for _, t, _, _ in rank_results], axis=0)[1:]
+    trajectory, params = [(np.array(traj), params) for rank, _, traj, params in rank_results if rank == 0][0]
+    return np.mean(opt_times), trajectory, params
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--n_parallel', type=int, default=2)
+    parser.add_argument('--obs_dim', type=int, default=20000)
+    parser.add_argument('--n_actions', type=int, default=18)
+    parser.add_argument('--n_samples', type=int, default=500)
+    parser.add_argument('--cg_iters', type=int, default=10)
+    parser.add_argument('--n_itr', type=int, default=10)
+    parser.add_argument('--rtol', type=float, default=1e-3)
+    args = parser.parse_args()
+
+    logger.disable()
+    rows = []
+    results = dict()
+    for precision, reduction in MODES:
+        opt_time, trajectory, params = run(args, precision, reduction)
+        results[(precision, reduction)] = (trajectory, params)
+        reference = results[MODES[0]][0]
+        rel_diff = np.max(np.abs(trajectory - reference) / np.abs(reference), axis=0)
+        rows.append([
+            precision, reduction, "%.1f" % (opt_time * 1e3), "%.2e" % rel_diff[0], "%.2e" % rel_diff[1],
+            "%.4f" % trajectory[-1, 0], "%.5f" % trajectory[-1, 1],
+        ])
+        assert np.allclose(trajectory, reference, rtol=args.rtol, atol=0)
+    print("n_params: %d" % (args.obs_dim * args.n_actions))
+    print_table(
+        ["precision", "reduction", "ms / update", "max rel diff loss", "max rel diff KL", "final loss", "final KL"],
+        rows)
@@ -0,0 +1,111 @@
+"""
+Memory of a worker batch of stacked 84x84 frames: AtariEnv's previous observations (a deque of the last screens, copied and rescaled to float64 [-1, 1] at every step and stacked by rollout) vs. uint8_frame_stack (stacks are views of a FrameRingBuffer, rollout(stacked_frames=True) stores each frame once and the observations are strided views of the frames).
+The envs emit random frames with the observation code of AtariEnv; the policy is a no-op. The batch is the concatenation of the paths' observations, as in process_samples; the rescaled uint8 batch is compared to the float64 one.
+Usage: PYTHONPATH=. python sandbox/haoran/hashing/bonus_trpo/benchmarks/bench_frame_stack.py --n_steps 5000 --n_last_screens 4
+"""
+import argparse
+import collections
+import numpy as np
+
+from rllab.misc import tensor_utils
+from rllab.sampler.utils import rollout
+from sandbox.haoran.hashing.bonus_trpo.envs.frame_ring_buffer import FrameRingBuffer
+from sandbox.haoran.hashing.bonus_trpo.benchmarks.util import measure, print_table
+
+class FlatSpace(object):
+    def flatten(self, x):
+        return np.asarray(x).flatten()
+
+class FrameEnv(object):
+    observation_space = FlatSpace()
+    action_space = FlatSpace()
+
+    def __init__(self, n_last_screens, path_length, uint8_frame_stack, img_size=84, seed=0):
+        self.n_last_screens = n_last_screens
+        self.path_length = path_length
+        self.uint8_frame_stack = uint8_frame_stack
+        self.img_size = img_size
+        self.rng = np.random.RandomState(seed)
+        if uint8_frame_stack:
+            self.frame_stack = FrameRingBuffer(n_last_screens, (img_size, img_size))
+
+    def current_screen(self):
+        return self.rng.randint(256, size=(self.img_size, self.img_size)).astype(np.uint8)
+
+    @property
+    def observation(self):
+        if self.uint8_frame_stack:
+            return self.frame_stack.stack()
+        imgs = np.asarray(list(self.last_screens))
+        imgs = (imgs / 255.0) * 2.0 - 1.0
+        return imgs
+
+    def reset(self):
+        self.t = 0
+        if self.uint8_frame_stack:
+            self.frame_stack.reset(self.current_screen())
+        else:
+            self.last_screens = collections.deque(
+                [np.zeros((self.img_size, self.img_size), dtype=np.uint8)] * (self.n_last_screens - 1) +
+                [self.current_screen()],
+                maxlen=self.n_last_screens)
+        return self.observation
+
+    def step(self, action):
+        self.t += 1
+        done = self.t >= self.path_length
+        if not done:
+            if self.uint8_frame_stack:
+                self.frame_stack.append(self.current_screen())
+            else:
+                self.last_screens.append(self.current_screen())
+        return self.observation, 0., done, dict()
+
+class NoopAgent(object):
+    def reset(self):
+        pass
+
+    def get_action(self, observation):
+        return 0, dict()
+
+def sample_batch(n_steps, path_length, n_last_screens, uint8_frame_stack):
+    env = FrameEnv(n_last_screens, path_length, uint8_frame_stack)
+    paths = []
+    n_steps_collected = 0
+    while n_steps_collected < n_steps:
+        paths.append(rollout(env, NoopAgent(), path_length, stacked_frames=uint8_frame_stack))
+        n_steps_collected += len(paths[-1]["rewards"])
+    path_bytes = sum(
+        path["frames"].nbytes if uint8_frame_stack else path["observations"].nbytes
+        for path in paths
+    )
+    observations = tensor_utils.concat_tensor_list([path["observations"] for path in paths])
+    return path_bytes, observations
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--n_steps', type=int, default=5000)
+    parser.add_argument('--path_length', type=int, default=500)
+    parser.add_argument('--n_last_screens', type=int, default=4)
+    args = parser.parse_args()
+
+    rows = []
+    reference = None
+    for uint8_frame_stack in [False, True]:
+        t, mem, (path_bytes, observations) = measure(
+            lambda: sample_batch(args.n_steps, args.path_length, args.n_last_screens, uint8_frame_stack),
+            n_repeat=1,
+        )
+        if reference is None:
+            reference = observations
+        else:
+            assert np.array_equal(reference, (observations / 255.0) * 2.0 - 1.0)
+        n_samples = len(observations)
+        rows.append([
+            "uint8 ring buffer" if uint8_frame_stack else "float64 deque",
+            "%.2f" % t,
+            "%.0f" % (path_bytes / n_samples),
+            "%.0f" % (observations.nbytes / n_samples),
+            "%.1f" % (mem / 1024. ** 2),
+        ])
+    print_table(["observations", "sec", "path bytes / sample", "batch bytes / sample", "peak MB"], rows)
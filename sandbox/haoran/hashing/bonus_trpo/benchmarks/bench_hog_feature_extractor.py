@@ -0,0 +1,221 @@
+"""
+HOGFeatureExtractor on 84x84 Atari frames: the previous per-image loop (coordinate grids and bilinear weights rebuilt per image, four np.add.at scatters, per-cell normalization) vs. the batched engine (geometry cached per image shape, one np.bincount per neighboring cell for the whole batch, float32 output).
+The loop versions below are the previous implementations, kept as references, except that their cell indices are clipped after adding the neighbor offsets (as in the batched engine); the outputs of both are compared.
+Usage: PYTHONPATH=. python sandbox/haoran/hashing/bonus_trpo/benchmarks/bench_hog_feature_extractor.py --batch_sizes 32 256 1024 --n_channels 1 4
+"""
+import argparse
+import numpy as np
+
+from sandbox.haoran.hashing.feature_extractors.hog_feature_extractor import HOGFeatureExtractor
+from sandbox.haoran.hashing.bonus_trpo.benchmarks.util import measure, print_table
+
+def loop_compute_hogs(extractor, images):
+    assert len(images.shape) == 4
+    hogs_u = loop_compute_unnormalized_hogs(extractor, images)
+    # shape: (batch_size, n_bins, hog_width, hog_height)
+
+    if extractor.variant == "vanilla":
+        # normalize within each cell
+        hogs = []
+        for hog_u in hogs_u:
+            normalizers = np.maximum(1e-6,np.sum(hog_u,axis=0))
+            hog = np.asarray([
+                h / normalizers
+                for h in hog_u
+            ])
+            hogs.append(hog)
+        hogs = np.asarray(hogs)
+    else:
+        raise NotImplementedError
+
+    return hogs
+
+
+def loop_compute_unnormalized_hogs(extractor, images):
+    cell_size = extractor.cell_size
+    num_orientations = extractor.num_orientations
+    n_bins = extractor.n_bins
+    batch_orientations, batch_orientation_weights, batch_grad_norms = loop_compute_discretized_grads(extractor, images)
+    hogs_u = []
+    for image, orientations, orientation_weights, grad_norms in \
+        zip(images, batch_orientations,batch_orientation_weights,batch_grad_norms):
+        n_channel, width, height = image.shape
+
+        # pixel coordinates (of pixel centers whose grads we computed)
+        x_pixel = np.outer(
+            np.asarray(range(1,width-1)),
+            np.ones(height-2),
+        ) + 0.5
+        y_pixel = np.outer(
+            np.ones(width-2),
+            np.asarray(range(1,height-1)),
+        ) + 0.5
+
+        # cell coordinates (top-left cell center is (0,0))
+        x_cell = x_pixel / cell_size - 0.5
+        y_cell = y_pixel / cell_size - 0.5
+
+        # cell indices: range: (0 ~ hog_width-1, 0 ~ hog_height-1)
+        x_bin = np.floor(x_cell)
+        y_bin = np.floor(y_cell)
+
+        # c_ij: cell center at hog row i, hog column j
+        # c_11 ----- c_12
+        # ---- pixel ----
+        # c_21 ----- c_22
+        w_right = x_cell - x_bin
+        w_left = 1. - w_right
+        w_bottom = y_cell - y_bin
+        w_top = 1. - w_bottom
+        if hasattr(extractor, "contribute_to_single_cell") and extractor.contribute_to_single_cell:
+            f = lambda w: (np.sign(w - 0.5)+1)*0.5 # 1 if > 0.5; 0 otherwise
+            w_right = f(w_right)
+            w_left = f(w_left)
+            w_bottom = f(w_bottom)
+            w_top = f(w_top)
+
+        hog_width = int((width + cell_size/2) // cell_size)
+        hog_height = int((height + cell_size/2) // cell_size)
+        hog_flat = np.zeros(
+            n_bins * hog_width * hog_height,
+            dtype=float
+        )
+
+        # hog indices: (bin, x, y)
+        indices_raw = (orientations * hog_width * hog_height + x_bin * hog_height + y_bin).astype(int).ravel()
+        indices_topleft = np.clip(indices_raw,0,len(hog_flat)-1)
+        indices_topright = np.clip(
+            indices_raw + hog_height,
+            0,len(hog_flat)-1,
+        )
+        indices_bottomleft = np.clip(
+            indices_raw + 1,
+            0,len(hog_flat)-1,
+        )
+        indices_bottomright = np.clip(
+            indices_raw + 1 + hog_height,
+            0,len(hog_flat)-1,
+        )
+
+        contributions = grad_norms * orientation_weights
+        add_topleft =  contributions * w_top * w_left * \
+            (x_bin >= 0) * (y_bin >= 0)
+        add_topright = contributions * w_top * w_right * \
+            (x_bin < hog_width - 1) * (y_bin >= 0)
+        add_bottomleft = contributions * w_bottom * w_left * \
+            (x_bin >= 0) * (y_bin < hog_height - 1)
+        add_bottomright = contributions * w_bottom * w_right * \
+            (x_bin < hog_width - 1) * (y_bin < hog_height - 1)
+        np.add.at(
+            hog_flat,
+            indices_topleft,
+            add_topleft.ravel(),
+        )
+        np.add.at(
+            hog_flat,
+            indices_topright,
+            add_topright.ravel(),
+        )
+        np.add.at(
+            hog_flat,
+            indices_bottomleft,
+            add_bottomleft.ravel(),
+        )
+        np.add.at(
+            hog_flat,
+            indices_bottomright,
+            add_bottomright.ravel(),
+        )
+        hog = hog_flat.reshape(
+            (n_bins,hog_width,hog_height)
+        )
+        hogs_u.append(hog)
+
+    return np.asarray(hogs_u)
+
+
+def loop_compute_discretized_grads(extractor, images):
+    num_orientations = extractor.num_orientations
+    oriented = extractor.oriented
+    n_bins = extractor.n_bins
+    # beware that opencv uses (index, height, width, channel)
+    batch_size, n_channel, width, height = images.shape
+    # x: width / column, y: height / row
+
+    # compute centered finite difference for pixels that stay one pixel away from the images border
+    # compute gradients channel-wise, and then pick the gradient with largest norm
+    all_grad_x = images[:,:,2:,1:-1] - images[:,:,:-2,1:-1]
+    all_grad_y = images[:,:,1:-1,2:] - images[:,:,1:-1,:-2]
+    all_gradnorm2 = all_grad_x ** 2 + all_grad_y ** 2
+    max_gradnorm2_channel = np.argmax(all_gradnorm2,axis=1)
+    grad_x = np.asarray([
+        np.choose(image_max_gradnorm2_channel,image_grad_x)
+        for image_max_gradnorm2_channel, image_grad_x in zip(max_gradnorm2_channel,all_grad_x)
+    ])
+    grad_y = np.asarray([
+        np.choose(image_max_gradnorm2_channel,image_grad_y)
+        for image_max_gradnorm2_channel, image_grad_y in zip(max_gradnorm2_channel,all_grad_y)
+    ])
+    grad_norms = np.sqrt(np.max(all_gradnorm2,axis=1))
+
+    half_orientation_weights = np.asarray(
+        [
+            grad_x * ox + grad_y * oy
+            for ox,oy in zip(extractor.orientation_x, extractor.orientation_y)
+        ]
+    ) # shape: (bin_index, batch_index, x, y)
+
+    half_orientations = np.argmax(
+        np.abs(half_orientation_weights),
+        axis=0,
+    )
+    if oriented:
+        signed_orientation_weights = np.choose(
+            half_orientations,
+            half_orientation_weights
+        )
+        orientation_weight_signs = np.sign(signed_orientation_weights)
+
+        # convert to orientations in [0,2*pi]
+        orientations = (
+            half_orientations + \
+            (1 - orientation_weight_signs)/2 * num_orientations
+        ).astype(int)
+        orientation_weights = np.abs(signed_orientation_weights)
+    else:
+        orientations = half_orientations
+        orientation_weights = half_orientation_weights
+
+    return orientations, orientation_weights, grad_norms
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--batch_sizes', type=int, nargs='+', default=[32, 256, 1024])
+    parser.add_argument('--n_channels', type=int, nargs='+', default=[1, 4])
+    parser.add_argument('--num_orientations', type=int, default=9)
+    parser.add_argument('--cell_size', type=int, default=8)
+    args = parser.parse_args()
+
+    hog = HOGFeatureExtractor(
+        num_orientations=args.num_orientations,
+        cell_size=args.cell_size,
+    )
+    rng = np.random.RandomState(0)
+    rows = []
+    for n_channel in args.n_channels:
+        for batch_size in args.batch_sizes:
+            # blocky frames in [0,1], like the rescaled grayscale screens of AtariEnv
+            images = np.repeat(np.repeat(
+                rng.randint(4, size=(batch_size, n_channel, 21, 21)) / 3.,
+                4, axis=2), 4, axis=3)
+            images += 0.01 * rng.randn(*images.shape)
+            t_loop, mem_loop, loop_hogs = measure(lambda: loop_compute_hogs(hog, images), n_repeat=1)
+            t_batch, mem_batch, hogs = measure(lambda: hog.compute_hogs(images))
+            assert np.allclose(loop_hogs, hogs, atol=1e-5)
+            rows.append([
+                n_channel, batch_size,
+                "%.4f" % t_loop, "%.4f" % t_batch, "%.1fx" % (t_loop / t_batch),
+                "%.1f" % (mem_loop / 1024. ** 2), "%.1f" % (mem_batch / 1024. ** 2),
+            ])
+    print_table(["channels", "batch size", "loop sec", "batch sec", "speedup", "loop MB", "batch MB"], rows)
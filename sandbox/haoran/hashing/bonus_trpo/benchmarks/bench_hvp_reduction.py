@@ -0,0 +1,91 @@
+"""
+Latency of the Hessian-vector products of ParallelConjugateGradientOptimizer (sandbox/adam/parallel) vs. the number of ranks, for each way of summing them over the ranks: reduction="columns" (each rank writes a strided column of an (n_params, n_parallel) buffer, then sums its share of the rows) vs. reduction="reduce_scatter" (contiguous rows, summed by columns) with a float64 or float32 buffer.
+The compiled f_Hx_plain is replaced by an elementwise product with a fixed vector per rank (a diagonal Hessian), which costs the same in every mode, so the differences come from the reduction; the result of the last product is compared to the exact one. Each rank times n_evals products in a row, as in krylov.cg; the latency is the maximum over the ranks.
+Usage: PYTHONPATH=. python sandbox/haoran/hashing/bonus_trpo/benchmarks/bench_hvp_reduction.py --n_params 1000000 --n_parallel 1 2 4 8 --n_evals 20
+"""
+import argparse
+import multiprocessing as mp
+import time
+import numpy as np
+
+from sandbox.adam.parallel.conjugate_gradient_optimizer import ParallelConjugateGradientOptimizer
+from sandbox.haoran.hashing.bonus_trpo.benchmarks.util import print_table
+
+MODES = [("columns", "float64"), ("reduce_scatter", "float64"), ("reduce_scatter", "float32")]
+REG_COEFF = 1e-5
+X_SEED = 1234
+
+class FlatTarget(object):
+    def flat_to_params(self, flat_params, trainable=True):
+        return [flat_params]
+
+def diagonal(rank, n_params):
+    return np.random.RandomState(rank).uniform(0., 1., n_params)
+
+def run_rank(optimizer, rank, args, results):
+    optimizer.init_rank(rank)
+    hvp = optimizer._hvp_approach
+    d = diagonal(rank, args.n_params)
+    hvp.opt_fun = dict(f_Hx_plain=lambda _, x: d * x)
+    Hx = hvp.build_eval(inputs=(np.zeros(1),))
+    x = np.random.RandomState(X_SEED).uniform(-1., 1., args.n_params)
+    Hx(x)  # (first touch of the shared pages)
+    start = time.time()
+    for _ in range(args.n_evals):
+        z = Hx(x)
+    elapsed = time.time() - start
+    results.put((rank, elapsed, z.copy() if rank == 0 else None))
+
+def run(args, n_parallel, reduction, reduction_dtype):
+    optimizer = ParallelConjugateGradientOptimizer(reduction=reduction, reduction_dtype=reduction_dtype)
+    hvp = optimizer._hvp_approach
+    hvp.target = FlatTarget()
+    hvp.reg_coeff = REG_COEFF
+    optimizer.init_par_objs(n_parallel, args.n_params)
+    results = mp.Queue()
+    processes = [
+        mp.Process(target=run_rank, args=(optimizer, rank, args, results))
+        for rank in range(n_parallel)
+    ]
+    for p in processes:
+        p.start()
+    rank_results = [results.get() for _ in processes]
+    for p in processes:
+        p.join()
+    elapsed = max(t for _, t, _ in rank_results)
+    z = [z for rank, _, z in rank_results if rank == 0][0]
+    return elapsed / args.n_evals, z
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--n_params', type=int, default=1000000)
+    parser.add_argument('--n_parallel', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--n_evals', type=int, default=20)
+    args = parser.parse_args()
+
+    x = np.random.RandomState(X_SEED).uniform(-1., 1., args.n_params)
+    d = np.random.RandomState(0).uniform(0., 1., args.n_params)
+    start = time.time()
+    for _ in range(args.n_evals):
+        d * x
+    print("f_Hx_plain alone: %.2f ms" % ((time.time() - start) / args.n_evals * 1e3))
+
+    rows = []
+    for n_parallel in args.n_parallel:
+        expected = np.mean([diagonal(rank, args.n_params) for rank in range(n_parallel)], axis=0) * x + REG_COEFF * x
+        latencies = []
+        for reduction, reduction_dtype in MODES:
+            latency, z = run(args, n_parallel, reduction, reduction_dtype)
+            if reduction_dtype == "float64":
+                assert np.allclose(z, expected, rtol=1e-12, atol=0)
+            else:
+                assert np.allclose(z, expected, rtol=1e-6, atol=1e-7)
+            latencies.append(latency)
+        rows.append(
+            [n_parallel] + ["%.2f" % (t * 1e3) for t in latencies] +
+            ["%.2f" % (latencies[0] / t) for t in latencies[1:]]
+        )
+    print_table(
+        ["n_parallel"] + ["%s %s ms" % mode for mode in MODES] +
+        ["speedup %s %s" % mode for mode in MODES[1:]],
+        rows)
@@ -0,0 +1,66 @@
+"""
+Serial ALEHackyHash counting: the previous Python dict (one lookup per key) vs. DenseKeyCounter and SortedKeyCounter.
+Each iteration increments and then queries a batch of keys drawn from a growing set of visited states, like update_count / compute_bonus in ALEHashingBonusEvaluator.
+Usage: PYTHONPATH=. python sandbox/haoran/hashing/bonus_trpo/benchmarks/bench_key_counters.py --batch_size 50000 --n_keys 6303744
+"""
+import argparse
+import numpy as np
+
+from sandbox.haoran.hashing.bonus_trpo.bonus_evaluators.hash.key_counters import DenseKeyCounter, SortedKeyCounter
+from sandbox.haoran.hashing.bonus_trpo.benchmarks.util import measure, print_table
+
+class DictCounter(object):
+    """ the previous serial counter """
+    def __init__(self):
+        self.table = dict()
+
+    def inc(self, keys):
+        for key in keys:
+            if key not in self.table:
+                self.table[key] = 1
+            else:
+                self.table[key] += 1
+
+    def query(self, keys):
+        counts = []
+        for key in keys:
+            if key not in self.table:
+                counts.append(0)
+            else:
+                counts.append(self.table[key])
+        return counts
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--n_itr', type=int, default=10)
+    parser.add_argument('--batch_size', type=int, default=50000)
+    parser.add_argument('--n_keys', type=int, default=6303744,
+                        help='size of the key space (room, x, y, objects of Montezuma\'s Revenge by default)')
+    parser.add_argument('--new_states_per_itr', type=int, default=5000)
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(0)
+    visited = rng.randint(args.n_keys, size=args.n_itr * args.new_states_per_itr)
+    batches = [
+        visited[rng.randint((itr + 1) * args.new_states_per_itr, size=args.batch_size)]
+        for itr in range(args.n_itr)
+    ]
+
+    rows = []
+    results = dict()
+    for name, make_counter in [
+            ("dict", DictCounter),
+            ("dense", lambda: DenseKeyCounter(args.n_keys)),
+            ("sorted", SortedKeyCounter),
+        ]:
+        counter = make_counter()
+        def run():
+            for keys in batches:
+                counter.inc(keys)
+                counts = counter.query(keys)
+            return np.asarray(counts)
+        t, _, counts = measure(run, n_repeat=1)
+        results[name] = counts
+        assert np.array_equal(counts, results["dict"])
+        rows.append([name, "%.4f" % (t / args.n_itr)])
+    print_table(["counter", "inc + query sec / itr"], rows)
@@ -0,0 +1,59 @@
+"""
+Key retrieval over a batch of paths: the previous retrieve_keys (keys concatenated onto a growing array path by path, and again in fit_before_process_samples) vs. retrieve_path_keys (one preallocated array, chunked preprocessing + projection, per-path views).
+States are 84x84x4 uint8 frames, vectorized by ImageVectorizePreprocessor and hashed by PackedSimHash.
+Reported: wall-clock time and the peak memory allocated by the retrieval (the frames themselves are excluded).
+Usage: PYTHONPATH=. python sandbox/haoran/hashing/bonus_trpo/benchmarks/bench_key_retrieval.py --n_steps 50000 --chunk_sizes 1000 5000
+"""
+import argparse
+import numpy as np
+
+from sandbox.haoran.hashing.bonus_trpo.bonus_evaluators.preprocessor.image_vectorize_preprocessor import ImageVectorizePreprocessor
+from sandbox.haoran.hashing.bonus_trpo.bonus_evaluators.hash.packed_sim_hash import PackedSimHash
+from sandbox.haoran.hashing.bonus_trpo.bonus_evaluators.key_retrieval import retrieve_path_keys
+from sandbox.haoran.hashing.bonus_trpo.benchmarks.util import measure, print_table
+
+BUCKET_SIZES = [999931, 999953, 999959, 999961, 999979, 999983]
+
+def concatenating_retrieve_keys(paths, compute_keys, retrieve_sample_size=np.inf):
+    """ the previous retrieve_keys, followed by the concatenation in fit_before_process_samples """
+    keys = None
+    for path in paths:
+        path_len = len(path["rewards"])
+        k = min(path_len, retrieve_sample_size)
+        for i in range(0,path_len,k):
+            new_keys = compute_keys(path["observations"][i:i+k])
+            if keys is None:
+                keys = new_keys
+            else:
+                keys = np.concatenate([keys,new_keys])
+        path["keys"] = keys[-path_len:]
+    return np.concatenate([path["keys"] for path in paths])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--n_steps', type=int, default=50000)
+    parser.add_argument('--path_len', type=int, default=500)
+    parser.add_argument('--dim_key', type=int, default=64)
+    parser.add_argument('--chunk_sizes', type=int, nargs='+', default=[1000, 5000])
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(0)
+    frames = rng.randint(256, size=(args.n_steps, 4, 84, 84)).astype(np.uint8)
+    preprocessor = ImageVectorizePreprocessor(n_channel=4, width=84, height=84)
+    hash = PackedSimHash(preprocessor.get_output_dim(), dim_key=args.dim_key, bucket_sizes=BUCKET_SIZES)
+    compute_keys = lambda states: hash.compute_keys(preprocessor.process(states))
+
+    def make_paths():
+        return [
+            dict(observations=frames[i:i + args.path_len], rewards=np.zeros(len(frames[i:i + args.path_len])))
+            for i in range(0, args.n_steps, args.path_len)
+        ]
+
+    rows = []
+    t, peak, ref_keys = measure(lambda: concatenating_retrieve_keys(make_paths(), compute_keys), n_repeat=1)
+    rows.append(["concatenate, whole paths", "%.3f" % t, "%.1f" % (peak / 1024. ** 2)])
+    for chunk_size in [np.inf] + args.chunk_sizes:
+        t, peak, keys = measure(lambda: retrieve_path_keys(make_paths(), compute_keys, chunk_size=chunk_size), n_repeat=1)
+        assert np.array_equal(keys, ref_keys)
+        rows.append(["preallocated, chunk %s" % chunk_size, "%.3f" % t, "%.1f" % (peak / 1024. ** 2)])
+    print_table(["retrieval", "sec", "peak MB"], rows)
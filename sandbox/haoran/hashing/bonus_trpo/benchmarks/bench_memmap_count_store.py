@@ -0,0 +1,85 @@
+"""
+Per-iteration snapshot cost of SimHash count tables: the previous snapshot_list path (the whole tables are deep-copied and dumped by joblib in every logger.save_itr_params) vs. a persistent CountMinSketch, whose MemmapCountStore only writes the pages changed during the iteration.
+Each iteration increments the keys of a batch drawn from a slowly growing set of visited states, then snapshots with joblib.dump(compress=3) like the logger (after MemmapCountStore.snapshot_all() for the sketch, like the training loops). The last snapshot is loaded back in the same process: its counts must equal the live ones without sharing them.
+Usage: PYTHONPATH=. python sandbox/haoran/hashing/bonus_trpo/benchmarks/bench_memmap_count_store.py --n_itr 10 --batch_size 50000
+"""
+import argparse
+import copy
+import os
+import shutil
+import tempfile
+import joblib
+import numpy as np
+
+from rllab.misc import logger
+from sandbox.haoran.hashing.bonus_trpo.bonus_evaluators.hash.count_min_sketch import CountMinSketch
+from sandbox.haoran.hashing.bonus_trpo.bonus_evaluators.hash.memmap_count_store import MemmapCountStore
+from sandbox.haoran.hashing.bonus_trpo.benchmarks.util import measure, print_table
+
+BUCKET_SIZES = [999931, 999953, 999959, 999961, 999979, 999983]
+
+def snapshot_sketch(sketch, file_name):
+    MemmapCountStore.snapshot_all()
+    joblib.dump(dict(sketch=sketch), file_name, compress=3)
+
+def dir_size(dir_name):
+    """ allocated bytes of the snapshots (pickles and deltas) and of the live count files, which are sparse """
+    sizes = [0, 0]
+    for f in os.listdir(dir_name):
+        sizes[f.endswith(".dat")] += os.stat(os.path.join(dir_name, f)).st_blocks * 512
+    return sizes
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--n_itr', type=int, default=10)
+    parser.add_argument('--batch_size', type=int, default=50000)
+    parser.add_argument('--new_states_per_itr', type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(0)
+    codes = rng.randint(2**62, size=args.n_itr * args.new_states_per_itr)
+    batches = []
+    for itr in range(args.n_itr):
+        n_visited = (itr + 1) * args.new_states_per_itr
+        batch_codes = codes[rng.randint(n_visited, size=args.batch_size)]
+        batches.append(np.stack([batch_codes % b for b in BUCKET_SIZES], axis=1))
+
+    rows = []
+    for method in ["deep copy", "memmap deltas"]:
+        snapshot_dir = tempfile.mkdtemp()
+        logger.set_snapshot_dir(snapshot_dir)
+        if method == "deep copy":
+            tables = np.zeros((len(BUCKET_SIZES), max(BUCKET_SIZES)), dtype=np.int32)
+        else:
+            sketch = CountMinSketch(bucket_sizes=BUCKET_SIZES, persistent=True)
+        snapshot_times = []
+        for itr, keys in enumerate(batches):
+            if method == "deep copy":
+                for idx in range(len(BUCKET_SIZES)):
+                    np.add.at(tables[idx], keys[:, idx], 1)
+                snapshot = lambda: joblib.dump(
+                    dict(tables=copy.deepcopy(tables)),
+                    os.path.join(snapshot_dir, "itr_%d.pkl" % itr), compress=3)
+            else:
+                sketch.inc(keys)
+                snapshot = lambda: snapshot_sketch(sketch, os.path.join(snapshot_dir, "itr_%d.pkl" % itr))
+            t, _, _ = measure(snapshot, n_repeat=1)
+            snapshot_times.append(t)
+        snapshot_bytes, live_bytes = dir_size(snapshot_dir)
+        last_snapshot = os.path.join(snapshot_dir, "itr_%d.pkl" % (args.n_itr - 1))
+        t_resume, _, loaded = measure(lambda: joblib.load(last_snapshot), n_repeat=1)
+        if method == "memmap deltas":
+            resumed = loaded["sketch"]
+            assert np.array_equal(resumed.tables, sketch.tables)
+            assert resumed.tables_store.file_name != sketch.tables_store.file_name
+            resumed.tables[0, 0] += 1
+            assert resumed.tables[0, 0] != sketch.tables[0, 0]
+        rows.append([
+            method,
+            "%.3f" % np.mean(snapshot_times),
+            "%.1f" % (snapshot_bytes / 1024. ** 2),
+            "%.1f" % (live_bytes / 1024. ** 2),
+            "%.3f" % t_resume,
+        ])
+        shutil.rmtree(snapshot_dir)
+    print_table(["snapshot", "sec / itr", "snapshots MB", "live file MB", "resume sec"], rows)
@@ -0,0 +1,40 @@
+"""
+Compare SimHashV3 (float64 signs dotted with mods_list) against PackedSimHash (float32 projection, uint64 packed codes) in keys/sec and peak memory of compute_keys.
+Usage: PYTHONPATH=. python sandbox/haoran/hashing/bonus_trpo/benchmarks/bench_packed_sim_hash.py --batch_size 5000
+"""
+import argparse
+import numpy as np
+
+from sandbox.haoran.hashing.bonus_trpo.bonus_evaluators.hash.sim_hash_v3 import SimHashV3
+from sandbox.haoran.hashing.bonus_trpo.bonus_evaluators.hash.packed_sim_hash import PackedSimHash
+from sandbox.haoran.hashing.bonus_trpo.benchmarks.util import measure, print_table
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--item_dim', type=int, default=84 * 84 * 4)
+    parser.add_argument('--batch_size', type=int, default=5000)
+    parser.add_argument('--dim_keys', type=int, nargs='+', default=[64, 128, 256, 512])
+    parser.add_argument('--n_repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    bucket_sizes = [999931, 999953, 999959, 999961, 999979, 999983]
+    # AtariEnv observations are scaled to [-1,1]
+    items = np.random.uniform(-1, 1, size=(args.batch_size, args.item_dim))
+
+    rows = []
+    for dim_key in args.dim_keys:
+        np.random.seed(0)
+        hashes = [
+            ("SimHashV3", SimHashV3(item_dim=args.item_dim, dim_key=dim_key, bucket_sizes=bucket_sizes)),
+            ("PackedSimHash", PackedSimHash(item_dim=args.item_dim, dim_key=dim_key, bucket_sizes=bucket_sizes)),
+        ]
+        for name, h in hashes:
+            t, peak, _ = measure(lambda: h.compute_keys(items), args.n_repeat)
+            rows.append([
+                name,
+                dim_key,
+                "%.0f" % (args.batch_size / t),
+                "%.1f" % (peak / 1024.**2),
+                "%.1f" % (h.projection_matrix.nbytes / 1024.**2),
+            ])
+    print_table(["hash", "dim_key", "keys/sec", "peak MB", "projection MB"], rows)
@@ -0,0 +1,65 @@
+"""
+Time per call of parallel_sampler.sample_paths when the sampling itself is negligible (one short path per worker), with policies of n_params parameters: the previous broadcast (run_each of _worker_set_policy_params, which pickles the parameters once per worker and waits for all of them) vs. ParamBroadcast (the parameters are written into shared memory, and every worker picks them up at the start of its next rollout).
+The policy acts at random and records its first and last parameters in its agent_infos, which are checked against the parameters of each call.
+Usage: PYTHONPATH=. python sandbox/haoran/hashing/bonus_trpo/benchmarks/bench_param_broadcast.py --n_parallel 4 --n_params 100000 1000000 4000000
+"""
+import argparse
+import time
+import numpy as np
+
+from rllab.envs.grid_world_env import GridWorldEnv
+from rllab.sampler import parallel_sampler
+from sandbox.haoran.hashing.bonus_trpo.benchmarks.util import print_table
+
+class ParamPolicy(object):
+    def __init__(self, n_params):
+        self.params = np.zeros(n_params, dtype=np.float32)
+
+    def get_param_values(self):
+        return self.params.copy()
+
+    def set_param_values(self, params):
+        self.params[:] = params
+
+    def reset(self):
+        pass
+
+    def get_action(self, observation):
+        return np.random.randint(4), dict(first_param=self.params[0], last_param=self.params[-1])
+
+    def terminate(self):
+        pass
+
+def sample(n_params, n_itr, broadcast):
+    env = GridWorldEnv(desc="4x4_safe")
+    policy = ParamPolicy(n_params)
+    parallel_sampler.populate_task(env, policy)
+    if not broadcast:
+        # as before ParamBroadcast
+        parallel_sampler._param_broadcasts.pop(None)
+    times = []
+    for itr in range(n_itr):
+        params = np.full(n_params, itr + 1, dtype=np.float32)
+        start = time.time()
+        paths = parallel_sampler.sample_paths(params, max_samples=1, max_path_length=1)
+        times.append(time.time() - start)
+        for path in paths:
+            assert np.all(path["agent_infos"]["first_param"] == itr + 1)
+            assert np.all(path["agent_infos"]["last_param"] == itr + 1)
+    parallel_sampler.terminate_task()
+    return np.median(times)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--n_parallel', type=int, default=4)
+    parser.add_argument('--n_params', type=int, nargs='+', default=[100000, 1000000, 4000000])
+    parser.add_argument('--n_itr', type=int, default=10)
+    args = parser.parse_args()
+
+    parallel_sampler.initialize(args.n_parallel)
+    rows = []
+    for n_params in args.n_params:
+        t_run_each = sample(n_params, args.n_itr, broadcast=False)
+        t_broadcast = sample(n_params, args.n_itr, broadcast=True)
+        rows.append([n_params, "%.1f" % (t_run_each * 1e3), "%.1f" % (t_broadcast * 1e3)])
+    print_table(["params", "run_each ms / call", "ParamBroadcast ms / call"], rows)
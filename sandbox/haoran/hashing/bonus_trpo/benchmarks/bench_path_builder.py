@@ -0,0 +1,101 @@
+"""
+Per-step overhead of rollout on cheap envs: the previous rollout (per-step values appended to lists, stacked into arrays at the end of the path) vs. the current one (PathBuilder, preallocated buffers sized by max_path_length).
+The agent samples uniformly random actions from the action space, so the time is that of the env and of the path bookkeeping. Both rollouts see the same random actions, and their paths are compared.
+Usage: PYTHONPATH=. python sandbox/haoran/hashing/bonus_trpo/benchmarks/bench_path_builder.py --envs grid_world cartpole --n_steps 20000
+"""
+import argparse
+import time
+import numpy as np
+
+from rllab.misc import tensor_utils
+from rllab.sampler.utils import rollout
+from sandbox.haoran.hashing.bonus_trpo.benchmarks.util import print_table
+
+def list_rollout(env, agent, max_path_length=np.inf):
+    observations = []
+    actions = []
+    rewards = []
+    agent_infos = []
+    env_infos = []
+    o = env.reset()
+    agent.reset()
+    path_length = 0
+    while path_length < max_path_length:
+        a, agent_info = agent.get_action(o)
+        next_o, r, d, env_info = env.step(a)
+        observations.append(env.observation_space.flatten(o))
+        rewards.append(r)
+        actions.append(env.action_space.flatten(a))
+        agent_infos.append(agent_info)
+        env_infos.append(env_info)
+        path_length += 1
+        if d:
+            break
+        o = next_o
+    return dict(
+        observations=tensor_utils.stack_tensor_list(observations),
+        actions=tensor_utils.stack_tensor_list(actions),
+        rewards=tensor_utils.stack_tensor_list(rewards),
+        agent_infos=tensor_utils.stack_tensor_dict_list(agent_infos),
+        env_infos=tensor_utils.stack_tensor_dict_list(env_infos),
+    )
+
+class RandomAgent(object):
+    def __init__(self, action_space):
+        self.action_space = action_space
+
+    def reset(self):
+        pass
+
+    def get_action(self, observation):
+        return self.action_space.sample(), dict()
+
+def make_env(name):
+    if name == "grid_world":
+        from rllab.envs.grid_world_env import GridWorldEnv
+        return GridWorldEnv(desc="8x8")
+    elif name == "cartpole":
+        from rllab.envs.box2d.cartpole_env import CartpoleEnv
+        return CartpoleEnv()
+    else:
+        raise NotImplementedError
+
+def sample(rollout_fn, env, n_steps, max_path_length):
+    np.random.seed(0)
+    agent = RandomAgent(env.action_space)
+    paths = []
+    n_steps_collected = 0
+    start = time.time()
+    while n_steps_collected < n_steps:
+        paths.append(rollout_fn(env, agent, max_path_length))
+        n_steps_collected += len(paths[-1]["rewards"])
+    return (time.time() - start) / n_steps_collected, paths
+
+def assert_paths_equal(paths, other_paths):
+    assert len(paths) == len(other_paths)
+    for path, other_path in zip(paths, other_paths):
+        for k in ["observations", "actions", "rewards"]:
+            assert np.array_equal(path[k], other_path[k])
+        for k in ["agent_infos", "env_infos"]:
+            assert sorted(path[k].keys()) == sorted(other_path[k].keys())
+            for info_key in path[k]:
+                assert np.array_equal(path[k][info_key], other_path[k][info_key])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--envs', type=str, nargs='+', default=["grid_world", "cartpole"])
+    parser.add_argument('--n_steps', type=int, default=20000)
+    parser.add_argument('--max_path_length', type=int, default=500)
+    args = parser.parse_args()
+
+    rows = []
+    for env_name in args.envs:
+        env = make_env(env_name)
+        t_list, list_paths = sample(list_rollout, env, args.n_steps, args.max_path_length)
+        t_builder, builder_paths = sample(rollout, env, args.n_steps, args.max_path_length)
+        assert_paths_equal(list_paths, builder_paths)
+        rows.append([
+            env_name, "%.1f" % np.mean([len(path["rewards"]) for path in list_paths]),
+            "%.1f" % (t_list * 1e6), "%.1f" % (t_builder * 1e6),
+        ])
+    print_table(["env", "mean path length", "lists us / step", "PathBuilder us / step"], rows)
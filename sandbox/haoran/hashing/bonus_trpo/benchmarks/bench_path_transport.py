@@ -0,0 +1,111 @@
+"""
+Time for StatefulPool.run_collect to return image-sized paths from its workers: the previous run_collect (paths pickled through the pool's result pipe, progress counted in a Manager Value under a Manager RLock) vs. the current one with transport="pickle" (same pipe, shared-memory counter) and transport="shm" (arrays written to /dev/shm, only descriptors pickled).
+The workers generate random paths without an env or a policy, so the times are those of the counting and of the transport. Every returned path is compared with the one its worker generated; the previous run_collect is kept below as a reference.
+Usage: PYTHONPATH=. python sandbox/haoran/hashing/bonus_trpo/benchmarks/bench_path_transport.py --n_parallel 4 --n_samples 20000 --path_length 500
+"""
+import argparse
+import contextlib
+import io
+import multiprocessing as mp
+import re
+import time
+import numpy as np
+
+from rllab.sampler.stateful_pool import singleton_pool
+from sandbox.haoran.hashing.bonus_trpo.benchmarks.util import print_table
+
+def previous_run_collect(pool, collect_once, threshold, args):
+    manager = mp.Manager()
+    counter = manager.Value('i', 0)
+    lock = manager.RLock()
+    results = pool.pool.map_async(
+        _previous_worker_run_collect,
+        [(collect_once, counter, lock, threshold, args)] * pool.n_parallel
+    )
+    while True:
+        time.sleep(0.1)
+        with lock:
+            if counter.value >= threshold:
+                break
+    start = time.time()
+    out = sum(results.get(), [])
+    return out, time.time() - start
+
+def _previous_worker_run_collect(all_args):
+    collect_once, counter, lock, threshold, args = all_args
+    collected = []
+    while True:
+        with lock:
+            if counter.value >= threshold:
+                return collected
+        result, inc = collect_once(singleton_pool.G, *args)
+        collected.append(result)
+        with lock:
+            counter.value += inc
+            if counter.value >= threshold:
+                return collected
+
+def _worker_init(G, worker_id):
+    G.worker_id = worker_id
+    G.n_paths = 0
+
+def make_path(path_id, path_length, obs_shape):
+    rng = np.random.RandomState(path_id)
+    return dict(
+        path_id=np.asarray(path_id),
+        observations=rng.uniform(-1, 1, (path_length,) + obs_shape).astype(np.float32),
+        actions=rng.randint(18, size=path_length),
+        rewards=rng.uniform(size=path_length),
+        agent_infos=dict(prob=rng.uniform(size=(path_length, 18))),
+        env_infos=dict(lives_lost=np.zeros(path_length, dtype=bool)),
+    )
+
+def _collect_one_path(G, path_length, obs_shape):
+    path_id = G.worker_id * 1000000 + G.n_paths
+    G.n_paths += 1
+    return make_path(path_id, path_length, obs_shape), path_length
+
+def check_paths(paths, path_length, obs_shape):
+    for path in paths:
+        expected = make_path(int(path["path_id"]), path_length, obs_shape)
+        for k in ["observations", "actions", "rewards"]:
+            assert np.array_equal(path[k], expected[k])
+        assert np.array_equal(path["agent_infos"]["prob"], expected["agent_infos"]["prob"])
+        assert np.array_equal(path["env_infos"]["lives_lost"], expected["env_infos"]["lives_lost"])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--n_parallel', type=int, default=4)
+    parser.add_argument('--n_samples', type=int, default=20000)
+    parser.add_argument('--path_length', type=int, default=500)
+    parser.add_argument('--obs_shape', type=int, nargs='+', default=[52, 52, 4])
+    parser.add_argument('--n_repeat', type=int, default=3)
+    args = parser.parse_args()
+    obs_shape = tuple(args.obs_shape)
+
+    rows = []
+    for name, transport in [("previous", "pickle"), ("shared counter", "pickle"), ("shared counter", "shm")]:
+        # the workers read the pool from the module, as in rllab.sampler.parallel_sampler
+        singleton_pool.initialize(args.n_parallel, transport=transport)
+        singleton_pool.run_each(_worker_init, [(i,) for i in range(args.n_parallel)])
+        collect_args = (args.path_length, obs_shape)
+        best_total, best_return = np.inf, np.inf
+        for _ in range(args.n_repeat):
+            start = time.time()
+            if name == "previous":
+                paths, return_time = previous_run_collect(singleton_pool, _collect_one_path, args.n_samples, collect_args)
+            else:
+                output = io.StringIO()
+                with contextlib.redirect_stdout(output):
+                    paths = singleton_pool.run_collect(
+                        _collect_one_path, args.n_samples, collect_args, show_prog_bar=False)
+                return_time = float(re.search(r"Returning results \((.*) sec\)", output.getvalue()).group(1))
+            best_total = min(best_total, time.time() - start)
+            best_return = min(best_return, return_time)
+            check_paths(paths, args.path_length, obs_shape)
+        n_bytes = sum(path["observations"].nbytes for path in paths)
+        rows.append([
+            name, transport, len(paths), "%.0f" % (n_bytes / 1024. ** 2),
+            "%.3f" % best_return, "%.3f" % best_total,
+        ])
+    print_table(["run_collect", "transport", "paths", "obs MB", "returning results sec", "total sec"], rows)
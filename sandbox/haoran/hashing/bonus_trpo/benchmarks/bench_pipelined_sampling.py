@@ -0,0 +1,105 @@
+"""
+Wall-clock time per iteration and samples per second of ParallelBatchPolopt (sandbox/haoran/parallel_trpo)._train with n_parallel ranks: synchronous (sampling_staleness=0, the ranks sample, then optimize) vs. pipelined (sampling_staleness >= 1, sampler processes collect the next batch while the ranks optimize, see SamplingPipeline).
+The env sleeps step_time per step and the policy update sleeps opt_time, so that the samplers and the ranks overlap as on separate cores however many cores there are. Each update increments the policy parameters, and the policy records them in its agent_infos, so that every batch is checked to come from a policy at most sampling_staleness updates behind (exactly up to date when synchronous).
+Usage: PYTHONPATH=. python sandbox/haoran/hashing/bonus_trpo/benchmarks/bench_pipelined_sampling.py --n_parallel 2 --batch_size 4000 --opt_time 1 --staleness 0 1 2
+"""
+import argparse
+import time
+import numpy as np
+
+import rllab.misc.logger as logger
+from rllab.sampler.shm_transport import SharedCounter
+from sandbox.adam.parallel.zero_baseline import ParallelZeroBaseline
+from sandbox.haoran.parallel_trpo.batch_polopt import ParallelBatchPolopt
+from sandbox.haoran.hashing.bonus_trpo.benchmarks.bench_work_stealing import SleepEnv
+from sandbox.haoran.hashing.bonus_trpo.benchmarks.util import print_table
+
+class ZeroEntropy(object):
+    def entropy(self, dist_info):
+        return np.zeros(len(dist_info["param"]))
+
+class CountingPolicy(object):
+    recurrent = False
+    state_info_keys = []
+    distribution = ZeroEntropy()
+
+    def __init__(self):
+        self.params = np.zeros(1)
+
+    def get_param_values(self):
+        return self.params.copy()
+
+    def set_param_values(self, params):
+        self.params[:] = params
+
+    def reset(self):
+        pass
+
+    def get_action(self, observation):
+        return np.random.randint(2), dict(param=self.params[0])
+
+class NoOptimizer(object):
+    def init_rank(self, rank):
+        pass
+
+class SleepPolopt(ParallelBatchPolopt):
+    def __init__(self, opt_time, **kwargs):
+        self.opt_time = opt_time
+        self.optimizer = NoOptimizer()
+        self.n_steps_optimized = SharedCounter()
+        super(SleepPolopt, self).__init__(**kwargs)
+
+    def init_opt(self):
+        pass
+
+    def init_par_objs(self):
+        self._init_par_objs_batchpolopt()
+
+    def get_itr_snapshot(self, itr, samples_data):
+        return dict()
+
+    def optimize_policy(self, itr, samples_data):
+        n_updates = self.policy.params[0]
+        assert n_updates == itr
+        sampled_with = samples_data["agent_infos"]["param"]
+        assert np.all(sampled_with <= n_updates) and np.all(sampled_with >= n_updates - self.sampling_staleness)
+        self.n_steps_optimized.add(self.n_steps_collected)
+        time.sleep(self.opt_time)
+        self.policy.set_param_values(self.policy.params + 1)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--n_parallel', type=int, default=2)
+    parser.add_argument('--batch_size', type=int, default=4000)
+    parser.add_argument('--min_path_length', type=int, default=50)
+    parser.add_argument('--step_time', type=float, default=5e-4)
+    parser.add_argument('--opt_time', type=float, default=1.)
+    parser.add_argument('--staleness', type=int, nargs='+', default=[0, 1, 2])
+    parser.add_argument('--n_itr', type=int, default=5)
+    args = parser.parse_args()
+
+    logger.disable()
+    rows = []
+    for staleness in args.staleness:
+        algo = SleepPolopt(
+            opt_time=args.opt_time,
+            env=SleepEnv(args.min_path_length, args.step_time, seed=0),
+            policy=CountingPolicy(),
+            baseline=ParallelZeroBaseline(None),
+            n_itr=args.n_itr,
+            batch_size=args.batch_size,
+            max_path_length=np.inf,
+            n_parallel=args.n_parallel,
+            serial_compile=False,
+            log_memory_usage=False,
+            sampling_staleness=staleness,
+        )
+        start = time.time()
+        algo.train()
+        elapsed = time.time() - start
+        n_steps = algo.n_steps_optimized.value
+        rows.append([
+            staleness, "%.3f" % (elapsed / args.n_itr), "%.0f" % (n_steps / float(args.n_itr)),
+            "%.0f" % (n_steps / elapsed),
+        ])
+    print_table(["sampling_staleness", "sec / itr", "samples / itr", "samples / sec"], rows)
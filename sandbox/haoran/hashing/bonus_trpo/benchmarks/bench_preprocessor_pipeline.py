@@ -0,0 +1,76 @@
+"""
+State preprocessing before hashing: the previous preprocessors applied one after the other (per-item list comprehensions, a fresh array per stage) vs. a PreprocessorPipeline of the same stages (strided views, computed stages written into buffers reused across calls).
+Chains:
+- frame diff: HOGFrameSequencePreprocessor on 4 stacked 84x84 frames, then ImageVectorizePreprocessor keeping every other pixel
+- rgb: HOGRGBPreprocessor on 210x160 RGB frames, then ImageVectorizePreprocessor keeping one channel
+The loop versions below are the previous implementations, kept as references; the outputs of both are compared.
+Usage: PYTHONPATH=. python sandbox/haoran/hashing/bonus_trpo/benchmarks/bench_preprocessor_pipeline.py --batch_sizes 100 1000
+"""
+import argparse
+import numpy as np
+
+from sandbox.haoran.hashing.bonus_trpo.bonus_evaluators.preprocessor.preprocessor_pipeline import PreprocessorPipeline
+from sandbox.haoran.hashing.bonus_trpo.bonus_evaluators.preprocessor.hog_frame_sequence_preprocessor import HOGFrameSequencePreprocessor
+from sandbox.haoran.hashing.bonus_trpo.bonus_evaluators.preprocessor.hog_rgb_preprocessor import HOGRGBPreprocessor
+from sandbox.haoran.hashing.bonus_trpo.bonus_evaluators.preprocessor.image_vectorize_preprocessor import ImageVectorizePreprocessor
+from sandbox.haoran.hashing.bonus_trpo.benchmarks.util import measure, print_table
+
+def loop_frame_diff(preprocessor, items):
+    frame_start_indices = [
+        preprocessor.img_height * preprocessor.img_width * i
+        for i in range(preprocessor.n_last_screens)
+    ]
+    return np.asarray([
+        item[frame_start_indices[-1]:] - \
+        item[frame_start_indices[-2]:frame_start_indices[-1]]
+        for item in items
+    ])
+
+def loop_rgb(preprocessor, items):
+    return np.asarray([
+        np.transpose(item,(2,1,0))
+        for item in items
+    ])
+
+def loop_vectorize(preprocessor, imgs):
+    batch_size = imgs.shape[0]
+    sliced_imgs = imgs[:,preprocessor.slices[0], preprocessor.slices[1], preprocessor.slices[2]]
+    return sliced_imgs.reshape((batch_size, preprocessor.get_output_dim()))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--batch_sizes', type=int, nargs='+', default=[100, 1000])
+    args = parser.parse_args()
+
+    frame_diff = HOGFrameSequencePreprocessor(n_last_screens=4, img_height=84, img_width=84)
+    frame_vectorize = ImageVectorizePreprocessor(1, 84, 84, slices=[None, slice(0,84,2), slice(0,84,2)])
+    rgb = HOGRGBPreprocessor(img_height=210, img_width=160, img_channel=3)
+    rgb_vectorize = ImageVectorizePreprocessor(3, 160, 210, slices=[slice(0,1,1), None, None])
+    chains = [
+        (
+            "frame diff",
+            lambda items: loop_vectorize(frame_vectorize, loop_frame_diff(frame_diff, items).reshape((-1, 1, 84, 84))),
+            PreprocessorPipeline([frame_diff, frame_vectorize]),
+            lambda batch_size, rng: rng.rand(batch_size, 4 * 84 * 84),
+        ),
+        (
+            "rgb",
+            lambda items: loop_vectorize(rgb_vectorize, loop_rgb(rgb, items)),
+            PreprocessorPipeline([rgb, rgb_vectorize]),
+            lambda batch_size, rng: rng.randint(256, size=(batch_size, 210, 160, 3)).astype(np.uint8),
+        ),
+    ]
+    rng = np.random.RandomState(0)
+    rows = []
+    for chain_name, loop_fn, pipeline, make_items in chains:
+        for batch_size in args.batch_sizes:
+            items = make_items(batch_size, rng)
+            t_loop, mem_loop, loop_outputs = measure(lambda: loop_fn(items))
+            t_pipe, mem_pipe, outputs = measure(lambda: pipeline.process(items))
+            assert np.array_equal(loop_outputs, outputs)
+            rows.append([
+                chain_name, batch_size,
+                "%.4f" % t_loop, "%.4f" % t_pipe, "%.1fx" % (t_loop / t_pipe),
+                "%.1f" % (mem_loop / 1024. ** 2), "%.1f" % (mem_pipe / 1024. ** 2),
+            ])
+    print_table(["chain", "batch size", "loop sec", "pipeline sec", "speedup", "loop MB", "pipeline MB"], rows)
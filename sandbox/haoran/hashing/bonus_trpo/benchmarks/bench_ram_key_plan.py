@@ -0,0 +1,91 @@
+"""
+ALEHackyHashV5 key computation: the previous per-entry Python loop vs. the RAMKeyPlan lookup tables, for compute_keys and keys_to_values.
+The loop versions below are the previous implementations, kept as references; the outputs of both are compared.
+Usage: PYTHONPATH=. python sandbox/haoran/hashing/bonus_trpo/benchmarks/bench_ram_key_plan.py --batch_sizes 1000 10000 100000
+"""
+import argparse
+import numpy as np
+
+from sandbox.haoran.hashing.bonus_trpo.bonus_evaluators.hash.ale_hacky_hash_v5 import ALEHackyHashV5
+from sandbox.haoran.hashing.bonus_trpo.benchmarks.util import measure, print_table
+
+def loop_compute_keys(hash, items):
+    if len(items.shape) > 2:
+        items = np.asarray([item.ravel() for item in items],dtype=int)
+    else:
+        items = items.astype(int)
+    n_items = items.shape[0]
+    keys = np.zeros(n_items,dtype=int)
+    for i,name in enumerate(hash.ram_info.keys()):
+        info = hash.ram_info[name]
+        index = info["index"]
+        value_type = info["value_type"]
+        values = info["values"]
+        _items = items[:,index]
+        if value_type == "range":
+            value_min = np.amin(values)
+            _items_short = _items - value_min
+            if "grid_size" in info.keys():
+                _items_short = np.floor(_items_short / info["grid_size"]).astype(int)
+        elif value_type == "categorical":
+            _items_short = np.zeros_like(_items)
+            for j in range(len(values)):
+                _items_short += j * (_items == values[j])
+        else:
+            raise NotImplementedError
+        keys +=  _items_short * np.prod(hash.n_values[i+1:]).astype(int)
+    return keys
+
+def loop_keys_to_values(hash, keys):
+    n_keys = len(keys)
+    values = np.zeros((n_keys,len(hash.n_values)),dtype=int)
+    remains = keys
+    for i,name in enumerate(hash.ram_info.keys()):
+        s = int(np.prod(hash.n_values[i+1:]))
+        _values_short = remains // s
+        info = hash.ram_info[name]
+        ram_values = info["values"]
+        if info["value_type"] == "range":
+            value_min = np.amin(ram_values)
+            if "grid_size" in info.keys():
+                _values = _values_short * info["grid_size"] + value_min
+            else:
+                _values = _values_short + value_min
+        else:
+            _values = np.zeros_like(_values_short,dtype=int)
+            for j in range(len(ram_values)):
+                _values += ram_values[j] * (_values_short == j)
+        values[:,i] = _values
+        remains = remains % s
+    return values
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--batch_sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    args = parser.parse_args()
+
+    hash = ALEHackyHashV5(
+        item_dim=128,
+        game="montezuma_revenge",
+        ram_names=["room", "x", "y", "objects", "beam_wall", "beam_countdown"],
+        extra_info={"x": dict(grid_size=8), "y": dict(grid_size=8)},
+    )
+    rng = np.random.RandomState(0)
+    rows = []
+    for batch_size in args.batch_sizes:
+        # image-shaped RAM, like the observations of AtariEnv with obs_type="ram"
+        items = rng.randint(256, size=(batch_size, 128, 1)).astype(np.uint8)
+        t_loop, _, loop_keys = measure(lambda: loop_compute_keys(hash, items))
+        t_plan, _, keys = measure(lambda: hash.compute_keys(items))
+        assert np.array_equal(loop_keys, keys)
+
+        valid_keys = keys % int(np.prod(hash.n_values))
+        t_inv_loop, _, loop_values = measure(lambda: loop_keys_to_values(hash, valid_keys))
+        t_inv_plan, _, values = measure(lambda: hash.keys_to_values(valid_keys))
+        assert np.array_equal(loop_values, values)
+        rows.append([
+            batch_size,
+            "%.5f" % t_loop, "%.5f" % t_plan, "%.1fx" % (t_loop / t_plan),
+            "%.5f" % t_inv_loop, "%.5f" % t_inv_plan, "%.1fx" % (t_inv_loop / t_inv_plan),
+        ])
+    print_table(["batch size", "keys loop", "keys plan", "speedup", "values loop", "values plan", "speedup"], rows)
@@ -0,0 +1,44 @@
+"""
+Per-batch projection time and snapshot size of the SimHash projection backends.
+"dense" is the projection_matrix stored by SimHash/SimHashV3; the others are RandomProjection objects that only pickle their seed.
+Usage: PYTHONPATH=. python sandbox/haoran/hashing/bonus_trpo/benchmarks/bench_random_projection.py --batch_size 5000
+"""
+import argparse
+import pickle
+import numpy as np
+
+from sandbox.haoran.hashing.bonus_trpo.bonus_evaluators.hash.random_projection import \
+    GaussianProjection, SparseProjection, SRHTProjection
+from sandbox.haoran.hashing.bonus_trpo.benchmarks.util import measure, print_table
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--item_dim', type=int, default=84 * 84 * 4)
+    parser.add_argument('--dim_key', type=int, default=256)
+    parser.add_argument('--batch_size', type=int, default=5000)
+    parser.add_argument('--n_repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    items = np.random.uniform(-1, 1, size=(args.batch_size, args.item_dim))
+    dense_matrix = np.random.normal(size=(args.item_dim, args.dim_key))
+    backends = [
+        ("dense", lambda x: x.dot(dense_matrix), dense_matrix),
+    ]
+    for name, projection in [
+            ("gaussian", GaussianProjection(args.item_dim, args.dim_key)),
+            ("sparse(li)", SparseProjection(args.item_dim, args.dim_key)),
+            ("sparse(achlioptas)", SparseProjection(args.item_dim, args.dim_key, density=1/3.)),
+            ("srht", SRHTProjection(args.item_dim, args.dim_key)),
+        ]:
+        backends.append((name, projection.project, projection))
+
+    rows = []
+    for name, project, obj in backends:
+        t, peak, _ = measure(lambda: project(items), args.n_repeat)
+        rows.append([
+            name,
+            "%.3f" % t,
+            "%.1f" % (peak / 1024.**2),
+            len(pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)),
+        ])
+    print_table(["backend", "sec/batch", "peak MB", "snapshot bytes"], rows)
@@ -0,0 +1,98 @@
+"""
+Memory of a worker batch with an image count target: recording the RGB frames of every step in env_infos and hashing them after sampling (the previous path) vs. computing the keys while sampling (rollout with key_computations), which only keeps the keys.
+The env emits random 210x160 RGB frames as env_infos["rgb_images"]; the policy is a no-op, so the numbers are the sampling and hashing costs only.
+Peak memory is traced over sampling and compute_bonuses; both compute the same bonuses.
+Usage: PYTHONPATH=. python sandbox/haoran/hashing/bonus_trpo/benchmarks/bench_sampling_keys.py --n_steps 2000 --key_chunk_sizes 1 10 100
+"""
+import argparse
+import numpy as np
+
+from rllab.sampler.utils import rollout
+from sandbox.haoran.hashing.bonus_trpo.bonus_evaluators.ale_hashing_bonus_evaluator import ALEHashingBonusEvaluator
+from sandbox.haoran.hashing.bonus_trpo.bonus_evaluators.hash.packed_sim_hash import PackedSimHash
+from sandbox.haoran.hashing.bonus_trpo.bonus_evaluators.preprocessor.hog_rgb_preprocessor import HOGRGBPreprocessor
+from sandbox.haoran.hashing.bonus_trpo.bonus_evaluators.preprocessor.image_vectorize_preprocessor import ImageVectorizePreprocessor
+from sandbox.haoran.hashing.bonus_trpo.benchmarks.util import measure, print_table
+
+class FlatSpace(object):
+    def flatten(self, x):
+        return np.asarray(x).ravel()
+
+class FrameEnv(object):
+    observation_space = FlatSpace()
+    action_space = FlatSpace()
+
+    def __init__(self, path_length, seed=0):
+        self.path_length = path_length
+        self.rng = np.random.RandomState(seed)
+
+    def reset(self):
+        self.t = 0
+        return np.zeros(4)
+
+    def step(self, action):
+        self.t += 1
+        rgb_image = self.rng.randint(256, size=(210, 160, 3)).astype(np.uint8)
+        return np.zeros(4), 0., self.t >= self.path_length, dict(rgb_images=rgb_image)
+
+class NoopAgent(object):
+    def reset(self):
+        pass
+
+    def get_action(self, observation):
+        return 0, dict()
+
+def make_evaluator():
+    preprocessor = [
+        HOGRGBPreprocessor(img_height=210, img_width=160, img_channel=3),
+        ImageVectorizePreprocessor(3, 160, 210, slices=[None, slice(0,160,4), slice(0,210,4)]),
+    ]
+    np.random.seed(0)
+    return ALEHashingBonusEvaluator(
+        state_dim=3 * 40 * 53,
+        state_preprocessor=preprocessor,
+        hash=PackedSimHash(item_dim=3 * 40 * 53, dim_key=64, bucket_sizes=None),
+        count_target="rgb_images",
+    )
+
+def sample_and_compute_bonuses(n_steps, path_length, key_chunk_size):
+    evaluator = make_evaluator()
+    env = FrameEnv(path_length)
+    if key_chunk_size is None:
+        rollout_args = dict()
+    else:
+        rollout_args = dict(
+            key_computations=evaluator.key_computations(),
+            key_chunk_size=key_chunk_size,
+            drop_env_infos=["rgb_images"],
+        )
+    paths = []
+    n_steps_collected = 0
+    while n_steps_collected < n_steps:
+        paths.append(rollout(env, NoopAgent(), path_length, **rollout_args))
+        n_steps_collected += len(paths[-1]["rewards"])
+    return evaluator.compute_bonuses(paths)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--n_steps', type=int, default=2000)
+    parser.add_argument('--path_length', type=int, default=500)
+    parser.add_argument('--key_chunk_sizes', type=int, nargs='+', default=[1, 10, 100])
+    args = parser.parse_args()
+
+    rows = []
+    reference = None
+    for key_chunk_size in [None] + args.key_chunk_sizes:
+        t, mem, bonuses = measure(
+            lambda: sample_and_compute_bonuses(args.n_steps, args.path_length, key_chunk_size),
+            n_repeat=1,
+        )
+        bonuses = np.concatenate(bonuses)
+        if reference is None:
+            reference = bonuses
+        assert np.array_equal(reference, bonuses)
+        rows.append([
+            "after sampling" if key_chunk_size is None else "while sampling, every %d" % key_chunk_size,
+            "%.2f" % t, "%.1f" % (mem / 1024. ** 2),
+        ])
+    print_table(["keys computed", "sec", "peak MB"], rows)
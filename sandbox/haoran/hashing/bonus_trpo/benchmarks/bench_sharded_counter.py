@@ -0,0 +1,85 @@
+"""
+Scaling of parallel count-table increments with the number of processes.
+"global lock" is the previous inc_keys path (one mp.Value lock around np.add.at on every bucket); "sharded" is ShardLocks.add as used by SimHash / NaryHash / ALEHackyHashV5 in parallel mode; "count-min sketch" is CountMinSketch.inc in parallel mode (the same sharded add, plus the HyperLogLog registers), whose counters and registers are checked against a serial sketch.
+A fixed batch is split evenly among the ranks, like worker_batch_size in ParallelBatchPolopt. Processes are forked after the shared objects are created and synchronize with barriers around the update, like the update_count barrier of ALEHashingBonusEvaluator.
+Usage: PYTHONPATH=. python sandbox/haoran/hashing/bonus_trpo/benchmarks/bench_sharded_counter.py --n_parallels 1 2 4 8 16 32
+"""
+import argparse
+import multiprocessing as mp
+import time
+import numpy as np
+
+from sandbox.haoran.hashing.bonus_trpo.bonus_evaluators.hash.count_min_sketch import CountMinSketch
+from sandbox.haoran.hashing.bonus_trpo.bonus_evaluators.hash.sharded_counter import ShardLocks, flat_table_indices
+from sandbox.haoran.hashing.bonus_trpo.benchmarks.util import print_table
+
+BUCKET_SIZES = [999931, 999953, 999959, 999961, 999979, 999983]
+
+def global_lock_inc(tables, lock, keys, rank):
+    with lock.get_lock():
+        for idx in range(len(BUCKET_SIZES)):
+            np.add.at(tables[idx], keys[:, idx], 1)
+
+def sharded_inc(tables, shard_locks, keys, rank):
+    shard_locks.add(tables, flat_table_indices(keys, tables.shape[1]), rank)
+
+def sketch_inc(tables, sketch, keys, rank):
+    sketch.inc(keys, rank)
+
+def worker(rank, inc, tables, lock, keys, barrier, elapsed):
+    barrier.wait()
+    start = time.time()
+    inc(tables, lock, keys, rank)
+    barrier.wait()
+    if rank == 0:
+        elapsed.value = time.time() - start
+
+def run(n_parallel, method, all_keys):
+    shape = (len(BUCKET_SIZES), max(BUCKET_SIZES))
+    tables = np.frombuffer(mp.RawArray('i', int(np.prod(shape))), np.int32).reshape(shape)
+    if method == "global lock":
+        inc, lock = global_lock_inc, mp.Value('i')
+    elif method == "sharded":
+        inc, lock = sharded_inc, ShardLocks(tables.size)
+    else:
+        inc, lock = sketch_inc, CountMinSketch(BUCKET_SIZES, parallel=True)
+        tables = lock.tables
+    barrier = mp.Barrier(n_parallel)
+    elapsed = mp.RawValue('d')
+    keys_per_rank = np.array_split(all_keys, n_parallel)
+    processes = [
+        mp.Process(target=worker, args=(rank, inc, tables, lock, keys_per_rank[rank], barrier, elapsed))
+        for rank in range(n_parallel)
+    ]
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join()
+    if method == "count-min sketch":
+        serial_sketch = CountMinSketch(BUCKET_SIZES)
+        serial_sketch.inc(all_keys)
+        assert np.array_equal(tables, serial_sketch.tables)
+        assert np.array_equal(lock.registers, serial_sketch.registers)
+    else:
+        assert tables.sum() == all_keys.size
+    return elapsed.value
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--batch_size', type=int, default=100000)
+    parser.add_argument('--n_distinct', type=int, default=20000,
+                        help='number of distinct states in the batch')
+    parser.add_argument('--n_parallels', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(0)
+    codes = rng.randint(2**62, size=args.n_distinct)[rng.randint(args.n_distinct, size=args.batch_size)]
+    all_keys = np.stack([codes % b for b in BUCKET_SIZES], axis=1)
+
+    rows = []
+    for n_parallel in args.n_parallels:
+        row = [n_parallel]
+        for method in ["global lock", "sharded", "count-min sketch"]:
+            row.append("%.4f" % run(n_parallel, method, all_keys))
+        rows.append(row)
+    print_table(["n_parallel", "global lock sec", "sharded sec", "count-min sketch sec"], rows)
@@ -0,0 +1,53 @@
+"""
+Exact counting in parallel mode: the previous Manager dict (one IPC round trip per key) vs. SharedHashMap (batched, in shared memory).
+Keys are rows of uint64 words, as produced by NaryHash.compute_keys in dict mode. Each batch is first incremented and then queried, like update_count / compute_bonus in ALEHashingBonusEvaluator.
+Usage: PYTHONPATH=. python sandbox/haoran/hashing/bonus_trpo/benchmarks/bench_shared_hash_map.py --batch_sizes 1000 10000 100000
+"""
+import argparse
+import multiprocessing as mp
+import numpy as np
+
+from sandbox.haoran.hashing.bonus_trpo.bonus_evaluators.hash.shared_hash_map import SharedHashMap
+from sandbox.haoran.hashing.bonus_trpo.benchmarks.util import measure, print_table
+
+def manager_dict_inc_query(shared_dict, keys):
+    keys = [tuple(key) for key in keys]
+    for key in keys:
+        if key in shared_dict:
+            shared_dict[key] += 1
+        else:
+            shared_dict[key] = 1
+    return [shared_dict.get(key, 0) for key in keys]
+
+def hash_map_inc_query(hash_map, keys):
+    hash_map.inc(keys)
+    return hash_map.query(keys)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--batch_sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--key_len', type=int, default=2)
+    parser.add_argument('--max_manager_batch', type=int, default=10000,
+                        help='skip the manager dict for larger batches (too slow)')
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(0)
+    manager = mp.Manager()
+    rows = []
+    for batch_size in args.batch_sizes:
+        n_distinct = max(batch_size // 4, 1)
+        codes = rng.randint(2**62, size=(n_distinct, args.key_len)).astype(np.uint64)
+        keys = codes[rng.randint(n_distinct, size=batch_size)]
+
+        hash_map = SharedHashMap(args.key_len, parallel=True)
+        t_map, _, counts = measure(lambda: hash_map_inc_query(hash_map, keys), n_repeat=1)
+        row = [batch_size, "%.4f" % t_map]
+        if batch_size <= args.max_manager_batch:
+            shared_dict = manager.dict()
+            t_dict, _, dict_counts = measure(lambda: manager_dict_inc_query(shared_dict, keys), n_repeat=1)
+            assert np.array_equal(np.asarray(dict_counts), counts)
+            row += ["%.4f" % t_dict, "%.1fx" % (t_dict / t_map)]
+        else:
+            row += ["-", "-"]
+        rows.append(row)
+    print_table(["batch size", "shared hash map sec", "manager dict sec", "speedup"], rows)
@@ -0,0 +1,148 @@
+"""
+Barriers per iteration of ParallelBatchPolopt (sandbox/haoran/parallel_trpo)._train with n_parallel ranks, a ParallelLinearFeatureBaseline and an ALECompositeBonusEvaluator of n_evaluators parallel ALEHashingBonusEvaluators: one barrier or two per component (log_diagnostics, update_counts of each evaluator, baseline fit) vs. use_stats_bus=True (one barrier for all of them).
+The env returns random observations and the policy update is a single barrier, like the first barrier of the parallel optimizers, so the iteration time is mostly bookkeeping and synchronization. Barrier waits are measured with log_barrier_waits=True, as the maximum over the ranks per phase, summed over the iterations. Both modes start from the same seeds; their baseline coefficients and hash tables are compared at the end.
+Usage: PYTHONPATH=. python sandbox/haoran/hashing/bonus_trpo/benchmarks/bench_stats_bus.py --n_parallel 4 --n_evaluators 3 --batch_size 4000 --n_itr 10
+"""
+import argparse
+import multiprocessing as mp
+import time
+import numpy as np
+
+import rllab.misc.logger as logger
+from rllab.envs.base import Env, Step
+from rllab.misc import ext
+from rllab.spaces import Box, Discrete
+from sandbox.adam.parallel.util import SimpleContainer
+from sandbox.haoran.hashing.bonus_trpo.benchmarks.bench_pipelined_sampling import CountingPolicy
+from sandbox.haoran.hashing.bonus_trpo.benchmarks.util import print_table
+from sandbox.haoran.hashing.bonus_trpo.bonus_evaluators.ale_composite_bonus_evaluator import \
+    ALECompositeBonusEvaluator
+from sandbox.haoran.hashing.bonus_trpo.bonus_evaluators.ale_hashing_bonus_evaluator import ALEHashingBonusEvaluator
+from sandbox.haoran.hashing.bonus_trpo.bonus_evaluators.hash.sim_hash import SimHash
+from sandbox.haoran.parallel_trpo.batch_polopt import ParallelBatchPolopt
+from sandbox.haoran.parallel_trpo.linear_feature_baseline import ParallelLinearFeatureBaseline
+
+PHASES = ["sampling", "diagnostics", "stats_bus", "bonus", "baseline", "optimizer"]
+
+class RandomObservationEnv(Env):
+    def __init__(self, obs_dim, path_length):
+        self.obs_dim = obs_dim
+        self.path_length = path_length
+        self.t = 0
+
+    @property
+    def observation_space(self):
+        return Box(-1., 1., (self.obs_dim,))
+
+    @property
+    def action_space(self):
+        return Discrete(2)
+
+    def reset(self):
+        self.t = 0
+        return np.random.uniform(-1, 1, self.obs_dim)
+
+    def step(self, action):
+        self.t += 1
+        return Step(np.random.uniform(-1, 1, self.obs_dim), np.random.uniform(), self.t >= self.path_length)
+
+class BarrierOptimizer(object):
+    def init_par_objs(self, n_parallel):
+        self._par_objs = (SimpleContainer(), SimpleContainer(update=mp.Barrier(n_parallel)))
+
+    def init_rank(self, rank):
+        pass
+
+    def optimize(self):
+        self._par_objs[1].update.wait()
+
+class BarrierPolopt(ParallelBatchPolopt):
+    def __init__(self, **kwargs):
+        self.optimizer = BarrierOptimizer()
+        # per phase: the sum over the iterations of the maximum wait over the ranks
+        self.total_wait_times = np.frombuffer(mp.RawArray('d', len(PHASES)))
+        self.total_n_waits = mp.RawValue('l')
+        super(BarrierPolopt, self).__init__(**kwargs)
+
+    def init_opt(self):
+        pass
+
+    def init_par_objs(self):
+        self._init_par_objs_batchpolopt()
+        self.optimizer.init_par_objs(self.n_parallel)
+
+    def get_itr_snapshot(self, itr, samples_data):
+        return dict()
+
+    def optimize_policy(self, itr, samples_data):
+        self.optimizer.optimize()
+
+    def record_itr_time(self, itr_start_time):
+        super(BarrierPolopt, self).record_itr_time(itr_start_time)
+        timer = self.barrier_timer
+        self.total_wait_times += np.max(timer.wait_times[timer.buffer], axis=0)
+        self.total_n_waits.value += int(np.sum(timer.n_waits[timer.buffer, self.rank]))
+
+def run(args, use_stats_bus):
+    ext.set_seed(0)
+    env = RandomObservationEnv(args.obs_dim, args.path_length)
+    bonus_evaluator = ALECompositeBonusEvaluator(
+        [
+            ALEHashingBonusEvaluator(
+                state_dim=args.obs_dim,
+                hash=SimHash(args.obs_dim, dim_key=64, bucket_sizes=[999979, 999983], parallel=True),
+                log_prefix="Ev%d" % i,
+                parallel=True,
+            )
+            for i in range(args.n_evaluators)
+        ],
+        parallel=True,
+    )
+    algo = BarrierPolopt(
+        env=env,
+        policy=CountingPolicy(),
+        baseline=ParallelLinearFeatureBaseline(env),
+        bonus_evaluator=bonus_evaluator,
+        bonus_coeff=0.01,
+        n_itr=args.n_itr,
+        batch_size=args.batch_size,
+        max_path_length=args.path_length,
+        n_parallel=args.n_parallel,
+        serial_compile=False,
+        log_memory_usage=False,
+        use_stats_bus=use_stats_bus,
+        log_barrier_waits=True,
+    )
+    start = time.time()
+    algo.train()
+    elapsed = time.time() - start
+    tables = [np.array(ev.hash.tables) for ev in bonus_evaluator.bonus_evaluators]
+    coeffs = np.array(algo.baseline._par_objs[0].coeffs)
+    return elapsed, algo.total_wait_times / args.n_itr, algo.total_n_waits.value / float(args.n_itr), tables, coeffs
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--n_parallel', type=int, default=4)
+    parser.add_argument('--n_evaluators', type=int, default=3)
+    parser.add_argument('--batch_size', type=int, default=4000)
+    parser.add_argument('--path_length', type=int, default=100)
+    parser.add_argument('--obs_dim', type=int, default=16)
+    parser.add_argument('--n_itr', type=int, default=10)
+    args = parser.parse_args()
+
+    logger.disable()
+    rows = []
+    results = dict()
+    for use_stats_bus in [False, True]:
+        elapsed, wait_times, n_waits, tables, coeffs = run(args, use_stats_bus)
+        results[use_stats_bus] = (tables, coeffs)
+        rows.append(
+            ["stats bus" if use_stats_bus else "per component", "%.3f" % (elapsed / args.n_itr), "%.0f" % n_waits] +
+            ["%.1f" % (t * 1e3) for t in wait_times] + ["%.1f" % (np.sum(wait_times) * 1e3)]
+        )
+    for table, bus_table in zip(results[False][0], results[True][0]):
+        assert np.array_equal(table, bus_table)
+    assert np.allclose(results[False][1], results[True][1])
+    print_table(
+        ["barriers", "sec / itr", "barriers / itr"] + ["%s ms / itr" % phase for phase in PHASES] + ["total ms / itr"],
+        rows)
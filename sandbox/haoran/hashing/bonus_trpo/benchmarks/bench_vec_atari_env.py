@@ -0,0 +1,49 @@
+"""
+Sampling throughput of one worker with a small conv policy (trpo_dqn_args) on Atari: rollout of one AtariEnv, calling the policy with one observation per step, vs. vectorized_rollout of a VecAtariEnv with n_envs emulators, calling the policy once per step for all of them.
+The emulators and the policy are the same as in training; the sec column includes the env steps, so the speedup is bounded by the share of the policy calls in the sampling time.
+Usage: PYTHONPATH=. python sandbox/haoran/hashing/bonus_trpo/benchmarks/bench_vec_atari_env.py --game montezuma_revenge --n_steps 2000 --n_envs 1 4 16
+"""
+import argparse
+import time
+
+from rllab.policies.categorical_conv_policy import CategoricalConvPolicy
+from rllab.sampler.utils import rollout, vectorized_rollout
+from sandbox.haoran.hashing.bonus_trpo.envs.atari_env import AtariEnv
+from sandbox.haoran.hashing.bonus_trpo.envs.vec_atari_env import VecAtariEnv
+from sandbox.haoran.hashing.bonus_trpo.misc.dqn_args_theano import trpo_dqn_args
+from sandbox.haoran.hashing.bonus_trpo.benchmarks.util import print_table
+
+def sample_serial(env, policy, n_steps, max_path_length):
+    n_steps_collected = 0
+    start = time.time()
+    while n_steps_collected < n_steps:
+        n_steps_collected += len(rollout(env, policy, max_path_length)["rewards"])
+    return n_steps_collected / (time.time() - start)
+
+def sample_vectorized(vec_env, policy, n_steps, max_path_length):
+    start = time.time()
+    paths = vectorized_rollout(vec_env, policy, n_steps, max_path_length)
+    return sum(len(path["rewards"]) for path in paths) / (time.time() - start)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--game', type=str, default="montezuma_revenge")
+    parser.add_argument('--n_steps', type=int, default=2000)
+    parser.add_argument('--max_path_length', type=int, default=4500)
+    parser.add_argument('--n_envs', type=int, nargs='+', default=[1, 4, 16])
+    args = parser.parse_args()
+
+    env = AtariEnv(game=args.game, seed=0, record_internal_state=False)
+    policy = CategoricalConvPolicy(env_spec=env.spec, name="policy", **trpo_dqn_args)
+
+    rows = []
+    serial_steps_per_sec = sample_serial(env, policy, args.n_steps, args.max_path_length)
+    rows.append(["rollout", 1, "%.0f" % serial_steps_per_sec, "1.0x"])
+    for n_envs in args.n_envs:
+        vec_env = VecAtariEnv(n_envs, game=args.game, seed=0, record_internal_state=False)
+        steps_per_sec = sample_vectorized(vec_env, policy, args.n_steps, args.max_path_length)
+        rows.append([
+            "vectorized_rollout", n_envs,
+            "%.0f" % steps_per_sec, "%.1fx" % (steps_per_sec / serial_steps_per_sec),
+        ])
+    print_table(["sampler", "envs", "steps / sec", "speedup"], rows)
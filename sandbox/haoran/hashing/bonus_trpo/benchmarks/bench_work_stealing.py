@@ -0,0 +1,109 @@
+"""
+Iteration time of the sampling phase of ParallelBatchPolopt (sandbox/haoran/parallel_trpo) with n_parallel ranks, when path lengths vary by 10x as in Atari: fixed per-rank batches (batch_size // n_parallel each) vs. work_stealing (ranks sample until they have batch_size together).
+The env sleeps step_time per step instead of emulating a game, so that the ranks overlap as on separate cores however many cores there are; each path has a length drawn uniformly from [min_path_length, 10 * min_path_length]. As after sampling in _train, the ranks wait for each other at a barrier, so an iteration takes as long as its slowest rank.
+Usage: PYTHONPATH=. python sandbox/haoran/hashing/bonus_trpo/benchmarks/bench_work_stealing.py --n_parallel 4 --batch_size 20000 --n_itr 5
+"""
+import argparse
+import multiprocessing as mp
+import time
+import numpy as np
+
+from rllab.envs.base import Env, Step
+from rllab.sampler.shm_transport import SharedCounter
+from rllab.spaces import Box, Discrete
+from sandbox.adam.parallel.util import SimpleContainer
+from sandbox.haoran.parallel_trpo.sampler import WorkerBatchSampler
+from sandbox.haoran.hashing.bonus_trpo.benchmarks.util import print_table
+
+class SleepEnv(Env):
+    def __init__(self, min_path_length, step_time, seed):
+        self.min_path_length = min_path_length
+        self.step_time = step_time
+        self.rng = np.random.RandomState(seed)
+        self.path_length = 0
+        self.t = 0
+
+    @property
+    def observation_space(self):
+        return Box(0., 1., (1,))
+
+    @property
+    def action_space(self):
+        return Discrete(2)
+
+    def reset(self):
+        self.path_length = self.rng.randint(self.min_path_length, 10 * self.min_path_length + 1)
+        self.t = 0
+        return np.zeros(1)
+
+    def step(self, action):
+        time.sleep(self.step_time)
+        self.t += 1
+        return Step(np.zeros(1), 0., self.t >= self.path_length)
+
+class RandomAgent(object):
+    def reset(self):
+        pass
+
+    def get_action(self, observation):
+        return np.random.randint(2), dict()
+
+def make_algo(args, work_stealing, whole_paths):
+    n = args.n_parallel
+    algo = SimpleContainer(
+        n_parallel=n, batch_size=args.batch_size, worker_batch_size=args.batch_size // n,
+        max_path_length=np.inf, whole_paths=whole_paths, work_stealing=work_stealing,
+        avoid_duplicate_paths=False, bonus_evaluator=None, sampling_key_chunk_size=None, keep_count_targets=False,
+        policy=RandomAgent(), rank=None,
+    )
+    algo._par_objs = (
+        SimpleContainer(n_steps_claimed=[SharedCounter(), SharedCounter()]),
+        SimpleContainer(sampling=mp.Barrier(n)),
+    )
+    return algo
+
+def train(algo, rank, args, itr_barrier, results):
+    algo.rank = rank
+    algo.env = SleepEnv(args.min_path_length, args.step_time, seed=rank)
+    np.random.seed(rank)
+    sampler = WorkerBatchSampler(algo)
+    itr_barrier.wait()
+    start = time.time()
+    n_steps = 0
+    for _ in range(args.n_itr):
+        sampler.obtain_samples()
+        n_steps += algo.n_steps_collected
+        itr_barrier.wait()
+    results.put((rank, time.time() - start, n_steps))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--n_parallel', type=int, default=4)
+    parser.add_argument('--batch_size', type=int, default=20000)
+    parser.add_argument('--min_path_length', type=int, default=200)
+    parser.add_argument('--step_time', type=float, default=1e-4)
+    parser.add_argument('--n_itr', type=int, default=5)
+    args = parser.parse_args()
+
+    rows = []
+    for work_stealing in [False, True]:
+        for whole_paths in [True, False]:
+            algo = make_algo(args, work_stealing, whole_paths)
+            itr_barrier = mp.Barrier(args.n_parallel)
+            results = mp.Queue()
+            processes = [
+                mp.Process(target=train, args=(algo, rank, args, itr_barrier, results))
+                for rank in range(args.n_parallel)
+            ]
+            for p in processes:
+                p.start()
+            rank_results = [results.get() for _ in processes]
+            for p in processes:
+                p.join()
+            elapsed = max(t for _, t, _ in rank_results)
+            n_steps = sum(n for _, _, n in rank_results)
+            rows.append([
+                "work stealing" if work_stealing else "fixed", whole_paths,
+                "%.3f" % (elapsed / args.n_itr), "%.0f" % (n_steps / float(args.n_itr)), "%.0f" % (n_steps / elapsed),
+            ])
+    print_table(["batches", "whole_paths", "sec / itr", "samples / itr", "samples / sec"], rows)
@@ -0,0 +1,80 @@
+"""
+Paths of rollout on AtariEnv (Montezuma's Revenge, RAM observations, uniformly random actions) whose per-step env_infos are recorded every k steps (rgb_images) or on demand (images, requested by the agent every m steps), against a reference run of the same seed that records them at every step.
+It checks that rollout stacks every field into one array per path, and that each step holds the value of the last step that recorded the field (the first step of the path records it in any case), as EnvInfoRecorder does for the fixed-size fields.
+Usage: PYTHONPATH=. python sandbox/haoran/hashing/bonus_trpo/benchmarks/check_env_info_periods.py --n_steps 2000 --periods 2 4 7 --request_every 5
+"""
+import argparse
+import numpy as np
+
+from rllab.sampler.utils import rollout
+from sandbox.haoran.hashing.bonus_trpo.envs.atari_env import AtariEnv
+from sandbox.haoran.hashing.bonus_trpo.envs.env_info_recorder import EnvInfoRecorder, ON_DEMAND
+from sandbox.haoran.hashing.bonus_trpo.benchmarks.util import print_table
+
+class RequestingAgent(object):
+    """ uniformly random actions; requests the images every request_every steps """
+    def __init__(self, env, request_every, seed=0):
+        self.env = env
+        self.request_every = request_every
+        self.rng = np.random.RandomState(seed)
+        self.t = 0
+
+    def reset(self):
+        self.t = 0
+
+    def get_action(self, observation):
+        if self.request_every is not None and self.t % self.request_every == 0:
+            # (recorded at the step of this action)
+            self.env.request_env_info("images")
+        self.t += 1
+        return self.rng.randint(len(self.env.legal_actions)), dict()
+
+def sample(n_steps, max_path_length, rgb_images_period, request_every):
+    periods = dict(lives_lost=1, prior_reward=1, rgb_images=rgb_images_period)
+    periods["images"] = 1 if request_every is None else ON_DEMAND
+    env = AtariEnv(
+        game="montezuma_revenge", seed=0, obs_type="ram", record_image=True, record_rgb_image=True,
+        record_internal_state=False, env_info_recorder=EnvInfoRecorder(periods))
+    agent = RequestingAgent(env, request_every)
+    paths = []
+    n_steps_collected = 0
+    while n_steps_collected < n_steps:
+        paths.append(rollout(env, agent, max_path_length))
+        n_steps_collected += len(paths[-1]["rewards"])
+    return paths
+
+def last_recorded(path_length, recorded_steps):
+    """ for each step, the last step <= it in recorded_steps """
+    recorded = np.zeros(path_length, dtype=bool)
+    recorded[recorded_steps] = True
+    recorded[0] = True
+    return np.maximum.accumulate(np.where(recorded, np.arange(path_length), 0))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--n_steps', type=int, default=2000)
+    parser.add_argument('--max_path_length', type=int, default=500)
+    parser.add_argument('--periods', type=int, nargs='+', default=[2, 4, 7])
+    parser.add_argument('--request_every', type=int, default=5)
+    args = parser.parse_args()
+
+    reference_paths = sample(args.n_steps, args.max_path_length, 1, None)
+    rows = []
+    for period in args.periods:
+        paths = sample(args.n_steps, args.max_path_length, period, args.request_every)
+        n_recorded = np.zeros(2, dtype=int)
+        for reference_path, path in zip(reference_paths, paths):
+            assert np.array_equal(reference_path["actions"], path["actions"])
+            path_length = len(path["rewards"])
+            for i, (field, recorded_steps) in enumerate([
+                    ("rgb_images", np.arange(0, path_length, period)),
+                    ("images", np.arange(0, path_length, args.request_every))]):
+                values = path["env_infos"][field]
+                assert isinstance(values, np.ndarray) and values.dtype != object and len(values) == path_length
+                source_steps = last_recorded(path_length, recorded_steps)
+                assert np.array_equal(values, reference_path["env_infos"][field][source_steps])
+                n_recorded[i] += len(np.unique(source_steps))
+        rows.append([period, args.request_every, len(paths), n_recorded[0], n_recorded[1],
+                     sum(len(path["rewards"]) for path in paths)])
+    print_table(["rgb_images period", "images requested every", "paths", "rgb_images recorded", "images recorded",
+                 "steps"], rows)
@@ -0,0 +1,145 @@
+"""
+Inputs of the surrogate loss of ParallelTRPO with sampling_staleness > 0 (sandbox/haoran/parallel_trpo and sandbox/adam/parallel), from prep_samples, on a linear softmax policy in numpy.
+The batch is sampled by a behavior policy, and the current policy is k updates (random steps of the parameters) ahead of it. f_stale_inputs and the surrogate are the numpy counterparts of the Theano graphs of init_opt, with the formulas of Categorical (likelihood ratio with TINY). For each k, it checks that:
+- the importance weights are pi_current(a|s) / pi_behavior(a|s), computed directly from the probabilities of both policies: (pi_current + TINY) / (pi_behavior + TINY) up to rounding, hence within TINY * (1 + w) / pi_behavior of the exact ratio w; and that is_weight_correction is applied to them;
+- the old dist infos are those of the current policy, so that the KL constraint is taken w.r.t. it;
+- at parameters theta along the search direction, the surrogate equals the importance-sampled one w.r.t. the behavior policy, -mean((pi_theta(a|s) + TINY) / (pi_behavior(a|s) + TINY) * A), up to rounding;
+- with k = 0, the weights are exactly 1 and the surrogate is exactly that of the synchronous mode (sampling_staleness=0) at every theta.
+Usage: PYTHONPATH=. python sandbox/haoran/hashing/bonus_trpo/benchmarks/check_stale_surrogate.py --obs_dim 20 --n_actions 6 --n_samples 5000 --staleness 0 1 2 4
+"""
+import argparse
+import numpy as np
+
+from rllab.distributions.categorical import TINY
+from sandbox.haoran.parallel_trpo.trpo import ParallelTRPO as HaoranParallelTRPO
+from sandbox.adam.parallel.trpo import ParallelTRPO as AdamParallelTRPO
+from sandbox.haoran.hashing.bonus_trpo.benchmarks.util import print_table
+
+STEP = 0.1
+
+def softmax(z):
+    e = np.exp(z - np.max(z, axis=1, keepdims=True))
+    return e / np.sum(e, axis=1, keepdims=True)
+
+def likelihood_ratio(x, old_prob, new_prob):
+    """ Categorical.likelihood_ratio_sym """
+    return (np.sum(new_prob * x, axis=-1) + TINY) / (np.sum(old_prob * x, axis=-1) + TINY)
+
+class CategoricalDistribution(object):
+    dist_info_keys = ["prob"]
+
+class LinearSoftmaxPolicy(object):
+    recurrent = False
+    state_info_keys = []
+    distribution = CategoricalDistribution()
+
+    def __init__(self, W):
+        self.W = W
+
+    def probs(self, obs):
+        return softmax(obs.dot(self.W))
+
+def f_stale_inputs(policy):
+    """ ParallelTRPO.f_stale_inputs: the current dist infos and the likelihood ratio w.r.t. the behavior's """
+    def f(obs, actions, behavior_prob):
+        prob = policy.probs(obs)
+        return prob, likelihood_ratio(actions, behavior_prob, prob)
+    return f
+
+def surrogate(W, input_values, stale):
+    """ surr_loss of ParallelTRPO.init_opt, at the policy parameters W """
+    if stale:
+        obs, actions, advantages, old_prob, is_weights = input_values
+    else:
+        obs, actions, advantages, old_prob = input_values
+    lr = likelihood_ratio(actions, old_prob, softmax(obs.dot(W)))
+    if stale:
+        lr = lr * is_weights
+    return - np.mean(lr * advantages)
+
+def make_algo(trpo_class, policy, sampling_staleness, is_weight_correction=None):
+    # (instead of __init__ and init_opt, which compile the Theano functions)
+    algo = trpo_class.__new__(trpo_class)
+    algo.policy = policy
+    algo.sampling_staleness = sampling_staleness
+    algo.is_weight_correction = is_weight_correction
+    if sampling_staleness > 0:
+        algo.f_stale_inputs = f_stale_inputs(policy)
+    return algo
+
+def batch(args, rng, W_behavior):
+    obs = rng.normal(size=(args.n_samples, args.obs_dim))
+    behavior_prob = softmax(obs.dot(W_behavior))
+    a = np.array([rng.choice(args.n_actions, p=p) for p in behavior_prob])
+    return dict(
+        observations=obs,
+        actions=np.eye(args.n_actions)[a],
+        advantages=rng.normal(size=args.n_samples),
+        agent_infos=dict(prob=behavior_prob),
+    )
+
+def check(args, trpo_class, staleness, seed):
+    rng = np.random.RandomState(seed)
+    shape = (args.obs_dim, args.n_actions)
+    W_behavior = rng.normal(size=shape)
+    W_current = W_behavior.copy()
+    for _ in range(staleness):
+        W_current += STEP * rng.normal(size=shape)
+    samples_data = batch(args, rng, W_behavior)
+    obs, actions, advantages = samples_data["observations"], samples_data["actions"], samples_data["advantages"]
+    behavior_prob = samples_data["agent_infos"]["prob"]
+    current_prob = softmax(obs.dot(W_current))
+    taken = (np.arange(len(actions)), np.argmax(actions, axis=1))
+    exact_weights = current_prob[taken] / behavior_prob[taken]
+
+    # any staleness the pipeline allows at least as large as this batch's
+    algo = make_algo(trpo_class, LinearSoftmaxPolicy(W_current), max(staleness, 1))
+    input_values = algo.prep_samples(samples_data)
+    is_weights = input_values[-1]
+    assert np.array_equal(input_values[3], current_prob)
+    assert np.allclose(is_weights, (current_prob[taken] + TINY) / (behavior_prob[taken] + TINY), rtol=1e-12, atol=0)
+    # (relative to the bound on the effect of TINY)
+    weight_err = np.max(np.abs(is_weights - exact_weights) / (TINY * (1. + exact_weights) / behavior_prob[taken]))
+    assert weight_err <= 1. + 1e-6
+    truncated = make_algo(
+        trpo_class, LinearSoftmaxPolicy(W_current), max(staleness, 1), lambda w: np.minimum(w, 1.)
+    ).prep_samples(samples_data)[-1]
+    assert np.array_equal(truncated, np.minimum(is_weights, 1.))
+
+    # the current parameters and points along a search direction, as in the line search
+    direction = rng.normal(size=shape)
+    thetas = [W_current + c * STEP * direction for c in [0., 0.5, 1.]]
+    surr_err = 0.
+    for W in thetas:
+        surr = surrogate(W, input_values, stale=True)
+        theta_prob = softmax(obs.dot(W))
+        is_surr = - np.mean((theta_prob[taken] + TINY) / (behavior_prob[taken] + TINY) * advantages)
+        surr_err = max(surr_err, abs(surr - is_surr) / abs(is_surr))
+        assert np.isclose(surr, is_surr, rtol=1e-10, atol=0)
+        if staleness == 0:
+            sync_algo = make_algo(trpo_class, LinearSoftmaxPolicy(W_current), 0)
+            assert surr == surrogate(W, sync_algo.prep_samples(samples_data), stale=False)
+    if staleness == 0:
+        assert np.all(is_weights == 1.)
+    return weight_err, surr_err, np.mean(is_weights), np.max(is_weights)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--obs_dim', type=int, default=20)
+    parser.add_argument('--n_actions', type=int, default=6)
+    parser.add_argument('--n_samples', type=int, default=5000)
+    parser.add_argument('--staleness', type=int, nargs='+', default=[0, 1, 2, 4])
+    args = parser.parse_args()
+
+    rows = []
+    for name, trpo_class in [("haoran", HaoranParallelTRPO), ("adam", AdamParallelTRPO)]:
+        for staleness in args.staleness:
+            weight_err, surr_err, mean_w, max_w = check(args, trpo_class, staleness, seed=staleness)
+            rows.append([
+                name, staleness, "%.2e" % weight_err, "%.2e" % surr_err, "%.4f" % mean_w, "%.3f" % max_w,
+                "exact" if staleness == 0 else "-",
+            ])
+    print_table(
+        ["ParallelTRPO", "staleness", "max err weights / TINY bound", "max rel err surrogate", "mean weight", "max weight",
+         "vs. synchronous"],
+        rows)
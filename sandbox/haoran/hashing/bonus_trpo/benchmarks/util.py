@@ -0,0 +1,30 @@
+import time
+import tracemalloc
+import numpy as np
+
+def measure(fn, n_repeat=3):
+    """
+    Call fn() n_repeat times. Return the best wall-clock time (seconds), the peak traced memory (bytes) over all calls, and the last output.
+    numpy registers its buffers with tracemalloc, so the peak covers temporary arrays.
+    """
+    times = []
+    tracemalloc.start()
+    try:
+        for _ in range(n_repeat):
+            start = time.time()
+            out = fn()
+            times.append(time.time() - start)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return np.min(times), peak, out
+
+def print_table(header, rows):
+    widths = [
+        max(len(str(x)) for x in [h] + [row[i] for row in rows])
+        for i, h in enumerate(header)
+    ]
+    fmt = "  ".join("%%%ds" % w for w in widths)
+    print(fmt % tuple(header))
+    for row in rows:
+        print(fmt % tuple(row))
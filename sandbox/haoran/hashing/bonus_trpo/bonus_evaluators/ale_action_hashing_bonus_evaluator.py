@@ -3,13 +3,15 @@ import multiprocessing as mp
 import pickle
 from rllab.misc import logger
 from sandbox.haoran.hashing.bonus_trpo.bonus_evaluators.hash.sim_hash import SimHash
+from sandbox.haoran.hashing.bonus_trpo.bonus_evaluators.key_retrieval import retrieve_path_keys, observation_count_targets
+from sandbox.haoran.hashing.bonus_trpo.bonus_evaluators.preprocessor.preprocessor_pipeline import PreprocessorPipeline
 from sandbox.adam.parallel.util import SimpleContainer
 
 
 class ALEActionHashingBonusEvaluator(object):
     """
     Uses a hash function to store state-action counts. Then assign bonus reward to under-explored.
-    Input states might be pre-processed versions of raw states.
+    Input states might be pre-processed versions of raw states; state_preprocessor can also be a list of preprocessors, applied as a PreprocessorPipeline.
     """
     def __init__(
             self,
@@ -23,8 +25,11 @@ class ALEActionHashingBonusEvaluator(object):
             parallel=False,
             retrieve_sample_size=np.inf,
             decay_within_path=False,
+            name=None,
         ):
         self.state_dim = state_dim
+        if isinstance(state_preprocessor, (list, tuple)):
+            state_preprocessor = PreprocessorPipeline(state_preprocessor)
         if state_preprocessor is not None:
             assert state_preprocessor.get_output_dim() == state_dim
             self.state_preprocessor = state_preprocessor
@@ -53,13 +58,16 @@ class ALEActionHashingBonusEvaluator(object):
 
         self.bonus_form = bonus_form
         self.log_prefix = log_prefix
+        # names the fields of the evaluator in paths and on the stats bus, which must match across processes and runs
+        self.name = log_prefix if name is None else name
         self.count_target = count_target
         self.parallel = parallel
         assert self.parallel == self.hash.parallel
         self.retrieve_sample_size = retrieve_sample_size
         self.decay_within_path = decay_within_path
-        self.unpicklable_list = ["_par_objs","shared_dict"]
+        self.unpicklable_list = ["_par_objs","shared_dict","stats_bus"]
         self.snapshot_list = [""]
+        self.stats_bus = None
 
         # logging stats ---------------------------------
         self.rank = None
@@ -80,11 +88,24 @@ class ALEActionHashingBonusEvaluator(object):
         self.rank = rank
         for hash_a in self.hash_list:
             hash_a.init_rank(rank)
+        if self.stats_bus is not None and rank == 0:
+            # no rank updates the counts before the first stats bus barrier
+            self._total_state_action_count = self.total_state_action_count()
+
+    def init_stats_bus(self, stats_bus):
+        """ as ALEHashingBonusEvaluator.init_stats_bus """
+        self.stats_bus = stats_bus
+        # max, min and sum of the counts, and number of steps
+        stats_bus.declare(self.stats_field(), shape=(4,))
+
+    def stats_field(self):
+        return "state_action_count_stats_%s" % self.name
 
     def init_shared_dict(self, shared_dict):
         self.shared_dict = shared_dict
         for hash_a in self.hash_list:
-            hash_a.init_shared_dict(shared_dict)
+            if hasattr(hash_a, "init_shared_dict"):
+                hash_a.init_shared_dict(shared_dict)
 
     def init_par_objs(self,n_parallel):
         n = n_parallel
@@ -122,6 +143,9 @@ class ALEActionHashingBonusEvaluator(object):
 
 
     def preprocess(self,states):
+        if self.count_target == "observations":
+            # (uint8 frame stacks hash as the float observations would)
+            states = observation_count_targets(states)
         if self.state_preprocessor is not None:
             processed_states = self.state_preprocessor.process(states)
         else:
@@ -129,28 +153,31 @@ class ALEActionHashingBonusEvaluator(object):
         return processed_states
 
     def retrieve_keys(self,paths):
-        # do it path by path to avoid memory overflow
-        keys = None
-        for path in paths:
-            path_len = len(path["rewards"])
-            k = min(path_len, self.retrieve_sample_size)
-            for i in range(0,path_len,k):
-                if self.count_target == "observations":
-                    states = path["observations"][i:i+k]
-                else:
-                    states = path["env_infos"][self.count_target][i:i+k]
-                states = self.preprocess(states)
-                new_keys = self.hash.compute_keys(states)
-                if keys is None:
-                    keys = new_keys
-                else:
-                    if isinstance(keys, np.ndarray):
-                        keys = np.concatenate([keys,new_keys])
-                    elif isinstance(keys, list):
-                        keys = keys + new_keys
-                    else:
-                        raise NotImplementedError
-        return keys
+        """
+        Keys of all states in paths, also cached in each path (views of one array) so that predict() and fit_before_process_samples() compute them once.
+        States are processed in chunks of at most retrieve_sample_size to avoid memory overflow.
+        """
+        return retrieve_path_keys(
+            paths,
+            lambda states: self.hash.compute_keys(self.preprocess(states)),
+            self.count_target,
+            self.retrieve_sample_size,
+            field=self.keys_field(),
+        )
+
+    def keys_field(self):
+        """ name of the keys cached in paths; evaluators of a composite share the paths but not the hash """
+        return "keys_%s" % self.name
+
+    def key_computations(self):
+        """
+        For computing the keys while sampling (see rllab.sampler.utils.rollout); paths that have them skip retrieve_keys()
+        """
+        return [(
+            [self.keys_field()],
+            self.count_target,
+            lambda states: [self.hash.compute_keys(self.preprocess(states))],
+        )]
 
     def total_state_action_count(self):
         return sum(
@@ -159,43 +186,45 @@ class ALEActionHashingBonusEvaluator(object):
         )
 
 
+    def path_actions(self, paths):
+        actions_onehot = np.vstack([path["actions"] for path in paths])
+        return np.nonzero(actions_onehot)[1]
+
+    def query_counts(self, keys, actions):
+        """ counts of the (state, action) pairs, in the order of the states """
+        counts = np.zeros(len(keys), dtype=int)
+        for a, hash_a in enumerate(self.hash_list):
+            indices = np.where(actions == a)[0]
+            if len(indices) > 0:
+                counts[indices] = hash_a.query_keys(keys[indices])
+        return counts
+
     def fit_before_process_samples(self, paths):
-        if self.parallel:
+        keys = self.retrieve_keys(paths)
+        actions = self.path_actions(paths)
+        if self.parallel and "counts" in paths[0]:
+            # avoid re-querying counts if they are already computed (probably in self.predict())
+            prev_counts = np.concatenate([path["counts"] for path in paths])
+        else:
+            prev_counts = self.query_counts(keys, actions)
+        self.update_counts(keys, actions, prev_counts)
+
+    def update_counts(self, keys, actions, prev_counts):
+        """
+        Log statistics of the counts before the update, then increment the counts of the (key, action) pairs.
+        """
+        # regroup keys by actions
+        keys_list = [
+            keys[np.where(actions==a)[0]]
+            for a in range(self.n_action)
+        ]
+        if self.parallel and self.stats_bus is not None:
+            self.stats_bus.field(self.stats_field())[self.rank] = \
+                [max(prev_counts), min(prev_counts), sum(prev_counts), len(prev_counts)]
+            self._keys_to_count = keys_list
+        elif self.parallel:
             shareds, barriers = self._par_objs
 
-            # avoid re-computing keys and counts if they are already computed (probably in self.predict())
-            # storing keys is necessary when converting the keys into memory and speed optimized forms takes time
-            # storing counts is necessary if we count with a shared dict, which is slow in query
-            if "keys" in paths[0]:
-                example_path_keys = paths[0]["keys"]
-                if isinstance(example_path_keys, list):
-                    keys = []
-                    for path in paths:
-                        keys = keys + path["keys"]
-                elif isinstance(example_path_keys, np.ndarray):
-                    keys = np.concatenate([path["keys"] for path in paths])
-                else:
-                    raise NotImplementedError
-            else:
-                keys = self.retrieve_keys(paths)
-
-            actions_onehot = np.vstack([path["actions"] for path in paths])
-            actions = np.nonzero(actions_onehot)[1]
-
-            # regroup keys by actions
-            keys_list = [
-                keys[np.where(actions==a)[0]]
-                for a in range(self.n_action)
-            ]
-
-            if "counts" in paths[0]:
-                prev_counts = np.concatenate([path["counts"] for path in paths])
-            else:
-                prev_counts = np.concatenate([
-                    hash_a.query_keys(keys_a)
-                    for hash_a, keys_a in zip(self.hash_list, keys_list)
-                ])
-
             #FIXME: if a new state is encountered by more than one process, then it is counted more than once
             shareds.max_state_action_count_vec[self.rank] = max(prev_counts)
             shareds.min_state_action_count_vec[self.rank] = min(prev_counts)
@@ -235,26 +264,13 @@ class ALEActionHashingBonusEvaluator(object):
                     total_state_action_count - prev_total_state_action_count
                 )
         else:
-            keys = self.retrieve_keys(paths)
-            actions_onehot = np.vstack([path["actions"] for path in paths])
-            actions = np.nonzero(actions_onehot)[1]
-            # regroup keys by actions
-            keys_list = [
-                keys[np.where(actions==a)[0]]
-                for a in range(self.n_action)
-            ]
-
-            prev_counts = np.concatenate([
-                hash_a.query_keys(keys_a)
-                for hash_a, keys_a in zip(self.hash_list, keys_list)
-            ])
-            prev_total_state_action_count = self.hash.total_state_action_count()
+            prev_total_state_action_count = self.total_state_action_count()
 
             for hash_a, keys_a in zip(self.hash_list, keys_list):
                 hash_a.inc_keys(keys_a)
 
             logger.record_tabular_misc_stat(self.log_prefix + 'StateActionCount',prev_counts)
-            total_state_action_count = self.hash.total_state_action_count()
+            total_state_action_count = self.total_state_action_count()
             logger.record_tabular(self.log_prefix + 'NewStateActionCount',total_state_action_count - prev_total_state_action_count)
 
             logger.record_tabular(
@@ -262,25 +278,60 @@ class ALEActionHashingBonusEvaluator(object):
                 total_state_action_count
             )
 
+    def reduce_stats(self):
+        """ (after the stats bus barrier) """
+        if self.rank == 0:
+            stats = self.stats_bus.field(self.stats_field())
+            logger.record_tabular(self.log_prefix + "StateActionCountMax", np.max(stats[:, 0]))
+            logger.record_tabular(self.log_prefix + "StateActionCountMin", np.min(stats[:, 1]))
+            logger.record_tabular(
+                self.log_prefix + "StateActionCountAverage", np.sum(stats[:, 2]) / np.sum(stats[:, 3]))
+        for hash_a, keys_a in zip(self.hash_list, self._keys_to_count):
+            hash_a.inc_keys(keys_a)
+        self._keys_to_count = None
+
+    def record_stats_after_update(self):
+        """ (rank 0, once every rank has incremented its counts, e.g. after the policy update) """
+        total_state_action_count = self.total_state_action_count()
+        logger.record_tabular(self.log_prefix + 'TotalStateActionCount', total_state_action_count)
+        logger.record_tabular(
+            self.log_prefix + 'NewStateActionCount', total_state_action_count - self._total_state_action_count)
+        self._total_state_action_count = total_state_action_count
+
+    def compute_bonuses(self, paths):
+        """
+        Equivalent to fit_before_process_samples(paths) and predict(path) for each path, in one pass over the batch: keys are computed once, and counts are queried for the whole batch.
+        As in the current training loops, the bonuses use the counts before the update in parallel mode and after the update in serial mode.
+        :return: a list of bonus vectors, one per path
+        """
+        keys = self.retrieve_keys(paths)
+        actions = self.path_actions(paths)
+        prev_counts = self.query_counts(keys, actions)
+        self.update_counts(keys, actions, prev_counts)
+        if self.parallel:
+            counts = prev_counts
+        else:
+            counts = self.query_counts(keys, actions)
+
+        bonuses = []
+        start = 0
+        for path in paths:
+            end = start + len(path["rewards"])
+            bonuses.append(self.counts_to_bonuses(path, counts[start:end]))
+            start = end
+        return bonuses
 
     def predict(self, path):
         keys = self.retrieve_keys([path])
-        actions_onehot = path["actions"]
-        actions = np.nonzero(actions_onehot)[1]
-        keys_list = [
-            keys[np.where(actions == a)[0]]
-            for a in range(self.n_action)
-        ]
-        counts_misordered = np.concatenate([
-            hash_a.query_keys(keys_a)
-            for hash_a, keys_a in zip(self.hash_list, keys_list)
-        ])  # not in the same order as states
+        counts = self.query_counts(keys, self.path_actions([path]))
+        return self.counts_to_bonuses(path, counts)
 
+    def counts_to_bonuses(self, path, counts):
+        """ Bonuses of the steps of one path, given their counts; the counts used are stored in path["counts"] """
         if self.decay_within_path:
             raise NotImplementedError
         else:
-            counts = np.maximum(counts_misordered, 1)
-        path["keys"] = keys
+            counts = np.maximum(counts, 1)
         path["counts"] = counts
 
         if self.bonus_form == "1/n":
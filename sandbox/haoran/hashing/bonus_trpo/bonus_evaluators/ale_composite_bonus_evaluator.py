@@ -2,15 +2,17 @@ import numpy as np
 import multiprocessing as mp
 from rllab.misc import logger
 from sandbox.haoran.hashing.bonus_trpo.bonus_evaluators.ale_hashing_bonus_evaluator import ALEHashingBonusEvaluator
+from sandbox.haoran.hashing.bonus_trpo.bonus_evaluators.key_retrieval import retrieve_shared_path_keys
 from sandbox.adam.parallel.util import SimpleContainer
 
 
 class ALECompositeBonusEvaluator(object):
     """
     Use a collection of bonus evaluators to compute bonuses on the same type of count targets. Then sum up the bonuses.
+    compute_bonuses() preprocesses the states once for all subordinate evaluators that share the same state_preprocessor object (and count target).
     The current implementation can be improved by:
-    1. Preprocessing the states before feeding them into subordinate evaluators
-    2. Reduce barriers in subordinate evaluators, by allowing the same evaluator to not wait for other parallel copies, but instead proceeed to other evaluators.
+    1. Reduce barriers in subordinate evaluators, by allowing the same evaluator to not wait for other parallel copies, but instead proceeed to other evaluators.
+    With the stats bus (see init_stats_bus()), the subordinate evaluators that support it have no barriers.
     """
     def __init__(
             self,
@@ -21,8 +23,11 @@ class ALECompositeBonusEvaluator(object):
         self.bonus_evaluators = bonus_evaluators
         self.log_prefix = log_prefix
         self.parallel = parallel
-        for ev in bonus_evaluators:
+        for i, ev in enumerate(bonus_evaluators):
             assert parallel == ev.parallel
+            if hasattr(ev, "name"):
+                # the evaluators share the paths and the stats bus, so their fields need distinct stable names
+                ev.name = "%s%d_%s" % (log_prefix, i, ev.name)
 
         # logging stats ---------------------------------
         self.rank = None
@@ -37,11 +42,86 @@ class ALECompositeBonusEvaluator(object):
         for ev in self.bonus_evaluators:
             ev.init_par_objs(n_parallel)
 
+    def init_shared_dict(self, shared_dict):
+        for ev in self.bonus_evaluators:
+            ev.init_shared_dict(shared_dict)
+
+
+    def stats_bus_evaluators(self):
+        return [ev for ev in self.bonus_evaluators if hasattr(ev, "init_stats_bus")]
+
+    def init_stats_bus(self, stats_bus):
+        for ev in self.stats_bus_evaluators():
+            ev.init_stats_bus(stats_bus)
+
+    def reduce_stats(self):
+        for ev in self.stats_bus_evaluators():
+            ev.reduce_stats()
+
+    def record_stats_after_update(self):
+        for ev in self.stats_bus_evaluators():
+            ev.record_stats_after_update()
 
     def fit_before_process_samples(self, paths):
         for ev in self.bonus_evaluators:
             ev.fit_before_process_samples(paths)
 
+    def group_evaluators(self, chunked=True):
+        """
+        Subordinate evaluators with keys, grouped by state_preprocessor object and count target (and retrieve_sample_size if chunked)
+        """
+        groups = dict()
+        for ev in self.bonus_evaluators:
+            if hasattr(ev, "keys_field"):
+                group_key = (id(ev.state_preprocessor), ev.count_target)
+                if chunked:
+                    group_key += (ev.retrieve_sample_size,)
+                groups.setdefault(group_key, []).append(ev)
+        return list(groups.values())
+
+    def compute_keys_list(self, evs, states):
+        processed_states = evs[0].preprocess(states)
+        return [ev.hash.compute_keys(processed_states) for ev in evs]
+
+    def share_preprocessing(self, paths):
+        """
+        Compute and cache the keys of all subordinate evaluators, preprocessing the states once per group of evaluators with the same preprocessor.
+        """
+        for evs in self.group_evaluators():
+            if len(evs) < 2:
+                continue
+            retrieve_shared_path_keys(
+                paths,
+                lambda states, evs=evs: self.compute_keys_list(evs, states),
+                evs[0].count_target,
+                evs[0].retrieve_sample_size,
+                [ev.keys_field() for ev in evs],
+            )
+
+    def key_computations(self):
+        """
+        For computing the keys of all subordinate evaluators while sampling, preprocessing the states once per group
+        """
+        return [
+            (
+                [ev.keys_field() for ev in evs],
+                evs[0].count_target,
+                lambda states, evs=evs: self.compute_keys_list(evs, states),
+            )
+            for evs in self.group_evaluators(chunked=False)
+        ]
+
+    def compute_bonuses(self, paths):
+        """
+        Sum of the bonuses of the subordinate evaluators (see ALEHashingBonusEvaluator.compute_bonuses)
+        """
+        self.share_preprocessing(paths)
+        bonuses = [np.zeros(len(path["rewards"])) for path in paths]
+        for ev in self.bonus_evaluators:
+            for path_bonuses, ev_bonuses in zip(bonuses, ev.compute_bonuses(paths)):
+                path_bonuses += ev_bonuses
+        return bonuses
+
     def predict(self, path):
         bonuses = np.zeros(len(path["rewards"]))
         for ev in self.bonus_evaluators:
@@ -2,13 +2,15 @@ import numpy as np
 import multiprocessing as mp
 from rllab.misc import logger
 from sandbox.haoran.hashing.bonus_trpo.bonus_evaluators.hash.sim_hash import SimHash
+from sandbox.haoran.hashing.bonus_trpo.bonus_evaluators.key_retrieval import retrieve_path_keys, observation_count_targets
+from sandbox.haoran.hashing.bonus_trpo.bonus_evaluators.preprocessor.preprocessor_pipeline import PreprocessorPipeline
 from sandbox.adam.parallel.util import SimpleContainer
 
 
 class ALEHashingBonusEvaluator(object):
     """
     Uses a hash function to store states counts. Then assign bonus reward to under-explored.
-    Input states might be pre-processed versions of raw states.
+    Input states might be pre-processed versions of raw states; state_preprocessor can also be a list of preprocessors, applied as a PreprocessorPipeline.
     """
     def __init__(
             self,
@@ -21,8 +23,11 @@ class ALEHashingBonusEvaluator(object):
             parallel=False,
             retrieve_sample_size=np.inf,
             decay_within_path=False,
+            name=None,
         ):
         self.state_dim = state_dim
+        if isinstance(state_preprocessor, (list, tuple)):
+            state_preprocessor = PreprocessorPipeline(state_preprocessor)
         if state_preprocessor is not None:
             assert state_preprocessor.get_output_dim() == state_dim
             self.state_preprocessor = state_preprocessor
@@ -44,13 +49,16 @@ class ALEHashingBonusEvaluator(object):
 
         self.bonus_form = bonus_form
         self.log_prefix = log_prefix
+        # names the fields of the evaluator in paths and on the stats bus, which must match across processes and runs
+        self.name = log_prefix if name is None else name
         self.count_target = count_target
         self.parallel = parallel
         assert self.parallel == self.hash.parallel
         self.retrieve_sample_size = retrieve_sample_size
         self.decay_within_path = decay_within_path
-        self.unpicklable_list = ["_par_objs","shared_dict"]
+        self.unpicklable_list = ["_par_objs","shared_dict","stats_bus"]
         self.snapshot_list = [""]
+        self.stats_bus = None
 
         # logging stats ---------------------------------
         self.rank = None
@@ -69,10 +77,28 @@ class ALEHashingBonusEvaluator(object):
     def init_rank(self,rank):
         self.rank = rank
         self.hash.init_rank(rank)
+        if self.stats_bus is not None and rank == 0:
+            # no rank updates the counts before the first stats bus barrier
+            self._total_state_count = self.hash.total_state_count()
+
+    def init_stats_bus(self, stats_bus):
+        """
+        The statistics of the counts go through the stats bus (see ParallelBatchPolopt.sync_stats), instead of two
+        barriers in update_counts(): update_counts() only puts them, and the counts are incremented in
+        reduce_stats(), after the barrier, directly in the hash (the keys are not put on the bus).
+        """
+        self.stats_bus = stats_bus
+        # max, min and sum of the counts, and number of steps
+        stats_bus.declare(self.stats_field(), shape=(4,))
+
+    def stats_field(self):
+        return "state_count_stats_%s" % self.name
 
     def init_shared_dict(self, shared_dict):
         self.shared_dict = shared_dict
-        self.hash.init_shared_dict(shared_dict)
+        # (e.g. SimHash keeps its counts in shared tables instead)
+        if hasattr(self.hash, "init_shared_dict"):
+            self.hash.init_shared_dict(shared_dict)
 
     def init_par_objs(self,n_parallel):
         n = n_parallel
@@ -110,6 +136,9 @@ class ALEHashingBonusEvaluator(object):
 
 
     def preprocess(self,states):
+        if self.count_target == "observations":
+            # (uint8 frame stacks hash as the float observations would)
+            states = observation_count_targets(states)
         if self.state_preprocessor is not None:
             processed_states = self.state_preprocessor.process(states)
         else:
@@ -117,53 +146,51 @@ class ALEHashingBonusEvaluator(object):
         return processed_states
 
     def retrieve_keys(self,paths):
-        # do it path by path to avoid memory overflow
-        keys = None
-        for path in paths:
-            path_len = len(path["rewards"])
-            k = min(path_len, self.retrieve_sample_size)
-            for i in range(0,path_len,k):
-                if self.count_target == "observations":
-                    states = path["observations"][i:i+k]
-                else:
-                    states = path["env_infos"][self.count_target][i:i+k]
-                states = self.preprocess(states)
-                new_keys = self.hash.compute_keys(states)
-                if keys is None:
-                    keys = new_keys
-                else:
-                    if isinstance(keys, np.ndarray):
-                        keys = np.concatenate([keys,new_keys])
-                    elif isinstance(keys, list):
-                        keys = keys + new_keys
-                    else:
-                        raise NotImplementedError
-        return keys
+        """
+        Keys of all states in paths, also cached in each path (views of one array) so that predict() and fit_before_process_samples() compute them once.
+        States are processed in chunks of at most retrieve_sample_size to avoid memory overflow.
+        """
+        return retrieve_path_keys(
+            paths,
+            lambda states: self.hash.compute_keys(self.preprocess(states)),
+            self.count_target,
+            self.retrieve_sample_size,
+            field=self.keys_field(),
+        )
 
-    def fit_before_process_samples(self, paths):
-        if self.parallel:
-            shareds, barriers = self._par_objs
+    def keys_field(self):
+        """ name of the keys cached in paths; evaluators of a composite share the paths but not the hash """
+        return "keys_%s" % self.name
 
-            # avoid re-computing keys and counts if they are already computed (probably in self.predict())
-            # storing keys is necessary when converting the keys into memory and speed optimized forms takes time
-            # storing counts is necessary if we count with a shared dict, which is slow in query
-            if "keys" in paths[0]:
-                example_path_keys = paths[0]["keys"]
-                if isinstance(example_path_keys, list):
-                    keys = []
-                    for path in paths:
-                        keys = keys + path["keys"]
-                elif isinstance(example_path_keys, np.ndarray):
-                    keys = np.concatenate([path["keys"] for path in paths])
-                else:
-                    raise NotImplementedError
-            else:
-                keys = self.retrieve_keys(paths)
+    def key_computations(self):
+        """
+        For computing the keys while sampling (see rllab.sampler.utils.rollout); paths that have them skip retrieve_keys()
+        """
+        return [(
+            [self.keys_field()],
+            self.count_target,
+            lambda states: [self.hash.compute_keys(self.preprocess(states))],
+        )]
 
-            if "counts" in paths[0]:
-                prev_counts = np.concatenate([path["counts"] for path in paths])
-            else:
-                prev_counts = self.hash.query_keys(keys)
+    def fit_before_process_samples(self, paths):
+        keys = self.retrieve_keys(paths)
+        if self.parallel and "counts" in paths[0]:
+            # avoid re-querying counts if they are already computed (probably in self.predict())
+            prev_counts = np.concatenate([path["counts"] for path in paths])
+        else:
+            prev_counts = self.hash.query_keys(keys)
+        self.update_counts(keys, prev_counts)
+
+    def update_counts(self, keys, prev_counts):
+        """
+        Log statistics of the counts before the update, then increment the counts of keys.
+        """
+        if self.parallel and self.stats_bus is not None:
+            self.stats_bus.field(self.stats_field())[self.rank] = \
+                [max(prev_counts), min(prev_counts), sum(prev_counts), len(prev_counts)]
+            self._keys_to_count = keys
+        elif self.parallel:
+            shareds, barriers = self._par_objs
 
             #FIXME: if a new state is encountered by more than one process, then it is counted more than once
             shareds.max_state_count_vec[self.rank] = max(prev_counts)
@@ -202,9 +229,6 @@ class ALEHashingBonusEvaluator(object):
                     total_state_count - prev_total_state_count
                 )
         else:
-            keys = self.retrieve_keys(paths)
-
-            prev_counts = self.hash.query_keys(keys)
             prev_total_state_count = self.hash.total_state_count()
 
             self.hash.inc_keys(keys)
@@ -218,10 +242,52 @@ class ALEHashingBonusEvaluator(object):
                 total_state_count
             )
 
+    def reduce_stats(self):
+        """ (after the stats bus barrier) """
+        if self.rank == 0:
+            stats = self.stats_bus.field(self.stats_field())
+            logger.record_tabular(self.log_prefix + "StateCountMax", np.max(stats[:, 0]))
+            logger.record_tabular(self.log_prefix + "StateCountMin", np.min(stats[:, 1]))
+            logger.record_tabular(self.log_prefix + "StateCountAverage", np.sum(stats[:, 2]) / np.sum(stats[:, 3]))
+        self.hash.inc_keys(self._keys_to_count)
+        self._keys_to_count = None
+
+    def record_stats_after_update(self):
+        """ (rank 0, once every rank has incremented its counts, e.g. after the policy update) """
+        total_state_count = self.hash.total_state_count()
+        logger.record_tabular(self.log_prefix + 'TotalStateCount', total_state_count)
+        logger.record_tabular(self.log_prefix + 'NewSteateCount', total_state_count - self._total_state_count)
+        self._total_state_count = total_state_count
+
+    def compute_bonuses(self, paths):
+        """
+        Equivalent to fit_before_process_samples(paths) and predict(path) for each path, in one pass over the batch: keys are computed once, and counts are queried for the whole batch.
+        As in the current training loops, the bonuses use the counts before the update in parallel mode (ParallelBatchPolopt predicts first) and after the update in serial mode (BonusTRPO fits first).
+        :return: a list of bonus vectors, one per path
+        """
+        keys = self.retrieve_keys(paths)
+        prev_counts = np.asarray(self.hash.query_keys(keys))
+        self.update_counts(keys, prev_counts)
+        if self.parallel:
+            counts = prev_counts
+        else:
+            counts = np.asarray(self.hash.query_keys(keys))
+
+        bonuses = []
+        start = 0
+        for path in paths:
+            end = start + len(path["rewards"])
+            bonuses.append(self.counts_to_bonuses(path, keys[start:end], counts[start:end]))
+            start = end
+        return bonuses
 
     def predict(self, path):
         keys = self.retrieve_keys([path])
         counts = self.hash.query_keys(keys)
+        return self.counts_to_bonuses(path, keys, counts)
+
+    def counts_to_bonuses(self, path, keys, counts):
+        """ Bonuses of the states of one path, given their keys and counts; the counts used are stored in path["counts"] """
         if self.decay_within_path:
             # update counts of the same states within a path
             count_dict = dict()
@@ -244,7 +310,6 @@ class ALEHashingBonusEvaluator(object):
             counts = np.asarray(counts_updated)
         else:
             counts = np.maximum(counts, 1)
-        path["keys"] = keys
         path["counts"] = counts
 
         if self.bonus_form == "1/n":
@@ -3,14 +3,17 @@ Implement the hash table as a vector instead of a multi-dimensional array, so th
 """
 
 from sandbox.haoran.hashing.bonus_trpo.bonus_evaluators.hash.base import Hash
+from sandbox.haoran.hashing.bonus_trpo.bonus_evaluators.hash.ram_key_plan import RAMKeyPlan
+from sandbox.haoran.hashing.bonus_trpo.bonus_evaluators.hash.key_counters import make_serial_key_counter
 import numpy as np
 import multiprocessing as mp
 import copy
 
 class ALEHackyHashV4(Hash):
-    def __init__(self,item_dim, game, parallel=False):
+    def __init__(self,item_dim, game, parallel=False, dense_table_budget=2**28):
         """
         This hash is taylored for clearing the first room (take key and go to room number 2)
+        :param dense_table_budget: in serial mode, count with a dense uint32 table if it takes at most this many bytes, otherwise with sorted arrays
         """
         assert item_dim == 128 # must be RAM
         self.item_dim = item_dim
@@ -52,6 +55,10 @@ class ALEHackyHashV4(Hash):
             len(self.ram_info[index]["values"])
             for index in self.ram_indices
         ]
+        self.key_plan = RAMKeyPlan(
+            [dict(index=index, **self.ram_info[index]) for index in self.ram_indices],
+            self.n_values,
+        )
         if parallel:
             self.table_lock = mp.Value('i')
             self.table = np.frombuffer(
@@ -62,7 +69,7 @@ class ALEHackyHashV4(Hash):
             self.snapshot_list = ["table"]
             self.rank = None
         else:
-            self.table = dict()
+            self.table = make_serial_key_counter(np.prod(self.n_values), dense_table_budget)
             self.unpicklable_list = []
             self.snapshot_list = []
         self.parallel = parallel
@@ -82,76 +89,22 @@ class ALEHackyHashV4(Hash):
 
 
     def compute_keys(self, items):
-        # sometimes items have the shape (n_items, 128, 1), like images
-        if len(items.shape) > 2:
-            items = np.asarray([item.ravel() for item in items],dtype=int)
-        else:
-            items = items.astype(int)
-        n_items = items.shape[0]
-
-        # convert useful ram values to an integer code
-        keys = np.zeros(n_items,dtype=int)
-        for i in range(len(self.ram_indices)):
-            index = self.ram_indices[i]
-            _items = items[:,index]
-            value_type = self.ram_info[index]["value_type"]
-            values = self.ram_info[index]["values"]
-
-            if value_type == "range":
-                # v -> v - v_min
-                value_min = np.amin(values)
-                _items_short = _items - value_min
-            elif value_type == "categorical":
-                # v -> index of v
-                _items_short = np.zeros_like(_items)
-                for j in range(len(values)):
-                    _items_short += j * (_items == values[j])
-            else:
-                raise NotImplementedError
-            keys +=  _items_short * np.prod(self.n_values[i+1:]).astype(int)
-        return keys
+        # items may also have the shape (n_items, 128, 1), like images
+        return self.key_plan.compute_keys(items)
 
     def keys_to_values(self, keys, original_range=True):
         """
         Convert the integer key to important ram values
         """
         assert len(keys.shape) == 1
-        n_keys = len(keys)
-        values = np.zeros((n_keys,len(self.ram_indices)),dtype=int)
-        remains = keys
-        for i in range(len(self.ram_indices)):
-            s = int(np.prod(self.n_values[i+1:]))
-            _values_short = remains // s
-
-            if original_range:
-                index = self.ram_indices[i]
-                value_type = self.ram_info[index]["value_type"]
-                ram_values = self.ram_info[index]["values"]
-                if value_type == "range":
-                    value_min = np.amin(ram_values)
-                    _values = _values_short + value_min
-                elif value_type == "categorical":
-                    _values = np.zeros_like(_values_short,dtype=int)
-                    for j in range(len(ram_values)):
-                        _values += ram_values[j] * (_values_short == j)
-                else:
-                    raise NotImplementedError
-                values[:,i] = _values
-            else:
-                values[:,i] = _values_short
-            remains = remains % s
-        return values
+        return self.key_plan.keys_to_values(keys, original_range)
 
     def inc_keys(self, keys):
         if self.parallel:
             with self.table_lock.get_lock():
                 np.add.at(self.table, list(keys), 1)
         else:
-            for key in keys:
-                if key not in self.table:
-                    self.table[key] = 1
-                else:
-                    self.table[key] += 1
+            self.table.inc(keys)
 
 
 
@@ -159,12 +112,7 @@ class ALEHackyHashV4(Hash):
         if self.parallel:
             counts = self.table[list(keys)]
         else:
-            counts = []
-            for key in keys:
-                if key not in self.table:
-                    counts.append(0)
-                else:
-                    counts.append(self.table[key])
+            counts = self.table.query(keys)
         return counts
 
     def reset(self):
@@ -172,4 +120,10 @@ class ALEHackyHashV4(Hash):
             with self.table_lock.get_lock():
                 self.table = np.zeros_like(self.table)
         else:
-            self.table = dict()
+            self.table.reset()
+
+    def total_state_count(self):
+        if self.parallel:
+            return np.count_nonzero(self.table)
+        else:
+            return len(self.table)
@@ -6,13 +6,23 @@ A more flexible version
 
 from sandbox.haoran.hashing.bonus_trpo.bonus_evaluators.hash.base import Hash
 from sandbox.haoran.hashing.bonus_trpo.bonus_evaluators.hash import ale_ram_info
+from sandbox.haoran.hashing.bonus_trpo.bonus_evaluators.hash.sharded_counter import ShardLocks
+from sandbox.haoran.hashing.bonus_trpo.bonus_evaluators.hash.memmap_count_store import MemmapCountStore
+from sandbox.haoran.hashing.bonus_trpo.bonus_evaluators.hash.ram_key_plan import RAMKeyPlan
+from sandbox.haoran.hashing.bonus_trpo.bonus_evaluators.hash.key_counters import make_serial_key_counter
 from collections import OrderedDict
 import numpy as np
 import multiprocessing as mp
 import copy
 
 class ALEHackyHashV5(Hash):
-    def __init__(self,item_dim, game, ram_names, extra_info=dict(), parallel=False):
+    table_store = None
+
+    def __init__(self,item_dim, game, ram_names, extra_info=dict(), parallel=False, persistent=False, dense_table_budget=2**28):
+        """
+        :param persistent: keep the count table in a MemmapCountStore under the snapshot dir; snapshots then only write the pages changed since the previous one
+        :param dense_table_budget: in serial mode, count with a dense uint32 table if it takes at most this many bytes, otherwise with sorted arrays
+        """
         assert item_dim == 128 # must be RAM
         self.item_dim = item_dim
         all_ram_info = getattr(ale_ram_info,game)
@@ -31,18 +41,29 @@ class ALEHackyHashV5(Hash):
             else:
                 n_value = len(info["values"])
             self.n_values.append(n_value)
+        self.key_plan = RAMKeyPlan(list(self.ram_info.values()), self.n_values)
 
-        if parallel:
-            self.table_lock = mp.Value('i')
+        if persistent:
+            self.table_store = MemmapCountStore(
+                int(np.prod(self.n_values)), np.int32, parallel=parallel, name="ale_hacky_hash")
+            self.table = self.table_store.array
+            self.unpicklable_list = ["table"]
+            self.snapshot_list = []
+            if parallel:
+                self.table_shard_locks = ShardLocks(len(self.table))
+                self.unpicklable_list.append("table_shard_locks")
+                self.rank = None
+        elif parallel:
             self.table = np.frombuffer(
                 mp.RawArray('i', int(np.prod(self.n_values))),
                 np.int32,
             )
-            self.unpicklable_list = ["table_lock","table"]
+            self.table_shard_locks = ShardLocks(len(self.table))
+            self.unpicklable_list = ["table_shard_locks","table"]
             self.snapshot_list = ["table"]
             self.rank = None
         else:
-            self.table = dict()
+            self.table = make_serial_key_counter(np.prod(self.n_values), dense_table_budget)
             self.unpicklable_list = []
             self.snapshot_list = []
         self.parallel = parallel
@@ -57,6 +78,11 @@ class ALEHackyHashV5(Hash):
                 state[k] = copy.deepcopy(v)
         return state
 
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.table_store is not None:
+            self.table = self.table_store.array
+
     def init_rank(self,rank):
         self.rank = rank
 
@@ -67,45 +93,9 @@ class ALEHackyHashV5(Hash):
     def compute_keys(self, items):
         """
         Convert the tuple of relevant ram values into a single integer, exact like converting a binary number to a decimal integer.
-        :param items: a N x 128 matrix of N ram states
+        :param items: a N x 128 matrix of N ram states; (n_items, 128, 1) or (n_items, 1, 128, 1), like images, also works
         """
-        # sometimes items have the shape (n_items, 128, 1), or (n_items, 1, 128, 1), like images
-        if len(items.shape) > 2:
-            items = np.asarray([item.ravel() for item in items],dtype=int)
-        else:
-            items = items.astype(int)
-        n_items = items.shape[0]
-
-        # convert useful ram values to an integer code
-        # similar to converting a binary number to a decimal
-        keys = np.zeros(n_items,dtype=int)
-        for i,name in enumerate(self.ram_info.keys()):
-            info = self.ram_info[name]
-            index = info["index"]
-            value_type = info["value_type"]
-            values = info["values"]
-            _items = items[:,index] # vector of a specific RAM entry
-            if value_type == "range":
-                # v -> v - v_min
-                value_min = np.amin(values)
-                _items_short = _items - value_min
-                if "grid_size" in info.keys():
-                    _items_short = np.floor(_items_short / info["grid_size"]).astype(int)
-                if "random" in info.keys() and info["random"]:
-                    _items_short = np.random.randint(
-                        low=0,
-                        high=self.n_values[i],
-                        size=_items_short.shape
-                    )
-            elif value_type == "categorical":
-                # v -> index of v
-                _items_short = np.zeros_like(_items)
-                for j in range(len(values)):
-                    _items_short += j * (_items == values[j])
-            else:
-                raise NotImplementedError
-            keys +=  _items_short * np.prod(self.n_values[i+1:]).astype(int)
-        return keys
+        return self.key_plan.compute_keys(items)
 
     def keys_to_values(self, keys, original_range=True):
         """
@@ -113,73 +103,41 @@ class ALEHackyHashV5(Hash):
         :param keys: a vector of integer keys
         """
         assert len(keys.shape) == 1
-        n_keys = len(keys)
-        values = np.zeros((n_keys,len(self.n_values)),dtype=int)
-        remains = keys
-        for i,name in enumerate(self.ram_info.keys()):
-            s = int(np.prod(self.n_values[i+1:]))
-            _values_short = remains // s
-
-            if original_range:
-                info = self.ram_info[name]
-                index = info["index"]
-                value_type = info["value_type"]
-                ram_values = info["values"]
-                if value_type == "range":
-                    value_min = np.amin(ram_values)
-                    if "grid_size" in info.keys():
-                        _values = _values_short * info["grid_size"] + value_min
-                    else:
-                        _values = _values_short + value_min
-                elif value_type == "categorical":
-                    _values = np.zeros_like(_values_short,dtype=int)
-                    for j in range(len(ram_values)):
-                        _values += ram_values[j] * (_values_short == j)
-                else:
-                    raise NotImplementedError
-                values[:,i] = _values
-            else:
-                values[:,i] = _values_short
-            remains = remains % s
-        return values
+        return self.key_plan.keys_to_values(keys, original_range)
 
     def inc_keys(self, keys):
         if self.parallel:
-            with self.table_lock.get_lock():
-                np.add.at(self.table, list(keys), 1)
+            self.table_shard_locks.add(self.table, keys, self.rank)
+        elif self.table_store is not None:
+            np.add.at(self.table, keys, 1)
         else:
-            for key in keys:
-                if key not in self.table:
-                    self.table[key] = 1
-                else:
-                    self.table[key] += 1
+            self.table.inc(keys)
+        if self.table_store is not None:
+            self.table_store.mark(keys)
 
 
 
     def query_keys(self, keys):
-        if self.parallel:
+        if self.parallel or self.table_store is not None:
             counts = self.table[list(keys)]
         else:
-            counts = []
-            for key in keys:
-                if key not in self.table:
-                    counts.append(0)
-                else:
-                    counts.append(self.table[key])
+            counts = self.table.query(keys)
         return counts
 
     def reset(self):
-        if self.parallel:
-            with self.table_lock.get_lock():
-                self.table = np.zeros_like(self.table)
+        if self.table_store is not None:
+            if self.parallel:
+                self.table_shard_locks.reset(self.table)
+            else:
+                self.table[:] = 0
+            self.table_store.mark_all()
+        elif self.parallel:
+            self.table_shard_locks.reset(self.table)
         else:
-            self.table = dict()
+            self.table.reset()
 
     def total_state_count(self):
-        if self.parallel:
+        if self.parallel or self.table_store is not None:
             return np.count_nonzero(self.table)
         else:
-            try:
-                return len(self.table.keys())
-            except:
-                return np.count_nonzero(self.table)
+            return len(self.table)
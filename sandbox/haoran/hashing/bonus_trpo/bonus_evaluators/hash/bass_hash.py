@@ -9,6 +9,7 @@ class BassHash(NaryHash):
             bass,
             bucket_sizes=None,
             parallel=False,
+            sketch=None,
         ):
         self.item_dim = None
         self.bass = bass
@@ -19,6 +20,7 @@ class BassHash(NaryHash):
             dim_key=dim_key,
             bucket_sizes=bucket_sizes,
             parallel=parallel,
+            sketch=sketch,
         )
 
 
@@ -1,16 +1,26 @@
 from sandbox.haoran.hashing.bonus_trpo.bonus_evaluators.hash.base import Hash
+from sandbox.haoran.hashing.bonus_trpo.bonus_evaluators.hash.sharded_counter import ShardLocks, flat_table_indices
 import numpy as np
 import multiprocessing as mp
 import copy
 
 class BinaryHash(Hash):
-    def __init__(self,dim_key, bucket_sizes=None,parallel=False):
+    sketch = None
+    rank = None
+
+    def __init__(self,dim_key, bucket_sizes=None,parallel=False,sketch=None):
         """
         Encode each item (vector) a binary code (sequence of 1 or -1) of length dim_key. Then further compress the binary code as \sum_{i=0}^{dim_key} b_i 2^i (mod bucket_size) for each bucket. The bucket sizes are primes, so that we obtain distinct keys. Bucket keys are redundant to reduce the error caused by compression (see the query part).
         A key is finally represented as indices in the bukckets.
         When a new item is given, increment the key counts for all buckets.
         When querying the count of an item, compute the key counts for all buckets but return the minimum. This way the count is less prone to errors caused by key compression.
+
+        :param sketch: a CountMinSketch that replaces the tables; bucket_sizes are taken from it
         """
+        if sketch is not None:
+            assert bucket_sizes is None or list(bucket_sizes) == list(sketch.bucket_sizes)
+            assert parallel == sketch.parallel
+            bucket_sizes = sketch.bucket_sizes
         # each column is a vector of uniformly random orientation
         self.dim_key = dim_key
         if bucket_sizes is None:
@@ -29,14 +39,20 @@ class BinaryHash(Hash):
 
         # the tables count the number of observed keys for each bucket
         self.parallel = parallel
-        if parallel:
-            self.tables_lock = mp.Value('i')
+        if sketch is not None:
+            self.sketch = sketch
+            self.unpicklable_list = []
+            self.snapshot_list = []
+        elif parallel:
             self.tables = np.frombuffer(
                 mp.RawArray('i', int(len(bucket_sizes) * np.max(bucket_sizes))),
                 np.int32,
             )
             self.tables = self.tables.reshape((len(bucket_sizes), np.max(bucket_sizes)))
-            self.unpicklable_list = ["tables_lock","tables"]
+            # each rank updates the shards of the tables in a different order, instead of waiting for one global lock
+            self.tables_shard_locks = ShardLocks(self.tables.size)
+            self.rank = None
+            self.unpicklable_list = ["tables_shard_locks","tables"]
             self.snapshot_list = ["tables"]
         else:
             self.tables = np.zeros((len(bucket_sizes), np.max(bucket_sizes)),dtype=int)
@@ -73,13 +89,14 @@ class BinaryHash(Hash):
         """
         Increment hash table counts for many items (row-wise stacked as a matrix)
         """
-        if self.parallel:
-            print("%d: before table lock"%(self.rank))
-            with self.tables_lock.get_lock():
-                print("%d: inside table lock"%(self.rank))
-                for idx in range(len(self.bucket_sizes)):
-                    np.add.at(self.tables[idx], keys[:, idx], 1)
-            print("%d: exit table lock"%(self.rank))
+        if self.sketch is not None:
+            self.sketch.inc(keys, self.rank)
+        elif self.parallel:
+            self.tables_shard_locks.add(
+                self.tables,
+                flat_table_indices(keys, self.tables.shape[1]),
+                self.rank,
+            )
         else:
             for idx in range(len(self.bucket_sizes)):
                 np.add.at(self.tables[idx], keys[:, idx], 1)
@@ -88,6 +105,8 @@ class BinaryHash(Hash):
         """
         For each item, return the min of all counts from all buckets.
         """
+        if self.sketch is not None:
+            return self.sketch.query(keys)
         all_counts = []
         for idx in range(len(self.bucket_sizes)):
             all_counts.append(self.tables[idx, keys[:, idx]])
@@ -95,15 +114,17 @@ class BinaryHash(Hash):
         return counts
 
     def reset(self):
-        if self.parallel:
-            with self.tables_lock.get_lock():
-                self.tables = np.zeros(
-                    (len(self.bucket_sizes), np.max(self.bucket_sizes))
-                )
+        if self.sketch is not None:
+            self.sketch.reset()
+        elif self.parallel:
+            # zero in place to keep the tables shared
+            self.tables_shard_locks.reset(self.tables)
         else:
             self.tables = np.zeros(
                 (len(self.bucket_sizes), np.max(self.bucket_sizes))
             )
 
     def total_state_count(self):
+        if self.sketch is not None:
+            return self.sketch.total_state_count()
         return 0 # not implememted yet
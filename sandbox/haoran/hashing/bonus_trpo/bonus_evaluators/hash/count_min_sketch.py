@@ -0,0 +1,205 @@
+from sandbox.haoran.hashing.bonus_trpo.bonus_evaluators.hash.memmap_count_store import MemmapCountStore
+from sandbox.haoran.hashing.bonus_trpo.bonus_evaluators.hash.sharded_counter import ShardLocks, flat_table_indices
+import numpy as np
+import multiprocessing as mp
+import copy
+
+class CountMinSketch(object):
+    """
+    Count-min sketch over the bucket keys produced by SimHash, BinaryHash and NaryHash (tables mode).
+    Row i has bucket_sizes[i] counters. A key is a row of bucket indices, one per table row; its count is the minimum over the rows.
+
+    Compared with the int64 / float64 tables kept by the hashes:
+    - counters are uint32, or uint16 that saturate at 65535 instead of wrapping around
+    - conservative_update only raises each counter to (current estimate + increment), which reduces overestimation
+    - increments aggregate duplicate keys with np.unique and write each counter once, instead of np.add.at
+    - reset() zeroes the tables in place, so dtype and shared memory are kept
+    - total_state_count() is estimated with a HyperLogLog sketch of 2^hll_precision registers. Items that collide in every row are counted once.
+
+    With parallel=True, the ranks update the counters and the registers under the locks of their shards (see ShardLocks), not under one global lock. Conservative update is then not supported: it reads the estimates before raising the counters, so concurrent increments of the same key could be lost.
+
+    With persistent=True the counters live in a MemmapCountStore under the snapshot dir, which snapshots only the pages changed since the last iteration. uint32 counters without conservative update then count exactly like the tables of the hashes.
+    """
+    tables_store = None
+    persistent = False
+
+    def __init__(self,
+            bucket_sizes=None,
+            dtype=np.uint32,
+            conservative_update=False,
+            hll_precision=14,
+            parallel=False,
+            persistent=False,
+        ):
+        if bucket_sizes is None:
+            bucket_sizes = [999931, 999953, 999959, 999961, 999979, 999983]
+        self.bucket_sizes = np.asarray(bucket_sizes)
+        self.dtype = np.dtype(dtype)
+        assert self.dtype in [np.dtype(np.uint16), np.dtype(np.uint32)]
+        self.max_count = np.iinfo(self.dtype).max
+        if parallel and conservative_update:
+            raise NotImplementedError("conservative_update needs one lock over all the rows; use parallel=False")
+        self.conservative_update = conservative_update
+        self.hll_precision = hll_precision
+        self.n_registers = 2 ** hll_precision
+
+        self.parallel = parallel
+        self.persistent = persistent
+        table_shape = (len(self.bucket_sizes), np.max(self.bucket_sizes))
+        if persistent:
+            # the store is pickled as of its last snapshot, taken first if the counts changed (see MemmapCountStore); tables is a view of its file
+            self.tables_store = MemmapCountStore(table_shape, self.dtype, parallel=parallel, name="count_min_sketch")
+            self.tables = self.tables_store.array
+        if parallel:
+            typecode = "H" if self.dtype == np.dtype(np.uint16) else "I"
+            if not persistent:
+                self.tables = np.frombuffer(
+                    mp.RawArray(typecode, int(np.prod(table_shape))),
+                    self.dtype,
+                ).reshape(table_shape)
+            self.registers = np.frombuffer(
+                mp.RawArray('B', self.n_registers),
+                np.uint8,
+            )
+            self.tables_shard_locks = ShardLocks(int(np.prod(table_shape)))
+            self.registers_shard_locks = ShardLocks(self.n_registers)
+            self.unpicklable_list = ["tables_shard_locks", "registers_shard_locks", "tables", "registers"]
+            self.snapshot_list = ["registers"] if persistent else ["tables", "registers"]
+        else:
+            if not persistent:
+                self.tables = np.zeros(table_shape, dtype=self.dtype)
+            self.registers = np.zeros(self.n_registers, dtype=np.uint8)
+            self.unpicklable_list = ["tables"] if persistent else []
+            self.snapshot_list = []
+
+    def __getstate__(self):
+        """ Do not pickle parallel objects. """
+        state = dict()
+        for k,v in iter(self.__dict__.items()):
+            if k not in self.unpicklable_list:
+                state[k] = v
+            elif k in self.snapshot_list:
+                state[k] = copy.deepcopy(v)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.tables_store is not None:
+            self.tables = self.tables_store.array
+
+    def get_copy(self):
+        """ An empty sketch with the same configuration """
+        return CountMinSketch(
+            bucket_sizes=self.bucket_sizes,
+            dtype=self.dtype,
+            conservative_update=self.conservative_update,
+            hll_precision=self.hll_precision,
+            parallel=self.parallel,
+            persistent=self.persistent,
+        )
+
+    def memory_size(self):
+        """ bytes used by the counters and the HyperLogLog registers """
+        return self.tables.nbytes + self.registers.nbytes
+
+    def inc(self, keys, rank=None):
+        """
+        :param keys: int matrix of shape (n_items, len(bucket_sizes))
+        :param rank: (parallel) the rank of the caller, which picks the shard it starts from
+        """
+        keys = np.asarray(keys)
+        if len(keys) == 0:
+            return
+        flat_indices = flat_table_indices(keys, self.tables.shape[1])
+        if self.parallel:
+            self.tables_shard_locks.add(self.tables, flat_indices, rank, max_count=self.max_count)
+        elif self.conservative_update:
+            # each distinct key raises its counters to (its current estimate + its multiplicity in the batch)
+            uniq_keys, multiplicities = np.unique(keys, axis=0, return_counts=True)
+            targets = np.minimum(self.query(uniq_keys) + multiplicities, self.max_count)
+            for idx in range(len(self.bucket_sizes)):
+                scatter_max(self.tables[idx], uniq_keys[:, idx], targets)
+        else:
+            for idx in range(len(self.bucket_sizes)):
+                cells, multiplicities = np.unique(keys[:, idx], return_counts=True)
+                counts = self.tables[idx, cells].astype(np.int64) + multiplicities
+                self.tables[idx, cells] = np.minimum(counts, self.max_count)
+        if self.tables_store is not None:
+            self.tables_store.mark(flat_indices)
+
+        hashes = hash_keys(keys)
+        n_bits = 64 - self.hll_precision
+        register_indices = (hashes >> np.uint64(n_bits)).astype(np.int64)
+        remainders = (hashes << np.uint64(self.hll_precision)) >> np.uint64(self.hll_precision)
+        # rho = position of the leftmost 1-bit among the remaining n_bits bits
+        rhos = np.full(len(hashes), n_bits + 1, dtype=np.int64)
+        nonzero = remainders > 0
+        rhos[nonzero] = n_bits - np.floor(np.log2(remainders[nonzero].astype(np.float64))).astype(np.int64)
+        # float64 rounding may push the largest remainders up to 2^n_bits
+        rhos = np.maximum(rhos, 1)
+        if self.parallel:
+            self.registers_shard_locks.maximum(self.registers, register_indices, rhos, rank)
+        else:
+            scatter_max(self.registers, register_indices, rhos)
+
+    def query(self, keys):
+        """
+        For each key, return the min of its counters over all rows, as int64.
+        """
+        keys = np.asarray(keys)
+        counts = self.tables[0, keys[:, 0]].astype(np.int64)
+        for idx in range(1, len(self.bucket_sizes)):
+            counts = np.minimum(counts, self.tables[idx, keys[:, idx]])
+        return counts
+
+    def reset(self):
+        if self.parallel:
+            self.tables_shard_locks.reset(self.tables)
+            self.registers_shard_locks.reset(self.registers)
+        else:
+            self.tables[:] = 0
+            self.registers[:] = 0
+        if self.tables_store is not None:
+            self.tables_store.mark_all()
+
+    def total_state_count(self):
+        """
+        HyperLogLog estimate of the number of distinct keys inserted so far, with linear counting for small cardinalities.
+        """
+        m = float(self.n_registers)
+        alpha = 0.7213 / (1. + 1.079 / m)
+        estimate = alpha * m * m / np.sum(2. ** (-self.registers.astype(np.float64)))
+        n_zero_registers = np.count_nonzero(self.registers == 0)
+        if estimate <= 2.5 * m and n_zero_registers > 0:
+            estimate = m * np.log(m / n_zero_registers)
+        return int(np.round(estimate))
+
+
+def hash_keys(keys):
+    """
+    Mix the bucket indices of each key into one 64-bit hash (splitmix64 finalizer after each column).
+    """
+    keys = np.asarray(keys).astype(np.uint64)
+    hashes = np.zeros(keys.shape[0], dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        for idx in range(keys.shape[1]):
+            h = hashes ^ (keys[:, idx] + np.uint64(0x9E3779B97F4A7C15))
+            h = (h ^ (h >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+            h = (h ^ (h >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+            hashes = h ^ (h >> np.uint64(31))
+    return hashes
+
+
+def scatter_max(target, indices, values):
+    """
+    target[indices] = max(target[indices], values), where indices may repeat; equivalent to np.maximum.at.
+    """
+    order = np.lexsort((values, indices))
+    indices = indices[order]
+    values = values[order]
+    # keep the largest value of each index, which comes last after sorting
+    last = np.ones(len(indices), dtype=bool)
+    last[:-1] = indices[1:] != indices[:-1]
+    indices = indices[last]
+    values = values[last]
+    target[indices] = np.maximum(target[indices], values).astype(target.dtype)
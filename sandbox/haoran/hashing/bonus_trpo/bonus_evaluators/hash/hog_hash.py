@@ -43,10 +43,7 @@ class HOGHash(BinaryHash):
 
     def compute_binary_keys(self, items):
         hogs = self.compute_hogs(items)
-        binaries = []
-        for hog in hogs:
-            binaries.append(np.sign(hog.ravel() - self.threshold))
-        binaries = np.asarray(binaries)
+        binaries = np.sign(hogs.reshape((hogs.shape[0],-1)) - self.threshold)
         return binaries
 
     def compute_hogs(self,items):
@@ -59,16 +56,11 @@ class HOGHash(BinaryHash):
 
         batch_size, n_channel, width, height = items.shape
         if self.extract_channel_wise:
-            n_bins, hog_width, hog_height = self.feature_shape
-            hogs = np.zeros(
-                (batch_size, n_channel, n_bins, hog_width, hog_height),
-                dtype=float
+            # treat each channel as a separate single-channel image, all in one batch
+            hogs = self.hog.compute_hogs(
+                items.reshape((batch_size * n_channel, 1, width, height))
             )
-            for c in range(n_channel):
-                hogs_c = self.hog.compute_hogs(
-                    np.expand_dims(items[:,c,:,:],axis=1)
-                )
-                hogs[:,c,:,:,:] = hogs_c
+            hogs = hogs.reshape((batch_size, n_channel) + hogs.shape[1:])
         else:
             hogs = self.hog.compute_hogs(items)
         return hogs
@@ -14,6 +14,7 @@ class HOGHashV2(BinaryHash):
             extract_channel_wise=False,
             bucket_sizes=None,
             parallel=False,
+            sketch=None,
         ):
 
         self.hog = hog
@@ -37,6 +38,7 @@ class HOGHashV2(BinaryHash):
             dim_key=second_hash.dim_key,
             bucket_sizes=bucket_sizes,
             parallel=parallel,
+            sketch=sketch,
         )
 
     def __getstate__(self):
@@ -58,16 +60,11 @@ class HOGHashV2(BinaryHash):
 
         batch_size, n_channel, width, height = items.shape
         if self.extract_channel_wise:
-            n_bins, hog_width, hog_height = self.feature_shape
-            hogs = np.zeros(
-                (batch_size, n_channel, n_bins, hog_width, hog_height),
-                dtype=float
+            # treat each channel as a separate single-channel image, all in one batch
+            hogs = self.hog.compute_hogs(
+                items.reshape((batch_size * n_channel, 1, width, height))
             )
-            for c in range(n_channel):
-                hogs_c = self.hog.compute_hogs(
-                    np.expand_dims(items[:,c,:,:],axis=1)
-                )
-                hogs[:,c,:,:,:] = hogs_c
+            hogs = hogs.reshape((batch_size, n_channel) + hogs.shape[1:])
         else:
             hogs = self.hog.compute_hogs(items)
         return hogs
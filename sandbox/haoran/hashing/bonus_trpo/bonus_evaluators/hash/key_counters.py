@@ -0,0 +1,101 @@
+import numpy as np
+
+class SortedKeyCounter(object):
+    """
+    Counts of arbitrary integer keys, stored as a sorted array of the distinct keys and a parallel array of counts.
+    Queries are binary searches; increments merge the (aggregated) batch into the sorted arrays, so a batch costs O(n_distinct + batch_size log batch_size).
+    """
+    def __init__(self):
+        self.keys = np.zeros(0, dtype=np.int64)
+        self.counts = np.zeros(0, dtype=np.int64)
+
+    def _find(self, keys):
+        positions = np.searchsorted(self.keys, keys)
+        found = positions < len(self.keys)
+        found[found] = self.keys[positions[found]] == keys[found]
+        return positions, found
+
+    def inc(self, keys):
+        uniq_keys, multiplicities = np.unique(np.asarray(keys, dtype=np.int64), return_counts=True)
+        positions, found = self._find(uniq_keys)
+        self.counts[positions[found]] += multiplicities[found]
+        new = ~found
+        if np.any(new):
+            self.keys = np.insert(self.keys, positions[new], uniq_keys[new])
+            self.counts = np.insert(self.counts, positions[new], multiplicities[new])
+
+    def query(self, keys):
+        keys = np.asarray(keys, dtype=np.int64)
+        positions, found = self._find(keys)
+        counts = np.zeros(len(keys), dtype=np.int64)
+        counts[found] = self.counts[positions[found]]
+        return counts
+
+    def reset(self):
+        self.keys = np.zeros(0, dtype=np.int64)
+        self.counts = np.zeros(0, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def nbytes(self):
+        return self.keys.nbytes + self.counts.nbytes
+
+
+class DenseKeyCounter(object):
+    """
+    Counts of integer keys in [0, n_keys), stored as a dense uint32 array.
+    Increments aggregate duplicate keys first, so each cell is written once per batch.
+    Keys outside of the range (e.g. RAM values outside of the ranges listed in ale_ram_info) are counted exactly by a SortedKeyCounter on the side.
+    """
+    def __init__(self, n_keys):
+        self.n_keys = int(n_keys)
+        self.counts = np.zeros(self.n_keys, dtype=np.uint32)
+        self.outliers = SortedKeyCounter()
+
+    def _split(self, keys):
+        keys = np.asarray(keys, dtype=np.int64)
+        valid = (keys >= 0) & (keys < self.n_keys)
+        return keys, valid
+
+    def inc(self, keys):
+        keys, valid = self._split(keys)
+        if not np.all(valid):
+            self.outliers.inc(keys[~valid])
+            keys = keys[valid]
+        if len(keys) > self.n_keys // 8:
+            # a large batch relative to the key space: one pass over the table
+            self.counts += np.bincount(keys, minlength=self.n_keys).astype(np.uint32)
+        else:
+            cells, multiplicities = np.unique(keys, return_counts=True)
+            self.counts[cells] += multiplicities.astype(np.uint32)
+
+    def query(self, keys):
+        keys, valid = self._split(keys)
+        if np.all(valid):
+            return self.counts[keys].astype(np.int64)
+        counts = np.zeros(len(keys), dtype=np.int64)
+        counts[valid] = self.counts[keys[valid]]
+        counts[~valid] = self.outliers.query(keys[~valid])
+        return counts
+
+    def reset(self):
+        self.counts[:] = 0
+        self.outliers.reset()
+
+    def __len__(self):
+        """ number of distinct keys counted """
+        return int(np.count_nonzero(self.counts)) + len(self.outliers)
+
+    def nbytes(self):
+        return self.counts.nbytes + self.outliers.nbytes()
+
+
+def make_serial_key_counter(n_keys, dense_table_budget):
+    """
+    A DenseKeyCounter if its table fits in dense_table_budget bytes, otherwise a SortedKeyCounter
+    """
+    if n_keys * np.dtype(np.uint32).itemsize <= dense_table_budget:
+        return DenseKeyCounter(n_keys)
+    else:
+        return SortedKeyCounter()
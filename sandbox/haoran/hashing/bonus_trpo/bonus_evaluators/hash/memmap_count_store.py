@@ -0,0 +1,199 @@
+from rllab.misc import logger
+import numpy as np
+import multiprocessing as mp
+import json
+import os
+import shutil
+import tempfile
+import weakref
+
+def _remove_copy(file_name, pid):
+    # (not in forked workers, which share the file with their parent)
+    if os.getpid() == pid:
+        for f in [file_name, file_name + ".meta"]:
+            if os.path.exists(f):
+                os.remove(f)
+
+class MemmapCountStore(object):
+    """
+    A count array kept in an np.memmap file, by default under the snapshot dir of the logger.
+    The mapping is shared, so workers forked after construction update the same counts (use it in place of mp.RawArray).
+
+    Snapshots are incremental: pages are marked dirty by mark(), and snapshot() only writes the dirty pages to "<file>.<version>.delta.npz", flushes the file and records the version in "<file>.meta". The training loops call snapshot_all() right before logger.save_itr_params.
+    The pickled state only holds the file name and the version of the last snapshot. A store whose counts changed since its last snapshot (or that has none) is snapshotted first, so that no pickle loses counts; after snapshot_all(), pickling has no side effects.
+    Unpickling (or deepcopy) never maps the original file, which may still be in use: if the file is still at that version, it is copied into a new file (a sequential copy, no replay); otherwise (an older snapshot, or counts that changed after the snapshot) the deltas up to that version are replayed into a new file. The delta chain of the new file starts with a full copy at its first snapshot(). A copy that is never snapshotted (e.g. a deepcopy) is deleted with the object, or at exit; once snapshotted, pickles may refer to it, and it is kept.
+    """
+    # every store of the process, for snapshot_all()
+    _instances = weakref.WeakSet()
+
+    def __init__(self, shape, dtype=np.int32, file_name=None, page_size=64, parallel=False, name="counts"):
+        """
+        :param file_name: None means a new file "<name>*.dat" in logger.get_snapshot_dir() (or the temp dir if there is none)
+        :param page_size: granularity of dirty tracking, in bytes
+        """
+        self.shape = tuple(np.atleast_1d(shape).astype(int))
+        self.dtype = np.dtype(dtype)
+        self.page_len = max(page_size // self.dtype.itemsize, 1)
+        self.n_pages = int(np.ceil(np.prod(self.shape) / float(self.page_len)))
+        self.parallel = parallel
+        if file_name is None:
+            file_name = self._new_file_name(name)
+        self.file_name = os.path.abspath(file_name)
+        self.version = -1
+        self._copy_finalizer = None
+        self._open(create=True)
+        MemmapCountStore._instances.add(self)
+
+    @classmethod
+    def snapshot_all(cls):
+        """
+        snapshot() every store of the process (rank 0 of the parallel algos, before logger.save_itr_params).
+        """
+        for store in list(cls._instances):
+            store.snapshot()
+
+    def _new_file_name(self, name):
+        dir_name = logger.get_snapshot_dir() or tempfile.gettempdir()
+        if not os.path.isdir(dir_name):
+            os.makedirs(dir_name)
+        fd, file_name = tempfile.mkstemp(prefix=name + "_", suffix=".dat", dir=dir_name)
+        os.close(fd)
+        return file_name
+
+    def _open(self, create):
+        if create:
+            with open(self.file_name, "wb") as f:
+                f.truncate(int(np.prod(self.shape)) * self.dtype.itemsize)
+        self.array = np.memmap(self.file_name, dtype=self.dtype, mode="r+", shape=self.shape)
+        if self.parallel:
+            self.dirty_pages = np.frombuffer(mp.RawArray('B', self.n_pages), np.uint8).view(bool)
+            self.shared_clean = mp.RawValue('b', False)
+            # the ranks mark pages concurrently; only one of them rewrites the meta file
+            self.clean_lock = mp.Lock()
+        else:
+            self.dirty_pages = np.zeros(self.n_pages, dtype=bool)
+            self.shared_clean = None
+        self.clean = False
+
+    def _delta_file_name(self, version):
+        return "%s.%d.delta.npz" % (self.file_name, version)
+
+    def _meta_file_name(self):
+        return self.file_name + ".meta"
+
+    def _write_meta(self, clean):
+        with open(self._meta_file_name(), "w") as f:
+            json.dump(dict(version=self.version, clean=clean), f)
+
+    def _read_meta(self):
+        try:
+            with open(self._meta_file_name(), "r") as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return None
+
+    def _is_clean(self):
+        return self.shared_clean.value if self.parallel else self.clean
+
+    def _set_clean(self, clean):
+        if self.parallel:
+            self.shared_clean.value = clean
+        else:
+            self.clean = clean
+
+    def mark(self, indices):
+        """
+        Mark the pages containing the flat indices as modified since the last snapshot.
+        """
+        pages = np.unique(np.asarray(indices).ravel() // self.page_len)
+        self.dirty_pages[pages] = True
+        self._set_dirty()
+
+    def mark_all(self):
+        self.dirty_pages[:] = True
+        self._set_dirty()
+
+    def _set_dirty(self):
+        if not self._is_clean():
+            return
+        if self.parallel:
+            with self.clean_lock:
+                if self._is_clean():
+                    self._set_clean(False)
+                    self._write_meta(clean=False)
+        else:
+            self._set_clean(False)
+            self._write_meta(clean=False)
+
+    def snapshot(self):
+        """
+        Write the dirty pages as a new delta and flush the file. Returns the new version.
+        """
+        pages = np.where(self.dirty_pages)[0]
+        indices = pages[:, None] * self.page_len + np.arange(self.page_len)
+        # the last page may be partial
+        data = self.array.reshape(-1)[np.minimum(indices, self.array.size - 1)]
+        self.version += 1
+        with open(self._delta_file_name(self.version), "wb") as f:
+            np.savez_compressed(f, pages=pages, data=data)
+        self.array.flush()
+        self.dirty_pages[:] = False
+        self._write_meta(clean=True)
+        self._set_clean(True)
+        if self._copy_finalizer is not None:
+            # pickles may now refer to the file
+            self._copy_finalizer.detach()
+            self._copy_finalizer = None
+        return self.version
+
+    def nbytes(self):
+        return self.array.nbytes
+
+    def __getstate__(self):
+        """ Only the file name and the version of the last snapshot are pickled; the counts are snapshotted first if they changed since. """
+        if self.version == -1 or not self._is_clean():
+            self.snapshot()
+        return dict(
+            shape=self.shape,
+            dtype=self.dtype.str,
+            page_len=self.page_len,
+            n_pages=self.n_pages,
+            parallel=self.parallel,
+            file_name=self.file_name,
+            version=self.version,
+        )
+
+    def __setstate__(self, state):
+        self.shape = state["shape"]
+        self.dtype = np.dtype(state["dtype"])
+        self.page_len = state["page_len"]
+        self.n_pages = state["n_pages"]
+        self.parallel = state["parallel"]
+        self.file_name = state["file_name"]
+        self.version = state["version"]
+        meta = self._read_meta()
+        source_file_name = self.file_name
+        self.file_name = os.path.abspath(self._new_file_name("counts"))
+        self._copy_finalizer = weakref.finalize(self, _remove_copy, self.file_name, os.getpid())
+        if meta is not None and meta["version"] == self.version and meta["clean"] \
+                and os.path.exists(source_file_name):
+            shutil.copyfile(source_file_name, self.file_name)
+            self._open(create=False)
+        else:
+            self._replay(source_file_name)
+        # start the delta chain of the new file with a full copy
+        self.version = -1
+        self.mark_all()
+        MemmapCountStore._instances.add(self)
+
+    def _replay(self, source_file_name):
+        """
+        Rebuild the counts of self.version in self.file_name (a new file) from the deltas of source_file_name, so that the original file (which may be ahead) is left untouched.
+        """
+        self._open(create=True)
+        flat = self.array.reshape(-1)
+        for version in range(self.version + 1):
+            delta = np.load("%s.%d.delta.npz" % (source_file_name, version))
+            indices = delta["pages"][:, None] * self.page_len + np.arange(self.page_len)
+            valid = indices < flat.size
+            flat[indices[valid]] = delta["data"][valid]
@@ -1,4 +1,6 @@
 from sandbox.haoran.hashing.bonus_trpo.bonus_evaluators.hash.base import Hash
+from sandbox.haoran.hashing.bonus_trpo.bonus_evaluators.hash.sharded_counter import ShardLocks, flat_table_indices
+from sandbox.haoran.hashing.bonus_trpo.bonus_evaluators.hash.shared_hash_map import SharedHashMap
 from rllab.misc import logger
 import numpy as np
 import multiprocessing as mp
@@ -6,14 +8,23 @@ import copy
 import sys
 
 class NaryHash(Hash):
-    def __init__(self,n,dim_key, bucket_sizes=None,parallel=False,key_form="bytes"):
+    sketch = None
+    rank = None
+
+    def __init__(self,n,dim_key, bucket_sizes=None,parallel=False,key_form="bytes",sketch=None):
         """
         Simple extension of BinaryHash to n-ary keys
 
-        dictionary counter: convert an n-ary key into a uint64 tuple; every x consecutive n-ary digits are converted to a single uint64 number, where x = floor(log_n(2**64))
+        dictionary counter: convert an n-ary key into a row of uint64 words; every x consecutive n-ary digits are converted to a single uint64 number, where x = floor(log_n(2**64)). The rows are counted exactly by a SharedHashMap, which lives in shared memory in parallel mode.
 
-        :param bucket_sizes: None means implementing the hash table with python dictionary
+        :param bucket_sizes: None means implementing the hash table with an exact hash map
+        :param key_form: only affects the tables counter ("bytes" casts the n-ary digits to uint8)
+        :param sketch: a CountMinSketch that replaces the tables; bucket_sizes are taken from it
         """
+        if sketch is not None:
+            assert bucket_sizes is None or list(bucket_sizes) == list(sketch.bucket_sizes)
+            assert parallel == sketch.parallel
+            bucket_sizes = sketch.bucket_sizes
         # each column is a vector of uniformly random orientation
         self.n = n
         self.dim_key = dim_key
@@ -35,35 +46,36 @@ class NaryHash(Hash):
             self.mods_list = np.asarray(mods_list).T
 
             # the tables count the number of observed keys for each bucket
-            if parallel:
-                self.tables_lock = mp.Value('i')
+            if sketch is not None:
+                self.sketch = sketch
+                self.unpicklable_list = []
+                self.snapshot_list = []
+            elif parallel:
                 self.tables = np.frombuffer(
                     mp.RawArray('i', int(len(bucket_sizes) * np.max(bucket_sizes))),
                     np.int32,
                 )
                 self.tables = self.tables.reshape((len(bucket_sizes), np.max(bucket_sizes)))
-                self.unpicklable_list = ["tables_lock","tables"]
+                # each rank updates the shards of the tables in a different order, instead of waiting for one global lock
+                self.tables_shard_locks = ShardLocks(self.tables.size)
+                self.rank = None
+                self.unpicklable_list = ["tables_shard_locks","tables"]
                 self.snapshot_list = ["tables"]
             else:
                 self.tables = np.zeros((len(bucket_sizes), np.max(bucket_sizes)),dtype=int)
                 self.unpicklable_list = []
                 self.snapshot_list = []
         else:
-            if key_form == "uint64":
-                self.digit_group_len = int(np.floor(64 * np.log(2) / np.log(self.n)))
-            elif key_form == "bytes":
-                self.digit_group_len = int(np.floor(8 * np.log(2) / np.log(self.n)))
-            else:
-                raise NotImplementedError
+            self.digit_group_len = int(np.floor(64 * np.log(2) / np.log(self.n)))
             self.key_len = int(np.ceil(self.dim_key / self.digit_group_len))
-            self.powers = [self.n ** j for j in range(self.digit_group_len)]
-            if parallel:
-                self.shared_dict = dict() # a placeholder for force_compiling; to be replaced by a true shared_dict pass down from the manager
-                self.unpicklable_list = ["shared_dict"]
-                self.snapshot_list = []
-                #FIXME: snapshot only the hash counts rather than the entire shared dict
-            else:
-                self.counter_dict = dict()
+            self.powers = np.asarray(
+                [self.n ** j for j in range(self.digit_group_len)],
+                dtype=np.uint64,
+            )
+            # pickling the map only dumps the occupied slots
+            self.counter_map = SharedHashMap(self.key_len, parallel=parallel)
+            self.unpicklable_list = []
+            self.snapshot_list = []
 
 
     def __getstate__(self):
@@ -74,11 +86,6 @@ class NaryHash(Hash):
                 state[k] = v
             elif k in self.snapshot_list:
                 state[k] = copy.deepcopy(v)
-        if self.parallel and self.counter == "dict":
-            state["counter_dict"] = {
-                key: value for key,value in self.shared_dict.items()
-                if self.validate_key(key)
-            }
         return state
 
     def init_rank(self,rank):
@@ -86,8 +93,8 @@ class NaryHash(Hash):
         self.rank = rank
 
     def init_shared_dict(self, shared_dict):
+        """ The dict counter lives in self.counter_map; the manager dict is not needed. """
         assert self.parallel
-        self.shared_dict = shared_dict
 
     def compute_nary_keys(self, items):
         """ to be implemented by subclasses """
@@ -103,28 +110,19 @@ class NaryHash(Hash):
             dtype = np.uint64
         else:
             raise NotImplementedError
-        naries = self.compute_nary_keys(items).astype(dtype)
         if self.counter == "tables":
+            naries = self.compute_nary_keys(items).astype(dtype)
             # compute the signs of the dot products with the random vectors
             keys = np.cast['int'](naries.dot(self.mods_list)) % self.bucket_sizes
         else:
+            naries = self.compute_nary_keys(items).astype(np.uint64)
             N,k = naries.shape # dimension
             assert k == self.dim_key
 
-            keys = np.zeros((N, self.key_len),dtype=dtype)
+            keys = np.zeros((N, self.key_len),dtype=np.uint64)
             for i in range(0,k,self.digit_group_len):
-                uints = np.zeros(N,dtype=dtype)
-                for j in range(min(self.digit_group_len, k-i)):
-                    uints = uints + naries[:,i+j] * self.powers[j]
-                assert(uints.dtype == dtype)
-                keys[:,i//self.digit_group_len] = uints
-
-            if self.key_form == "bytes":
-                keys = [bytes(tuple(key)) for key in keys]
-            elif self.key_form == "uint64":
-                keys = [tuple(key) for key in keys]
-            else:
-                raise NotImplementedError
+                n_digits = min(self.digit_group_len, k-i)
+                keys[:,i//self.digit_group_len] = naries[:,i:i+n_digits].dot(self.powers[:n_digits])
 
         return keys
 
@@ -134,92 +132,61 @@ class NaryHash(Hash):
         """
         # w/ hash tables: store all keys in the shared dict; then update using one process; this way we are able to log exactly how many states are new
         if self.counter == "tables":
-            if self.parallel:
-                # print("%d: before table lock"%(self.rank))
-                with self.tables_lock.get_lock():
-                    # print("%d: inside table lock"%(self.rank))
-                    for idx in range(len(self.bucket_sizes)):
-                        np.add.at(self.tables[idx], keys[:, idx], 1)
-                # print("%d: exit table lock"%(self.rank))
+            if self.sketch is not None:
+                self.sketch.inc(keys, self.rank)
+            elif self.parallel:
+                self.tables_shard_locks.add(
+                    self.tables,
+                    flat_table_indices(keys, self.tables.shape[1]),
+                    self.rank,
+                )
             else:
                 for idx in range(len(self.bucket_sizes)):
                     np.add.at(self.tables[idx], keys[:, idx], 1)
         else:
-            if self.parallel:
-                counter_dict = self.shared_dict
-            else:
-                counter_dict = self.counter_dict
-            # multiprocessing makes sure the following operations are synchronized
-            # updates interleave between processes
-            for key in keys:
-                if key in counter_dict:
-                    counter_dict[key] += 1
-                else:
-                    counter_dict[key] = 1
-                # print("%d: update count"%(self.rank))
+            self.counter_map.inc(keys)
 
 
     def query_keys(self, keys):
         """
         For each item, return the min of all counts from all buckets.
         """
-        if self.counter == "tables":
+        if self.counter == "tables" and self.sketch is not None:
+            counts = self.sketch.query(keys)
+        elif self.counter == "tables":
             all_counts = []
             for idx in range(len(self.bucket_sizes)):
                 all_counts.append(self.tables[idx, keys[:, idx]])
             counts = np.asarray(all_counts).min(axis=0)
         else:
-            counts = []
-            counter_dict = self.shared_dict if self.parallel else self.counter_dict
-            for key in keys:
-                if key in counter_dict:
-                    counts.append(counter_dict[key])
-                else:
-                    counts.append(0)
+            counts = self.counter_map.query(keys)
         return counts
 
     def reset(self):
         if self.counter == "tables":
-            if self.parallel:
-                with self.tables_lock.get_lock():
-                    self.tables = np.zeros(
-                        (len(self.bucket_sizes), np.max(self.bucket_sizes))
-                    )
+            if self.sketch is not None:
+                self.sketch.reset()
+            elif self.parallel:
+                # zero in place to keep the tables shared
+                self.tables_shard_locks.reset(self.tables)
             else:
                 self.tables = np.zeros(
                     (len(self.bucket_sizes), np.max(self.bucket_sizes))
                 )
         else:
-            # should delete all keys from shared_dict starting with prefix "nary_hash_counter"
-            if self.parallel:
-                for key in self.shared_dict:
-                    if self.validate_key(key):
-                        self.shared_dict.pop(key)
-            else:
-                self.counter_dict = dict()
-
-    def validate_key(self,key):
-        """
-        If the shared_dict has inserted by other objects, this function checks keys inserted by this object only. I am commenting it out as it is not necessary at the moment
-        """
-        # return isinstance(key, tuple) and len(key) = self.key_len and key[0].dtype==np.uint64
-        return True
+            self.counter_map.reset()
 
     def total_state_count(self):
         """
         This is not a precise count of the total number of states visited.
         Count the number of non-zero entries in each bucket; then return the maximum of them.
         """
-        if self.counter == "tables":
+        if self.counter == "tables" and self.sketch is not None:
+            return self.sketch.total_state_count()
+        elif self.counter == "tables":
             return np.max([np.count_nonzero(T) for T in self.tables])
         else:
+            count = len(self.counter_map)
             if self.parallel:
-                # all_keys = [
-                #     key for key in self.shared_dict
-                #     if self.validate_key(key)
-                # ]
-                all_keys = self.shared_dict.keys()
-                logger.log("Nary hash total state count: %d, estimated memory requirement: %.3f MB"%(len(all_keys), self.key_len * (64/8) * len(all_keys) / 1024**2))
-                return len(all_keys)
-            else:
-                return len(self.counter_dict)
+                logger.log("Nary hash total state count: %d, hash map memory: %.3f MB"%(count, self.counter_map.nbytes() / 1024**2))
+            return count
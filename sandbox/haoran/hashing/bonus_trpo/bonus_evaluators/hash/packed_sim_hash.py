@@ -0,0 +1,113 @@
+from sandbox.haoran.hashing.bonus_trpo.bonus_evaluators.hash.nary_hash import NaryHash
+import numpy as np
+
+class PackedSimHash(NaryHash):
+    """
+    SimHash whose binary codes are packed into uint64 words.
+    The projection is done in float32 and the sign bits are packed directly (bit i of word j is the sign of the (64j+i)-th projection), so neither the float64 sign matrix nor its float dot product with mods_list is ever materialized.
+    Bucket indices are derived from the words with integer arithmetic: key = \sum_j (w_j mod b) (2^{64j} mod b) (mod b), which equals \sum_i b_i 2^i (mod b) for the 0/1 code b_i.
+    With bucket_sizes=None, the words are used directly as the exact hash map key (same format as NaryHash).
+    """
+    projection = None
+
+    def __init__(self,
+            item_dim,
+            dim_key=128,
+            bucket_sizes=None,
+            parallel=False,
+            projection=None,
+            sketch=None,
+        ):
+        super().__init__(
+            n=2,
+            dim_key=dim_key,
+            bucket_sizes=bucket_sizes,
+            parallel=parallel,
+            sketch=sketch,
+        )
+
+        if projection is not None:
+            assert projection.item_dim == item_dim and projection.dim_key == dim_key
+            self.projection = projection
+        else:
+            # each column is a vector of uniformly random orientation
+            self.projection_matrix = np.random.normal(size=(item_dim, dim_key)).astype(np.float32)
+            self.snapshot_list.append("projection_matrix")
+        self.item_dim = item_dim
+
+        self.n_words = int(np.ceil(dim_key / 64.))
+        self.n_pad_bits = self.n_words * 64 - dim_key
+        if self.counter == "tables":
+            # word_mods[j,b] = 2^(64j) mod bucket_sizes[b]
+            self.bucket_sizes_uint = self.bucket_sizes.astype(np.uint64)
+            self.word_mods = np.asarray([
+                [pow(2, 64 * j, int(bucket_size)) for bucket_size in self.bucket_sizes]
+                for j in range(self.n_words)
+            ], dtype=np.uint64)
+
+    def project(self, items):
+        if self.projection is not None:
+            return self.projection.project(items)
+        else:
+            return np.asarray(items, dtype=np.float32).dot(self.projection_matrix)
+
+    def compute_binary_signs(self, items):
+        """
+        Boolean matrix of shape (n_items, dim_key); True means a positive projection
+        """
+        return self.project(items) > 0
+
+    def compute_nary_keys(self, items):
+        return self.compute_binary_signs(items).astype(np.uint8)
+
+    def compute_packed_codes(self, items):
+        """
+        Pack the binary codes into a uint64 matrix of shape (n_items, n_words). Hamming distances between codes can be computed by xor-ing the words and counting bits.
+        """
+        bits = self.compute_binary_signs(items)
+        N = bits.shape[0]
+        if self.n_pad_bits > 0:
+            bits = np.concatenate(
+                [bits, np.zeros((N, self.n_pad_bits), dtype=bool)],
+                axis=1,
+            )
+        # packbits puts the first bit in the most significant position, so reverse the bits in each word and read the bytes as big-endian
+        bits = bits.reshape((N, self.n_words, 64))[:, :, ::-1]
+        codes = np.packbits(bits, axis=2).view('>u8').reshape((N, self.n_words))
+        return codes.astype(np.uint64)
+
+    def compute_keys_from_codes(self, codes):
+        """
+        Convert packed codes into bucket indices (tables); the hash map counts the codes themselves
+        """
+        if self.counter == "tables":
+            N = codes.shape[0]
+            keys = np.zeros((N, len(self.bucket_sizes)), dtype=np.uint64)
+            for j in range(self.n_words):
+                # each term is below bucket_size^2, so uint64 never overflows
+                keys += (codes[:, j:j+1] % self.bucket_sizes_uint) * self.word_mods[j]
+                keys %= self.bucket_sizes_uint
+            keys = keys.astype(int)
+        else:
+            keys = codes
+        return keys
+
+    def compute_keys(self, items):
+        """
+        Compute the keys for many items (row-wise stacked as a matrix)
+        """
+        codes = self.compute_packed_codes(items)
+        return self.compute_keys_from_codes(codes)
+
+    def get_copy(self):
+        h = PackedSimHash(
+            item_dim=self.item_dim,
+            dim_key=self.dim_key,
+            bucket_sizes=self.bucket_sizes if self.counter == "tables" else None,
+            parallel=self.parallel,
+            projection=self.projection,
+            sketch=self.sketch.get_copy() if self.sketch is not None else None,
+        )
+        if self.projection is None:
+            h.projection_matrix = np.copy(self.projection_matrix)
+        return h
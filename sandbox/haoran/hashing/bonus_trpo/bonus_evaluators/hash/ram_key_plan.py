@@ -0,0 +1,87 @@
+import numpy as np
+
+class RAMKeyPlan(object):
+    """
+    Precomputed conversion between RAM states and the integer keys of the ALEHackyHash classes.
+    The key is a mixed-radix number whose i-th digit is the (shortened) value of the i-th RAM entry, with stride prod(n_values[i+1:]).
+
+    Each RAM entry gets a 256-entry lookup table from the byte value to digit * stride, covering the range shift, grid_size bucketing and categorical mapping; computing the keys of a batch is then one gather and a sum.
+    Entries with "random": True draw their digit uniformly at random, as before.
+    """
+    def __init__(self, ram_entries, n_values):
+        """
+        :param ram_entries: list of dicts with the fields of ale_ram_info ("index", "values", "value_type", optionally "grid_size" and "random"), in key order
+        :param n_values: number of distinct digits of each entry
+        """
+        self.n_entries = len(ram_entries)
+        self.ram_indices = np.asarray([info["index"] for info in ram_entries], dtype=np.intp)
+        self.n_values = np.asarray(n_values, dtype=np.int64)
+        self.strides = np.asarray(
+            [np.prod(self.n_values[i+1:]) for i in range(self.n_entries)],
+            dtype=np.int64,
+        )
+
+        byte_values = np.arange(256)
+        self.luts = np.zeros((self.n_entries, 256), dtype=np.int64)
+        # inverse: value = digit * value_scales + value_offsets for range entries; categorical entries look up value_tables
+        self.value_scales = np.zeros(self.n_entries, dtype=np.int64)
+        self.value_offsets = np.zeros(self.n_entries, dtype=np.int64)
+        self.categorical = np.zeros(self.n_entries, dtype=bool)
+        self.value_tables = np.zeros((self.n_entries, max(int(np.max(self.n_values)), 1)), dtype=np.int64)
+        self.random_entries = []
+        for i, info in enumerate(ram_entries):
+            values = info["values"]
+            if info["value_type"] == "range":
+                value_min = np.amin(values)
+                digits = byte_values - value_min
+                if "grid_size" in info.keys():
+                    digits = np.floor(digits / info["grid_size"]).astype(int)
+                    self.value_scales[i] = info["grid_size"]
+                else:
+                    self.value_scales[i] = 1
+                self.value_offsets[i] = value_min
+                if "random" in info.keys() and info["random"]:
+                    self.random_entries.append(i)
+                    digits = np.zeros_like(byte_values)
+            elif info["value_type"] == "categorical":
+                # values outside of the list map to digit 0
+                digits = np.zeros_like(byte_values)
+                for j in range(len(values)):
+                    digits += j * (byte_values == values[j])
+                self.categorical[i] = True
+                self.value_tables[i, :len(values)] = values
+            else:
+                raise NotImplementedError
+            self.luts[i] = digits * self.strides[i]
+        self.entry_range = np.arange(self.n_entries)
+
+    def compute_keys(self, items):
+        """
+        :param items: RAM states of shape (n_items, 128), or any shape with 128 values per item, such as (n_items, 128, 1)
+        """
+        items = np.asarray(items)
+        ram = items.reshape((items.shape[0], -1))[:, self.ram_indices].astype(np.intp)
+        keys = self.luts[self.entry_range, ram].sum(axis=1)
+        for i in self.random_entries:
+            keys += np.random.randint(low=0, high=self.n_values[i], size=len(keys)) * self.strides[i]
+        return keys
+
+    def keys_to_values(self, keys, original_range=True):
+        """
+        Inverse of compute_keys: an (n_keys, n_entries) matrix of RAM values (or digits if original_range=False)
+        """
+        keys = np.asarray(keys)
+        values = np.empty((len(keys), self.n_entries), dtype=np.int64)
+        for i in range(self.n_entries):
+            digits = keys // self.strides[i]
+            if i > 0:
+                digits %= self.n_values[i]
+            if not original_range:
+                values[:, i] = digits
+            elif self.categorical[i]:
+                # digits out of range (only possible for invalid keys) map to 0
+                in_range = digits < self.n_values[i]
+                values[:, i] = np.where(in_range, self.value_tables[i][np.where(in_range, digits, 0)], 0)
+            else:
+                values[:, i] = digits * self.value_scales[i] + self.value_offsets[i]
+        return values
@@ -0,0 +1,130 @@
+import numpy as np
+import scipy.sparse
+
+class RandomProjection(object):
+    """
+    A random linear map from item_dim to dim_key, regenerated from a seed.
+    Only the constructor arguments and the seed are pickled; the matrices (or sign vectors) are rebuilt when unpickled.
+    If seed is None, it is drawn from the global numpy random state, so experiment seeds still determine the projection.
+    All projections are computed in float32, since the hashes only use the signs.
+    """
+    def __init__(self, item_dim, dim_key, seed=None):
+        self.item_dim = item_dim
+        self.dim_key = dim_key
+        if seed is None:
+            seed = np.random.randint(2**31 - 1)
+        self.seed = seed
+        self.unpicklable_list = []
+        self.build()
+
+    def __getstate__(self):
+        """ Do not pickle anything that can be regenerated from the seed. """
+        return {k: v for k, v in iter(self.__dict__.items()) if k not in self.unpicklable_list}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.build()
+
+    def build(self):
+        """ to be implemented by subclasses """
+        raise NotImplementedError
+
+    def project(self, items):
+        """ to be implemented by subclasses """
+        raise NotImplementedError
+
+
+class GaussianProjection(RandomProjection):
+    """
+    Dense Gaussian matrix, as in SimHash, but not stored in snapshots.
+    """
+    def build(self):
+        rng = np.random.RandomState(self.seed)
+        self.matrix = rng.normal(size=(self.item_dim, self.dim_key)).astype(np.float32)
+        self.unpicklable_list = ["matrix"]
+
+    def project(self, items):
+        return np.asarray(items, dtype=np.float32).dot(self.matrix)
+
+
+class SparseProjection(RandomProjection):
+    """
+    Very sparse random projection (Li et al., 2006): each entry is +sqrt(1/density) or -sqrt(1/density) with probability density/2 each, and 0 otherwise.
+    density=None uses 1/sqrt(item_dim); density=1/3. recovers Achlioptas' projection.
+    The transposed matrix is stored as CSR, so that projecting a batch is a sparse-dense product.
+    """
+    def __init__(self, item_dim, dim_key, density=None, seed=None):
+        if density is None:
+            density = 1. / float(np.sqrt(item_dim))
+        self.density = density
+        super().__init__(item_dim=item_dim, dim_key=dim_key, seed=seed)
+
+    def build(self):
+        rng = np.random.RandomState(self.seed)
+        scale = np.sqrt(1. / self.density)
+        self.matrix_T = scipy.sparse.random(
+            self.dim_key, self.item_dim,
+            density=self.density,
+            format="csr",
+            dtype=np.float32,
+            random_state=rng,
+            data_rvs=lambda n: scale * (2 * rng.randint(2, size=n) - 1),
+        )
+        self.unpicklable_list = ["matrix_T"]
+
+    def project(self, items):
+        items = np.asarray(items, dtype=np.float32)
+        return np.asarray(self.matrix_T.dot(items.T)).T
+
+
+class SRHTProjection(RandomProjection):
+    """
+    Subsampled randomized Hadamard transform: flip the signs of the (zero-padded) item coordinates at random, apply a fast Walsh-Hadamard transform, and keep dim_key random coordinates.
+    Only a sign vector and the kept coordinates are generated; no matrix is formed.
+    Items are transformed chunk_size rows at a time to bound the memory of the padded buffer.
+    """
+    def __init__(self, item_dim, dim_key, chunk_size=1024, seed=None):
+        self.chunk_size = chunk_size
+        super().__init__(item_dim=item_dim, dim_key=dim_key, seed=seed)
+
+    def build(self):
+        self.padded_dim = int(2 ** np.ceil(np.log2(self.item_dim)))
+        assert self.dim_key <= self.padded_dim
+        rng = np.random.RandomState(self.seed)
+        self.signs = (2 * rng.randint(2, size=self.item_dim) - 1).astype(np.float32)
+        self.rows = rng.choice(self.padded_dim, self.dim_key, replace=False)
+        self.unpicklable_list = ["signs", "rows"]
+
+    def project(self, items):
+        items = np.asarray(items)
+        N = items.shape[0]
+        result = np.zeros((N, self.dim_key), dtype=np.float32)
+        buf = np.zeros((min(N, self.chunk_size), self.padded_dim), dtype=np.float32)
+        for i in range(0, N, self.chunk_size):
+            n = min(self.chunk_size, N - i)
+            x = buf[:n]
+            x[:, :self.item_dim] = items[i:i+n]
+            x[:, :self.item_dim] *= self.signs
+            x[:, self.item_dim:] = 0
+            fwht(x)
+            result[i:i+n] = x[:, self.rows]
+        # (in place: dividing by the float64 np.sqrt would promote the result to float64)
+        result /= np.float32(np.sqrt(self.padded_dim))
+        return result
+
+
+def fwht(x):
+    """
+    In-place unnormalized fast Walsh-Hadamard transform of each row of x; the row length must be a power of 2.
+    """
+    N, d = x.shape
+    h = 1
+    while h < d:
+        y = x.reshape((N, d // (2 * h), 2, h))
+        a = y[:, :, 0, :]
+        b = y[:, :, 1, :]
+        diff = a - b
+        a += b
+        b[...] = diff
+        h *= 2
+    return x
@@ -0,0 +1,78 @@
+import numpy as np
+import multiprocessing as mp
+
+class ShardLocks(object):
+    """
+    Split a flat shared count table into n_shards contiguous ranges, each guarded by its own lock.
+    add() and maximum() first aggregate duplicate indices with np.unique, then update one shard at a time, starting from the shard indexed by the caller's rank. Ranks therefore rarely wait for each other, and the work under the locks scales with the number of distinct indices rather than the number of samples.
+    Must be created before forking, like the shared tables themselves. Locks cannot be pickled, so hashes list this object in their unpicklable_list.
+    """
+    def __init__(self, table_size, n_shards=64):
+        self.table_size = int(table_size)
+        self.n_shards = int(min(n_shards, self.table_size))
+        self.shard_size = int(np.ceil(self.table_size / float(self.n_shards)))
+        self.locks = [mp.Lock() for _ in range(self.n_shards)]
+
+    def add(self, table, indices, rank=None, max_count=None):
+        """
+        table.ravel()[indices] += 1 (with repeated indices counted repeatedly)
+        :param table: a numpy view of the shared table (any shape, C-contiguous)
+        :param indices: flat indices into the table
+        :param max_count: if given, the counts saturate at max_count instead of wrapping around
+        """
+        flat_table = table.reshape(-1)
+        cells, counts = np.unique(np.asarray(indices).ravel(), return_counts=True)
+        for s, lo, hi in self._shards(cells, rank):
+            with self.locks[s]:
+                if max_count is None:
+                    flat_table[cells[lo:hi]] += counts[lo:hi].astype(flat_table.dtype)
+                else:
+                    new_counts = flat_table[cells[lo:hi]].astype(np.int64) + counts[lo:hi]
+                    flat_table[cells[lo:hi]] = np.minimum(new_counts, max_count)
+
+    def maximum(self, table, indices, values, rank=None):
+        """
+        table.ravel()[indices] = max(table.ravel()[indices], values), where indices may repeat
+        """
+        flat_table = table.reshape(-1)
+        indices = np.asarray(indices).ravel()
+        values = np.asarray(values).ravel()
+        order = np.lexsort((values, indices))
+        indices = indices[order]
+        values = values[order]
+        # keep the largest value of each index, which comes last after sorting
+        last = np.ones(len(indices), dtype=bool)
+        last[:-1] = indices[1:] != indices[:-1]
+        cells = indices[last]
+        values = values[last]
+        for s, lo, hi in self._shards(cells, rank):
+            with self.locks[s]:
+                flat_table[cells[lo:hi]] = np.maximum(flat_table[cells[lo:hi]], values[lo:hi]).astype(flat_table.dtype)
+
+    def _shards(self, cells, rank):
+        """
+        For sorted distinct flat indices, yield (shard, lo, hi) for each shard that cells[lo:hi] falls in, starting from the shard indexed by rank.
+        """
+        if len(cells) == 0:
+            return
+        bounds = np.searchsorted(cells, np.arange(self.n_shards + 1) * self.shard_size)
+        start = 0 if rank is None else rank % self.n_shards
+        for j in range(self.n_shards):
+            s = (start + j) % self.n_shards
+            lo, hi = bounds[s], bounds[s + 1]
+            if lo < hi:
+                yield s, lo, hi
+
+    def reset(self, table):
+        flat_table = table.reshape(-1)
+        for s in range(self.n_shards):
+            with self.locks[s]:
+                flat_table[s * self.shard_size: (s + 1) * self.shard_size] = 0
+
+
+def flat_table_indices(keys, table_width):
+    """
+    Flat indices into a (n_buckets, table_width) table for keys of shape (n_items, n_buckets)
+    """
+    keys = np.asarray(keys)
+    return keys + np.arange(keys.shape[1]) * table_width
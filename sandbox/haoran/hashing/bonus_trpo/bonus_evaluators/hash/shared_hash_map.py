@@ -0,0 +1,229 @@
+import numpy as np
+import multiprocessing as mp
+import atexit
+import os
+import tempfile
+from sandbox.haoran.hashing.bonus_trpo.bonus_evaluators.hash.count_min_sketch import hash_keys
+
+class SharedHashMap(object):
+    """
+    Exact counter for fixed-width keys (rows of key_len uint64 words), implemented as an open-addressing hash table with linear probing.
+    Inserts and lookups are vectorized over a batch: all pending keys probe one slot per round, and keys that land on the same empty slot are resolved by letting one of them claim it.
+
+    In parallel mode the slots live in a file mapped by every process (under /dev/shm if available). inc() holds a lock, so concurrent inserts are safe; query() does not lock, and must not overlap with inc() of other processes (the bonus evaluators separate them with barriers).
+    The table is rehashed into a file twice as large when the load factor would exceed max_load_factor. This happens inside inc(), under its lock, rather than at iteration boundaries; other processes see the new generation at the start of their next call and remap it. A query() that overlaps a rehash would read a stale table, so it asserts that no rehash started or ran while it probed.
+
+    Pickling only stores the occupied slots; the unpickled map is a serial one.
+    """
+    def __init__(self, key_len, capacity=2**20, max_load_factor=0.5, parallel=False, shm_dir=None):
+        self.key_len = key_len
+        self.max_load_factor = max_load_factor
+        self.parallel = parallel
+        capacity = int(2 ** np.ceil(np.log2(capacity)))
+        if parallel:
+            if shm_dir is None:
+                shm_dir = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+            self.file_prefix = os.path.join(
+                shm_dir, "shared_hash_map_%d_%d" % (os.getpid(), id(self)))
+            self.lock = mp.Lock()
+            self.shared_generation = mp.RawValue('i', 0)
+            self.shared_capacity = mp.RawValue('l', capacity)
+            self.shared_size = mp.RawValue('l', 0)
+            self.shared_rehashing = mp.RawValue('b', False)
+            self._create_file(0, capacity)
+            self._map(0)
+            atexit.register(self._unlink_current_file, os.getpid())
+        else:
+            self.capacity = capacity
+            self.size = 0
+            self.keys, self.counts, self.used = self._alloc(capacity)
+
+    # storage ---------------------------------------------------------------
+    def _alloc(self, capacity):
+        return (
+            np.zeros((capacity, self.key_len), dtype=np.uint64),
+            np.zeros(capacity, dtype=np.int64),
+            np.zeros(capacity, dtype=bool),
+        )
+
+    def _file_name(self, generation):
+        return "%s_%d" % (self.file_prefix, generation)
+
+    def _file_size(self, capacity):
+        return capacity * (8 * self.key_len + 8 + 1)
+
+    def _create_file(self, generation, capacity):
+        with open(self._file_name(generation), "wb") as f:
+            f.truncate(self._file_size(capacity))
+
+    def _map(self, generation):
+        capacity = self.shared_capacity.value
+        buf = np.memmap(self._file_name(generation), dtype=np.uint8, mode="r+",
+            shape=(self._file_size(capacity),))
+        n_key_bytes = capacity * self.key_len * 8
+        self.keys = buf[:n_key_bytes].view(np.uint64).reshape((capacity, self.key_len))
+        self.counts = buf[n_key_bytes:n_key_bytes + capacity * 8].view(np.int64)
+        self.used = buf[n_key_bytes + capacity * 8:].view(bool)
+        self.capacity = capacity
+        self.mapped_generation = generation
+
+    def _ensure_mapped(self):
+        if self.parallel and self.mapped_generation != self.shared_generation.value:
+            self._map(self.shared_generation.value)
+
+    def _unlink_current_file(self, creator_pid):
+        if os.getpid() == creator_pid:
+            name = self._file_name(self.shared_generation.value)
+            if os.path.exists(name):
+                os.remove(name)
+
+    def _get_size(self):
+        return self.shared_size.value if self.parallel else self.size
+
+    def _set_size(self, size):
+        if self.parallel:
+            self.shared_size.value = size
+        else:
+            self.size = size
+
+    def _rehash(self, min_capacity):
+        capacity = self.capacity
+        while capacity * self.max_load_factor < min_capacity:
+            capacity *= 2
+        occupied = np.where(self.used)[0]
+        old_keys = np.array(self.keys[occupied])
+        old_counts = np.array(self.counts[occupied])
+        if self.parallel:
+            self.shared_rehashing.value = True
+            old_generation = self.mapped_generation
+            self._create_file(old_generation + 1, capacity)
+            self.shared_capacity.value = capacity
+            self._map(old_generation + 1)
+            self.shared_generation.value = old_generation + 1
+            os.remove(self._file_name(old_generation))
+        else:
+            self.keys, self.counts, self.used = self._alloc(capacity)
+            self.capacity = capacity
+        self._set_size(0)
+        self._insert(old_keys, old_counts)
+        if self.parallel:
+            self.shared_rehashing.value = False
+
+    # operations ------------------------------------------------------------
+    def _probe(self, keys, insert):
+        """
+        Slot of each (distinct) key; -1 for missing keys when insert is False.
+        """
+        n = len(keys)
+        mask = self.capacity - 1
+        slots = (hash_keys(keys) & np.uint64(mask)).astype(np.int64)
+        result = np.full(n, -1, dtype=np.int64)
+        pending = np.arange(n)
+        n_new = 0
+        while len(pending) > 0:
+            s = slots[pending]
+            used = self.used[s]
+            found = used & np.all(self.keys[s] == keys[pending], axis=1)
+            result[pending[found]] = s[found]
+            done = found
+            empty = ~used
+            if insert:
+                # one key claims each empty slot; the others compare against it in the next round
+                claim_slots, first = np.unique(s[empty], return_index=True)
+                winners = pending[empty][first]
+                self.keys[claim_slots] = keys[winners]
+                self.used[claim_slots] = True
+                result[winners] = claim_slots
+                n_new += len(winners)
+                done = done | (result[pending] >= 0)
+                collided = used & ~found
+            else:
+                done = done | empty
+                collided = ~done
+            slots[pending[collided]] = (slots[pending[collided]] + 1) & mask
+            pending = pending[~done]
+        return result, n_new
+
+    def _insert(self, keys, increments):
+        size = self._get_size()
+        if size + len(keys) > self.max_load_factor * self.capacity:
+            self._rehash(size + len(keys))
+            size = self._get_size()
+        slots, n_new = self._probe(keys, insert=True)
+        self.counts[slots] += increments
+        self._set_size(size + n_new)
+
+    def inc(self, keys):
+        """
+        :param keys: uint64 matrix of shape (n_items, key_len); repeated rows are counted repeatedly
+        """
+        keys = np.asarray(keys, dtype=np.uint64).reshape((-1, self.key_len))
+        if len(keys) == 0:
+            return
+        uniq_keys, increments = np.unique(keys, axis=0, return_counts=True)
+        if self.parallel:
+            with self.lock:
+                self._ensure_mapped()
+                self._insert(uniq_keys, increments)
+        else:
+            self._insert(uniq_keys, increments)
+
+    def query(self, keys):
+        keys = np.asarray(keys, dtype=np.uint64).reshape((-1, self.key_len))
+        self._ensure_mapped()
+        if self.parallel:
+            assert not self.shared_rehashing.value, "query() overlaps a rehash in inc() of another process"
+        slots, _ = self._probe(keys, insert=False)
+        counts = np.zeros(len(keys), dtype=np.int64)
+        found = slots >= 0
+        counts[found] = self.counts[slots[found]]
+        if self.parallel:
+            assert not self.shared_rehashing.value and self.shared_generation.value == self.mapped_generation, \
+                "query() overlaps a rehash in inc() of another process"
+        return counts
+
+    def __len__(self):
+        return self._get_size()
+
+    def nbytes(self):
+        self._ensure_mapped()
+        return self.keys.nbytes + self.counts.nbytes + self.used.nbytes
+
+    def reset(self):
+        if self.parallel:
+            with self.lock:
+                self._ensure_mapped()
+                self.used[:] = False
+                self.counts[:] = 0
+                self.shared_size.value = 0
+        else:
+            self.used[:] = False
+            self.counts[:] = 0
+            self.size = 0
+
+    def items(self):
+        """ occupied keys and their counts """
+        self._ensure_mapped()
+        occupied = np.where(self.used)[0]
+        return np.array(self.keys[occupied]), np.array(self.counts[occupied])
+
+    def __getstate__(self):
+        """ Only dump the occupied slots. """
+        keys, counts = self.items()
+        return dict(
+            key_len=self.key_len,
+            max_load_factor=self.max_load_factor,
+            capacity=self.capacity,
+            occupied_keys=keys,
+            occupied_counts=counts,
+        )
+
+    def __setstate__(self, state):
+        self.key_len = state["key_len"]
+        self.max_load_factor = state["max_load_factor"]
+        self.parallel = False
+        self.capacity = state["capacity"]
+        self.size = 0
+        self.keys, self.counts, self.used = self._alloc(self.capacity)
+        if len(state["occupied_keys"]) > 0:
+            self._insert(state["occupied_keys"], state["occupied_counts"])
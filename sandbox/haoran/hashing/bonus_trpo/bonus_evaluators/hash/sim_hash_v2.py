@@ -6,27 +6,41 @@ class SimHashV2(BinaryHash):
     """
     Same as SimHash, but defined as a subclass of BinaryHash
     """
+    projection = None
+
     def __init__(self,
             item_dim,
             dim_key=128,
             bucket_sizes=None,
             parallel=False,
+            projection=None,
+            sketch=None,
         ):
         super().__init__(
             dim_key=dim_key,
             bucket_sizes=bucket_sizes,
             parallel=parallel,
+            sketch=sketch,
         )
 
-        # each column is a vector of uniformly random orientation
-        self.projection_matrix = np.random.normal(size=(item_dim, dim_key))
+        if projection is not None:
+            assert projection.item_dim == item_dim and projection.dim_key == dim_key
+            self.projection = projection
+        else:
+            # each column is a vector of uniformly random orientation
+            self.projection_matrix = np.random.normal(size=(item_dim, dim_key))
+            self.snapshot_list.append("projection_matrix")
         self.item_dim = item_dim
 
-        self.snapshot_list.append("projection_matrix")
-
     def __getstate__(self):
         return super().__getstate__()
 
+    def project(self, items):
+        if self.projection is not None:
+            return self.projection.project(items)
+        else:
+            return np.asarray(items).dot(self.projection_matrix)
+
     def compute_binary_keys(self, items):
-        binaries = np.sign(np.asarray(items).dot(self.projection_matrix))
+        binaries = np.sign(self.project(items))
         return binaries
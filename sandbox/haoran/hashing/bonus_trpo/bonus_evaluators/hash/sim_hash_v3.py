@@ -6,12 +6,16 @@ class SimHashV3(NaryHash):
     """
     Same as SimHash, but defined as a subclass of NaryHash
     """
+    projection = None
+
     def __init__(self,
             item_dim,
             dim_key=128,
             bucket_sizes=None,
             parallel=False,
             standard_code=False,
+            projection=None,
+            sketch=None,
         ):
         self.standard_code = standard_code
         super().__init__(
@@ -19,19 +23,29 @@ class SimHashV3(NaryHash):
             dim_key=dim_key,
             bucket_sizes=bucket_sizes,
             parallel=parallel,
+            sketch=sketch,
         )
 
-        # each column is a vector of uniformly random orientation
-        self.projection_matrix = np.random.normal(size=(item_dim, dim_key))
+        if projection is not None:
+            assert projection.item_dim == item_dim and projection.dim_key == dim_key
+            self.projection = projection
+        else:
+            # each column is a vector of uniformly random orientation
+            self.projection_matrix = np.random.normal(size=(item_dim, dim_key))
+            self.snapshot_list.append("projection_matrix")
         self.item_dim = item_dim
 
-        self.snapshot_list.append("projection_matrix")
-
     def __getstate__(self):
         return super().__getstate__()
 
+    def project(self, items):
+        if self.projection is not None:
+            return self.projection.project(items)
+        else:
+            return np.asarray(items).dot(self.projection_matrix)
+
     def compute_nary_keys(self, items):
-        binaries = np.sign(np.asarray(items).dot(self.projection_matrix))
+        binaries = np.sign(self.project(items))
         if self.standard_code:
             binaries = (0.5*(binaries+1)).astype(int)
         return binaries
@@ -43,6 +57,9 @@ class SimHashV3(NaryHash):
             bucket_sizes=self.bucket_sizes,
             parallel=self.parallel,
             standard_code=self.standard_code,
+            projection=self.projection,
+            sketch=self.sketch.get_copy() if self.sketch is not None else None,
         )
-        h.projection_matrix = np.copy(self.projection_matrix)
+        if self.projection is None:
+            h.projection_matrix = np.copy(self.projection_matrix)
         return h
@@ -3,6 +3,7 @@
 import numpy as np
 import itertools
 from rllab.misc import logger
+from sandbox.haoran.hashing.bonus_trpo.bonus_evaluators.key_retrieval import observation_count_targets
 
 
 class HashingBonusEvaluator(object):
@@ -30,6 +31,7 @@ class HashingBonusEvaluator(object):
 
 
     def compute_keys(self, observations):
+        observations = observation_count_targets(observations)
         observations = np.cast['int']((observations + 1) * 0.5 * 255.0)
         binaries = np.sign(np.asarray(observations).dot(self.projection_matrix))
         keys = np.cast['int'](binaries.dot(self.mods_list)) % self.bucket_sizes
@@ -0,0 +1,65 @@
+import numpy as np
+
+def observation_count_targets(states):
+    """
+    Observations as count targets, as the hashes saw them before uint8_frame_stack: one flat row per state, and stacks of uint8 frames (AtariEnv with uint8_frame_stack) rescaled to [-1, 1], as the env rescales them otherwise.
+    """
+    states = np.asarray(states)
+    if states.dtype == np.uint8:
+        if states.ndim > 2:
+            states = np.reshape(states, (len(states), -1))
+        states = (states / 255.0) * 2.0 - 1.0
+    return states
+
+def retrieve_path_keys(paths, compute_keys, count_target="observations", chunk_size=np.inf, field="keys"):
+    """
+    Compute the keys of all states in paths into one preallocated array, and store a view of it in each path[field].
+    Paths that all have the field already (e.g. computed by predict()) are only concatenated.
+
+    :param compute_keys: function from a batch of states (preprocessing included) to an array of keys
+    :param chunk_size: number of states processed at once; bounds the peak memory of preprocessing and projection
+    :param field: name of the cached keys in the paths; must be distinct for evaluators that share the paths
+    :return: keys of all states, in the order of paths
+    """
+    return retrieve_shared_path_keys(
+        paths,
+        lambda states: [compute_keys(states)],
+        count_target,
+        chunk_size,
+        [field],
+    )[0]
+
+
+def retrieve_shared_path_keys(paths, compute_keys_list, count_target, chunk_size, fields):
+    """
+    retrieve_path_keys for several hashes of the same states: compute_keys_list returns one array of keys per field, so that the work they share (e.g. preprocessing) is done once per chunk.
+    :return: a list of key arrays, one per field
+    """
+    if all(field in path for path in paths for field in fields):
+        if len(paths) == 1:
+            return [paths[0][field] for field in fields]
+        return [np.concatenate([path[field] for path in paths]) for field in fields]
+
+    path_lens = [len(path["rewards"]) for path in paths]
+    n_total = int(np.sum(path_lens))
+    keys_list = None
+    start = 0
+    for path, path_len in zip(paths, path_lens):
+        if count_target == "observations":
+            path_states = path["observations"]
+        else:
+            path_states = path["env_infos"][count_target]
+        k = max(int(min(path_len, chunk_size)), 1)
+        for i in range(0, path_len, k):
+            new_keys_list = [np.asarray(new_keys) for new_keys in compute_keys_list(path_states[i:i+k])]
+            if keys_list is None:
+                keys_list = [
+                    np.empty((n_total,) + new_keys.shape[1:], dtype=new_keys.dtype)
+                    for new_keys in new_keys_list
+                ]
+            for keys, new_keys in zip(keys_list, new_keys_list):
+                keys[start + i: start + i + len(new_keys)] = new_keys
+        for keys, field in zip(keys_list, fields):
+            path[field] = keys[start: start + path_len]
+        start += path_len
+    return keys_list
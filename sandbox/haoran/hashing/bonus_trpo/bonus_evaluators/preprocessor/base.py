@@ -1,3 +1,5 @@
+import numpy as np
+
 class Preprocessor(object):
     def __init__(self):
         pass
@@ -10,5 +12,33 @@ class Preprocessor(object):
     def output_dim(self):
         return None
 
-    def process(self,items):
-        raise NotImplementedError
+    def get_input_shape(self):
+        """ shape of one item accepted by process() """
+        return tuple(int(d) for d in np.atleast_1d(self.get_input_dim()))
+
+    def get_output_shape(self):
+        """ shape of one item returned by process() """
+        return tuple(int(d) for d in np.atleast_1d(self.get_output_dim()))
+
+    def view(self, items):
+        """
+        The output of process() as a view of items (of any shape with the same items in C order as get_output_shape()), or None if the outputs must be computed.
+        Lets PreprocessorPipeline chain stages without intermediate arrays.
+        """
+        return None
+
+    def process(self, items, out=None):
+        """
+        Default for stages that have a view(): return the view (reshaped to the output shape, which copies only if the view is not contiguous), or copy it into out.
+        :param out: optional contiguous array with the size of the outputs
+        """
+        outputs = self.view(items)
+        if outputs is None:
+            raise NotImplementedError
+        if out is not None:
+            np.copyto(out.reshape(outputs.shape), outputs)
+            return out
+        output_shape = (len(items),) + self.get_output_shape()
+        if outputs.shape != output_shape:
+            outputs = outputs.reshape(output_shape)
+        return outputs
@@ -23,20 +23,16 @@ class HOGFrameSequencePreprocessor(Preprocessor):
     def get_output_dim(self):
         return self._output_dim
 
-    def process(self,items):
-        # input image: ()
-        frame_start_indices = [
-            self.img_height * self.img_width * i
-            for i in range(self.n_last_screens)
-        ]
+    def process(self,items,out=None):
+        """
+        :param items: frame sequences, flattened (batch_size, n_last_screens * img_height * img_width) or not
+        :param out: optional array of shape (batch_size, img_height * img_width)
+        """
         frame_size = self.img_height * self.img_width
+        frames = items.reshape((len(items), self.n_last_screens, frame_size))
 
         if self.option == "cur_minus_prev":
-            processed_items = np.asarray([
-                item[frame_start_indices[-1]:] - \
-                item[frame_start_indices[-2]:frame_start_indices[-1]]
-                for item in items
-            ])
+            processed_items = np.subtract(frames[:,-1], frames[:,-2], out=out)
         else:
             raise NotImplementedError
         return processed_items
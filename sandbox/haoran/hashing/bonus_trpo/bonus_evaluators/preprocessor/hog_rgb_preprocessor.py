@@ -15,10 +15,9 @@ class HOGRGBPreprocessor(Preprocessor):
     def get_output_dim(self):
         return self._output_dim
 
-    def process(self,items):
+    def get_output_shape(self):
+        return (self.img_channel, self.img_width, self.img_height)
+
+    def view(self,items):
         # input image: (height, width, channel)
-        processed_items = np.asarray([
-            np.transpose(item,(2,1,0))
-            for item in items
-        ])
-        return processed_items
+        return np.transpose(items,(0,3,2,1))
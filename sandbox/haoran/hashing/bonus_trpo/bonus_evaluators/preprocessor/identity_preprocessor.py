@@ -12,5 +12,11 @@ class IdentityPreprocessor(Preprocessor):
     def get_output_dim(self):
         return self._output_dim
 
-    def process(self,items):
+    def view(self,items):
+        return items
+
+    def process(self,items,out=None):
+        if out is not None:
+            np.copyto(out.reshape(items.shape), items)
+            return out
         return items
@@ -13,7 +13,7 @@ class ImageVectorizePreprocessor(Preprocessor):
             self.slices.append(s)
 
         self.sliced_dims = [
-            (s.stop - s.start) // s.step
+            len(range(s.start, s.stop, s.step))
             for s in self.slices
         ]
         self._output_dim = np.prod(self.sliced_dims)
@@ -24,10 +24,8 @@ class ImageVectorizePreprocessor(Preprocessor):
     def get_output_dim(self):
         return self._output_dim
 
-    def process(self,imgs):
+    def view(self,imgs):
         """
         Assume that imgs have shape (batch_size, n_chanllel, width, height)
         """
-        batch_size = imgs.shape[0]
-        sliced_imgs = imgs[:,self.slices[0], self.slices[1], self.slices[2]]
-        return sliced_imgs.reshape((batch_size, self._output_dim))
+        return imgs[:,self.slices[0], self.slices[1], self.slices[2]]
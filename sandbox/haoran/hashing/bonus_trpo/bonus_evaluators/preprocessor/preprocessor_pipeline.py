@@ -0,0 +1,89 @@
+from sandbox.haoran.hashing.bonus_trpo.bonus_evaluators.preprocessor.base import Preprocessor
+import numpy as np
+
+class PreprocessorPipeline(Preprocessor):
+    """
+    Apply several preprocessors in sequence, as one preprocessor.
+    The shapes are validated once at construction; between stages, items are reshaped to the input shape of the next stage.
+
+    Stages with a view() (slicing, transposing) are chained as strided views of the input.
+    Arrays are only materialized for stages that compute new values, or when a reshape cannot be a view; they are written into buffers kept across calls (one per stage, grown to the largest batch).
+    Hence, without out=, the returned array may be a view of the input or of an internal buffer, which the next call overwrites.
+    """
+    def __init__(self, preprocessors):
+        assert len(preprocessors) > 0
+        self.preprocessors = list(preprocessors)
+        for prev, next in zip(self.preprocessors[:-1], self.preprocessors[1:]):
+            assert np.prod(prev.get_output_shape()) == np.prod(next.get_input_shape()), \
+                "%s outputs items of shape %s, but %s expects %s" % (
+                    type(prev).__name__, prev.get_output_shape(),
+                    type(next).__name__, next.get_input_shape(),
+                )
+        self.buffers = dict()
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state["buffers"] = dict()
+        return state
+
+    def get_input_dim(self):
+        return self.preprocessors[0].get_input_dim()
+
+    def get_output_dim(self):
+        return self.preprocessors[-1].get_output_dim()
+
+    def get_input_shape(self):
+        return self.preprocessors[0].get_input_shape()
+
+    def get_output_shape(self):
+        return self.preprocessors[-1].get_output_shape()
+
+    def get_buffer(self, key, shape, dtype):
+        """
+        An array of the given shape, reusing the buffer of the same key if it is large enough
+        """
+        buffer = self.buffers.get(key)
+        if buffer is None or buffer.dtype != dtype or buffer.shape[1:] != shape[1:] \
+                or len(buffer) < shape[0]:
+            buffer = np.empty(shape, dtype=dtype)
+            self.buffers[key] = buffer
+        return buffer[:shape[0]]
+
+    def reshape(self, items, shape, key):
+        """
+        Reshape items, copying them into a buffer if the result cannot be a view
+        """
+        if items.shape == shape:
+            return items
+        if items.flags.c_contiguous:
+            return items.reshape(shape)
+        buffer = self.get_buffer(key, shape, items.dtype)
+        np.copyto(buffer.reshape(items.shape), items)
+        return buffer
+
+    def process(self, items, out=None):
+        """
+        :param out: optional contiguous array with the size of the outputs, of any shape
+        """
+        batch_size = len(items)
+        last = len(self.preprocessors) - 1
+        for i, preprocessor in enumerate(self.preprocessors):
+            items = self.reshape(items, (batch_size,) + preprocessor.get_input_shape(), ("input", i))
+            output_shape = (batch_size,) + preprocessor.get_output_shape()
+            outputs = preprocessor.view(items)
+            if outputs is not None:
+                if i == last and out is not None:
+                    np.copyto(out.reshape(outputs.shape), outputs)
+                    return out
+            elif i == last and out is not None:
+                preprocessor.process(items, out=out.reshape(output_shape))
+                return out
+            else:
+                # the output dtype depends on the input dtype; ask the stage with a single item
+                dtype = preprocessor.process(items[:1]).dtype
+                outputs = preprocessor.process(
+                    items,
+                    out=self.get_buffer(("output", i), output_shape, dtype),
+                )
+            items = self.reshape(outputs, output_shape, ("output", i))
+        return items
@@ -8,7 +8,7 @@ class SlicingPreprocessor(Preprocessor):
         self._start = start
         self._stop = stop
         self._step = step
-        self._output_dim = (stop - start) // step
+        self._output_dim = len(range(start, stop, step))
 
     def get_input_dim(self):
         return self._input_dim
@@ -16,7 +16,7 @@ class SlicingPreprocessor(Preprocessor):
     def get_output_dim(self):
         return self._output_dim
 
-    def process(self,inputs):
+    def view(self,inputs):
         """
         Assume inputs have shape (batch_size, input_dim)
         """
@@ -34,6 +34,9 @@ class RandomBonusEvaluator(object):
 
         return bonuses
 
+    def compute_bonuses(self, paths):
+        return [self.predict(path) for path in paths]
+
     def fit_after_process_samples(self, samples_data):
         pass
 
@@ -19,6 +19,9 @@ class ZeroBonusEvaluator(object):
     def fit_before_process_samples(self, paths):
         pass
 
+    def compute_bonuses(self, paths):
+        return [self.predict(path) for path in paths]
+
     def fit_after_process_samples(self, samples_data):
         pass
 
@@ -3,7 +3,6 @@ import os
 import sys
 import numpy as np
 import cv2
-import copy
 import atari_py
 
 from rllab import config
@@ -11,6 +10,8 @@ from rllab.spaces.discrete import Discrete
 from rllab.core.serializable import Serializable
 from rllab.envs.base import Env
 from sandbox.haoran.ale_python_interface import ALEInterface
+from sandbox.haoran.hashing.bonus_trpo.envs.frame_ring_buffer import FrameRingBuffer
+from sandbox.haoran.hashing.bonus_trpo.envs.env_info_recorder import EnvInfoRecorder, ON_DEMAND
 
 class AtariEnv(Env,Serializable):
     def __init__(self,
@@ -37,9 +38,15 @@ class AtariEnv(Env,Serializable):
             correct_luminance=True,
             subsample_rgb_images=False,
             recorded_rgb_image_scale=1.0,
+            uint8_frame_stack=False,
+            frame_buffer_capacity=1000,
+            env_info_recorder=None,
         ):
         """
         plot: not compatible with rllab yet
+        uint8_frame_stack: keep the last screens in a FrameRingBuffer and return the stack as a uint8 view in [0, 255] instead of a float64 copy in [-1, 1]. The policy rescales the batch (e.g. CategoricalConvPolicy(uint8_observations=True)), and rollout(stacked_frames=True) stores each frame of a path once. LinearFeatureBaseline (and its parallel versions) and the hashing bonus evaluators (count_target="observations") rescale them the same way.
+        frame_buffer_capacity: number of frames the ring buffer holds before it wraps around
+        env_info_recorder: an EnvInfoRecorder deciding when each env_info field is recorded; by default, the fields of the record_* flags are recorded at every step, except the internal states, which are only cloned on request_env_info("internal_states") or for a resetter that asks for them; AtariCountResetter.env_info_periods asks for them at every step, so cloneState is still called at every step with that resetter
         """
         Serializable.quick_init(self,locals())
         assert not plot
@@ -60,6 +67,11 @@ class AtariEnv(Env,Serializable):
         self.resetter = resetter
         if resetter is not None:
             assert max_start_nullops == 0 # doing nothing when reset to a non-initial state can be dangerous in Montezuma's Revenge
+        if env_info_recorder is None:
+            env_info_recorder = EnvInfoRecorder(self.default_env_info_periods())
+        if resetter is not None:
+            env_info_recorder.add_periods(getattr(resetter, "env_info_periods", dict()))
+        self.env_info_recorder = env_info_recorder
         self.terminator = terminator
         if self.terminator is not None:
             self.terminator.set_env(self)
@@ -73,6 +85,11 @@ class AtariEnv(Env,Serializable):
         self.avoid_life_lost = avoid_life_lost
         self.legal_actions = legal_actions
         self.correct_luminance = correct_luminance
+        self.uint8_frame_stack = uint8_frame_stack
+        if uint8_frame_stack:
+            assert obs_type == "image" and not config.USE_TF
+            self.frame_stack = FrameRingBuffer(
+                n_last_screens, (img_width, img_height), capacity=frame_buffer_capacity)
         if not correct_luminance:
             print("""
             ################################################
@@ -199,7 +216,9 @@ class AtariEnv(Env,Serializable):
 
     @property
     def observation(self):
-        if self.obs_type == "image":
+        if self.obs_type == "image" and self.uint8_frame_stack:
+            return self.frame_stack.stack()
+        elif self.obs_type == "image":
             assert len(self.last_screens) == self.n_last_screens
             imgs = np.asarray(list(self.last_screens))
             imgs = (imgs / 255.0) * 2.0 - 1.0 # rescale to [-1,1]
@@ -228,6 +247,8 @@ class AtariEnv(Env,Serializable):
                 image_shape = (self.img_width, self.img_height, self.n_last_screens)
             else:
                 image_shape = (self.n_last_screens, self.img_width, self.img_height)
+            if self.uint8_frame_stack:
+                return Box(low=0, high=255, shape=image_shape)
             return Box(low=-1, high=1, shape=image_shape)
             # see sandbox.haoran.tf.core.layers.BaseConvLayer for a reason why channel is at the last dimension
         else:
@@ -259,19 +280,38 @@ class AtariEnv(Env,Serializable):
     def reward(self):
         return self._reward
 
-    @property
-    def env_info(self):
-        env_info = {}
-        # if self.record_ram and self.obs_type != "ram":
+    def default_env_info_periods(self):
+        periods = dict(lives_lost=1, prior_reward=1)
         if self.record_ram:
-            ram = np.copy(self.ale.getRAM())
-            ram = ram.reshape((1,len(ram),1)) # make it like an image
-            env_info["ram_states"] = ram
-
+            periods["ram_states"] = 1
         if self.record_image and self.obs_type != "image":
-            env_info["images"] = np.copy(np.asarray(list(self.last_screens)))
-
+            periods["images"] = 1
         if self.record_rgb_image:
+            periods["rgb_images"] = 1
+        if self.record_internal_state:
+            periods["internal_states"] = ON_DEMAND
+        if self.resetter is not None:
+            periods.update(is_terminals=1, ale_ids=1, use_default_reset=1)
+        return periods
+
+    def request_env_info(self, field):
+        """ record field at the next step, if its period is ON_DEMAND """
+        self.env_info_recorder.request(field)
+
+    def record_env_info(self):
+        """
+        Record the env_info of the current state as env_info_recorder decides: the fixed-size fields are written into the recorder, the others are returned.
+        """
+        recorder = self.env_info_recorder
+        recorder.begin_step()
+        env_info = dict()
+        if recorder.records("ram_states"):
+            self.ale.getRAM(recorder.row("ram_states", (self.ale.getRAMSize(),), np.uint8))
+
+        if recorder.records("images"):
+            env_info["images"] = np.asarray(list(self.last_screens))
+
+        if recorder.records("rgb_images"):
             rgb_img = self.ale.getScreenRGB()
             scale = self.recorded_rgb_image_scale
             if abs(scale-1.0) > 1e-4:
@@ -288,20 +328,41 @@ class AtariEnv(Env,Serializable):
                 rgb_img = subsampled_rgb_images
             env_info["rgb_images"] = rgb_img
 
-        if self.record_internal_state:
+        if recorder.records("internal_states"):
             env_info["internal_states"] = self.ale.cloneState()
 
-        if self.resetter is not None:
-            env_info["is_terminals"] = self.is_terminal
+        if recorder.records("is_terminals"):
+            recorder.set("is_terminals", bool(self.is_terminal))
+        if recorder.records("ale_ids"):
             env_info["ale_ids"] = hex(id(self.ale))
-            env_info["use_default_reset"] = self.cur_path_use_default_reset
-        env_info["lives_lost"] = self.lives_lost
+        if recorder.records("use_default_reset"):
+            recorder.set("use_default_reset", bool(self.cur_path_use_default_reset))
+        if recorder.records("lives_lost"):
+            recorder.set("lives_lost", bool(self.lives_lost))
+
+        return recorder.fill(env_info)
 
-        return env_info
+    def recorded_env_info(self, field):
+        """ the values of a fixed-size env_info field in the steps of the current path so far """
+        values = self.env_info_recorder.recorded(field)
+        if field == "ram_states":
+            values = values.reshape((len(values), 1, -1, 1)) # make it like an image
+        return values
 
+    def path_env_infos(self):
+        """
+        The fixed-size env_info fields of the current path, which rollout adds to path["env_infos"] at the end of the path.
+        """
+        recorder = self.env_info_recorder
+        env_infos = dict(
+            (field, self.recorded_env_info(field))
+            for field in recorder.recorded_fields()
+        )
+        recorder.hand_out()
+        return env_infos
 
     def step(self, action):
-        cur_env_info = copy.deepcopy(self.env_info)
+        cur_env_info = self.record_env_info()
         # a legal observation should not be terminal; but to make the program run without interruption, we allow it to reset
         # assert not self.is_terminal
         # if self.is_terminal:
@@ -330,14 +391,19 @@ class AtariEnv(Env,Serializable):
                 break
         self._reward = sum(rewards)
         if self._prior_reward > 0:
-            cur_env_info["prior_reward"] = self._prior_reward
+            prior_reward = self._prior_reward
             self._prior_reward = 0
         else:
-            cur_env_info["prior_reward"] = 0
+            prior_reward = 0
+        if self.env_info_recorder.records("prior_reward"):
+            self.env_info_recorder.set("prior_reward", float(prior_reward))
+        self.env_info_recorder.end_step()
 
         # Record next step env info
         if not self.is_terminal:
-            if self.record_image or self.obs_type == "image":
+            if self.uint8_frame_stack:
+                self.frame_stack.append(self.current_screen())
+            elif self.record_image or self.obs_type == "image":
                 self.last_screens.append(self.current_screen())
             if self.record_ram or self.obs_type == "ram":
                 self.last_rams.append(np.copy(self.ale.getRAM()))
@@ -364,7 +430,9 @@ class AtariEnv(Env,Serializable):
 
         self.last_raw_screen = self.ale.getScreenRGB()
 
-        if self.obs_type == "image" or self.record_image:
+        if self.uint8_frame_stack:
+            self.frame_stack.reset(self.current_screen())
+        elif self.obs_type == "image" or self.record_image:
             self.last_screens = collections.deque(
                 [np.zeros((self.img_width, self.img_height), dtype=np.uint8)] * (self.n_last_screens - 1) +
                 [self.current_screen()],
@@ -377,6 +445,8 @@ class AtariEnv(Env,Serializable):
 
         self.start_lives = self.ale.lives()
         self.lives_lost = False
+        # (after the resetter and the null ops, which are not part of the path)
+        self.env_info_recorder.start_path()
         return self.observation
 
     def render(self,return_array=False):
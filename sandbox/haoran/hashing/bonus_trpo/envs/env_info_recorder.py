@@ -0,0 +1,121 @@
+import numpy as np
+
+ON_DEMAND = "on_demand"
+
+class EnvInfoRecorder(object):
+    """
+    Decides which env_info fields AtariEnv records at each step of a path, and stores the fixed-size ones.
+    periods maps a field to an int k, to record it every k steps (1 for every step), or to ON_DEMAND, to record it only at the step following a call to request(field) (e.g. by a resetter or a terminator). Fields missing from periods are not recorded.
+
+    Fixed-size fields (RAM, lives, rewards, flags) are written into arrays allocated once per path, which rollout collects at the end of the path through AtariEnv.path_env_infos(); between two recordings, they repeat the last recorded value. The arrays double when a path outgrows them.
+    The other fields are returned in the env_info dict of each step (see fill()). They are recorded at the first step of a path in any case, and repeat their last recorded value between recordings as well, so that rollout can stack them.
+    """
+    fixed_size_fields = ["ram_states", "lives_lost", "prior_reward", "is_terminals", "use_default_reset"]
+
+    def __init__(self, periods, initial_path_length=1000):
+        for field, period in periods.items():
+            assert period == ON_DEMAND or (int(period) == period and period >= 1), \
+                "invalid period %s for %s" % (period, field)
+        self.periods = dict(periods)
+        self.capacity = initial_path_length
+        self.requested = set()
+        self.step_requests = set()
+        self.arrays = dict()
+        self.written = set()
+        # last recorded values of the other fields in the current path
+        self.last_values = dict()
+        self.t = 0
+
+    def add_periods(self, periods):
+        """ record the fields in periods as well, e.g. those needed by a resetter; the shortest period is kept """
+        for field, period in periods.items():
+            old_period = self.periods.get(field)
+            if old_period is None or old_period == ON_DEMAND:
+                self.periods[field] = period
+            elif period != ON_DEMAND:
+                self.periods[field] = min(old_period, period)
+
+    def start_path(self):
+        """
+        Rewind to the first step of a path. Arrays that have not been handed out are overwritten.
+        """
+        self.t = 0
+        self.requested = set()
+        self.step_requests = set()
+        self.written = set()
+        self.last_values = dict()
+
+    def request(self, field):
+        self.requested.add(field)
+
+    def begin_step(self):
+        """ fields requested so far are recorded at this step; later requests wait for the next one """
+        self.step_requests = self.requested
+        self.requested = set()
+
+    def records(self, field):
+        """ whether field is recorded at the current step """
+        period = self.periods.get(field)
+        if period is None:
+            return False
+        elif field not in self.fixed_size_fields and field not in self.last_values:
+            return True
+        elif period == ON_DEMAND:
+            return field in self.step_requests
+        else:
+            return self.t % period == 0
+
+    def per_step_fields(self):
+        return [field for field in self.periods if field not in self.fixed_size_fields]
+
+    def fill(self, env_info):
+        """ keep the per-step fields recorded in env_info at this step, and add the last values of the others """
+        for field in self.per_step_fields():
+            if field in env_info:
+                self.last_values[field] = env_info[field]
+            else:
+                env_info[field] = self.last_values.get(field)
+        return env_info
+
+    def _array(self, field, shape, dtype):
+        array = self.arrays.get(field)
+        if array is None or array.shape[1:] != tuple(shape):
+            array = np.zeros((self.capacity,) + tuple(shape), dtype=dtype)
+            self.arrays[field] = array
+        elif self.t >= len(array):
+            self.capacity = 2 * len(array)
+            array = np.concatenate([array, np.zeros_like(array)])
+            self.arrays[field] = array
+        return array
+
+    def row(self, field, shape, dtype):
+        """ the row of the current step in the array of a fixed-size field, to be filled in place (e.g. by ale.getRAM) """
+        self.written.add(field)
+        return self._array(field, shape, dtype)[self.t]
+
+    def set(self, field, value):
+        value = np.asarray(value)
+        self._array(field, value.shape, value.dtype)[self.t] = value
+        self.written.add(field)
+
+    def end_step(self):
+        for field, array in list(self.arrays.items()):
+            if field not in self.written and field in self.periods:
+                array = self._array(field, array.shape[1:], array.dtype)
+                if self.t > 0:
+                    array[self.t] = array[self.t - 1]
+                else:
+                    array[self.t] = 0
+        self.written = set()
+        self.t += 1
+
+    def recorded(self, field):
+        """ the values of a fixed-size field in the steps taken so far """
+        return self.arrays[field][:self.t]
+
+    def recorded_fields(self):
+        return [field for field in self.arrays if field in self.periods]
+
+    def hand_out(self):
+        """ the arrays of the current path are handed out (see AtariEnv.path_env_infos), so the next path gets new ones """
+        self.arrays = dict()
@@ -0,0 +1,35 @@
+import numpy as np
+
+class FrameRingBuffer(object):
+    """
+    The last n_frames frames of an episode, in a uint8 buffer of capacity + n_frames - 1 frames that is allocated once.
+    Frames are written one after the other, so the stack of the last n_frames frames is always a contiguous slice of the buffer; when the buffer is full, the last n_frames - 1 frames are copied to its start.
+    stack() returns a read-only view, which stays valid for the next capacity - n_frames appends.
+    """
+    def __init__(self, n_frames, frame_shape, capacity=1000, dtype=np.uint8):
+        assert capacity > n_frames
+        self.n_frames = n_frames
+        self.buffer = np.zeros((capacity + n_frames - 1,) + tuple(frame_shape), dtype=dtype)
+        self.end = n_frames - 1
+
+    def reset(self, frame):
+        """ start an episode: the stack is n_frames - 1 blank frames followed by frame """
+        self.buffer[:self.n_frames - 1] = 0
+        self.end = self.n_frames - 1
+        self.append(frame)
+
+    def append(self, frame):
+        if self.end == len(self.buffer):
+            n_kept = self.n_frames - 1
+            self.buffer[:n_kept] = self.buffer[self.end - n_kept: self.end]
+            self.end = n_kept
+        self.buffer[self.end] = frame
+        self.end += 1
+
+    def stack(self):
+        stack = self.buffer[self.end - self.n_frames: self.end]
+        stack.flags.writeable = False
+        return stack
+
+    def last_frame(self):
+        return self.stack()[-1]
@@ -0,0 +1,77 @@
+import numpy as np
+
+from rllab.core.serializable import Serializable
+from rllab.envs.base import Env
+from sandbox.haoran.hashing.bonus_trpo.envs.atari_env import AtariEnv
+
+class VecAtariEnv(Env, Serializable):
+    """
+    n_envs AtariEnvs, each with its own ALEInterface, stepped in lockstep in one process so that the policy is evaluated once per step for all of them (see rllab.sampler.utils.vectorized_rollout).
+    step() takes one action per env and returns stacked observations, rewards and dones, with a list of env_infos. An env whose path ends is reset at once, and its row of the observations is the first observation of its next path.
+    """
+    vectorized = True
+
+    def __init__(self, n_envs, seed=None, **atari_env_args):
+        """
+        seed: env i gets seed + i; by default each env draws its own seed
+        atari_env_args: arguments of every AtariEnv
+        """
+        Serializable.quick_init(self, locals())
+        self.n_envs = n_envs
+        self.envs = [
+            AtariEnv(seed=None if seed is None else seed + i, **atari_env_args)
+            for i in range(n_envs)
+        ]
+        # fixed-size env_infos of the paths that ended, until vectorized_rollout collects them
+        self.finished_path_env_infos = [None] * n_envs
+
+    @property
+    def observation_space(self):
+        return self.envs[0].observation_space
+
+    @property
+    def action_space(self):
+        return self.envs[0].action_space
+
+    @property
+    def uint8_frame_stack(self):
+        return self.envs[0].uint8_frame_stack
+
+    def reset(self):
+        self.finished_path_env_infos = [None] * self.n_envs
+        return np.asarray([env.reset() for env in self.envs])
+
+    def reset_env(self, i):
+        """ end the path of env i and start a new one; returns its first observation """
+        self.finished_path_env_infos[i] = self.envs[i].path_env_infos()
+        return self.envs[i].reset()
+
+    def step(self, actions):
+        observations = []
+        rewards = np.zeros(self.n_envs)
+        dones = np.zeros(self.n_envs, dtype=bool)
+        env_infos = []
+        for i, (env, action) in enumerate(zip(self.envs, actions)):
+            o, rewards[i], dones[i], env_info = env.step(action)
+            if dones[i]:
+                o = self.reset_env(i)
+            observations.append(o)
+            env_infos.append(env_info)
+        return np.asarray(observations), rewards, dones, env_infos
+
+    def path_env_infos(self, i):
+        """
+        The fixed-size env_infos (see AtariEnv.path_env_infos) of the last path of env i that ended, or, if they have been collected already, of its current path, which then has to be ended by reset_env(i) or reset().
+        """
+        env_infos = self.finished_path_env_infos[i]
+        if env_infos is None:
+            return self.envs[i].path_env_infos()
+        self.finished_path_env_infos[i] = None
+        return env_infos
+
+    def get_param_values(self):
+        return self.envs[0].get_param_values()
+
+    def set_param_values(self, params):
+        for env in self.envs:
+            env.set_param_values(params)
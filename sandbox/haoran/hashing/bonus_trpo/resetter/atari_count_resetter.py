@@ -13,6 +13,10 @@ from rllab.misc import logger
 
 
 class AtariCountResetter(object):
+    # the candidate states are cloned at every step (see AtariEnv.env_info_recorder): any non-terminal state of the
+    # paths can be sampled by update(), which only knows the counts once the paths are complete
+    env_info_periods = dict(internal_states=1)
+
     def __init__(self,
             p=0.5,
             exponent=1,
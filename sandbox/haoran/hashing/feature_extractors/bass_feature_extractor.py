@@ -15,12 +15,14 @@ class BassFeatureExtractor(object):
         image_shape,
         cell_size,
         n_bin,
-        batch_method="vectorized_v2",
+        batch_method="reshape",
         scale=1.0,
     ):
         """
         :param cell_size: width and height of a cell
         :param n_bin: number of discrete bins for each image channel
+        :param batch_method: "reshape" and "vectorized_v2" compute the same features (ordering: channel, col, row); "reshape" sums the cells with array reshapes in uint16/uint32
+        :param scale: images are resized by this factor before computing features, unless they already have the resized shape (e.g. recorded by AtariEnv with recorded_rgb_image_scale)
         """
         self.cell_size = cell_size
         self.n_bin = n_bin
@@ -54,6 +56,15 @@ class BassFeatureExtractor(object):
                     self.sum_pixel_mat[img_index,feature_index] = 1
                     img_index += 1
 
+    def get_scaled_image_shape(self):
+        """ shape of the resized images; same rounding as cv2.resize with fx=fy=scale """
+        height, width, channel = self.image_shape
+        return (
+            int(np.round(self.scale * height)),
+            int(np.round(self.scale * width)),
+            channel,
+        )
+
     def get_feature_length(self):
         return np.prod(self.feature_shape)
 
@@ -65,13 +76,28 @@ class BassFeatureExtractor(object):
         :param images: a list of images of shape (height, width, channel)
         """
         t0 = time.time()
-        assert len(images.shape) == 4 and images[0].shape == self.image_shape
+        assert len(images.shape) == 4
         batch_size = len(images)
 
-        if abs(self.scale-1.0) > 1e-4:
+        scaled_image_shape = self.get_scaled_image_shape()
+        if abs(self.scale-1.0) > 1e-4 and images[0].shape != scaled_image_shape:
+            assert images[0].shape == self.image_shape
             images = [cv2.resize(image,dsize=(0,0),fx=self.scale,fy=self.scale) for image in images]
+        else:
+            # already resized, e.g. by the env
+            assert images[0].shape in [self.image_shape, scaled_image_shape]
 
-        if self.batch_method == "naive":
+        if self.batch_method == "reshape":
+            cell_sums = self.compute_cell_sums(np.asarray(images))
+            # ordering: channel, col, row (same as vectorized_v2)
+            avg_colors = cell_sums.transpose((0,3,2,1)).reshape((batch_size,-1)) / (self.cell_size ** 2)
+            bin_size = 255 / self.n_bin
+            features = np.minimum(
+                np.floor(avg_colors / bin_size).astype(np.uint8),
+                self.n_bin-1
+            ) # numeric issues may lead to bin_numbers > self.n_bin-1
+
+        elif self.batch_method == "naive":
             features = np.asarray([self.compute_feature(image) for image in images]).reshape((batch_size,-1))
         elif self.batch_method == "vectorized_v1" or self.batch_method == "vectorized_v2":
             images = np.asarray(images,dtype=int) # summation in uint8 can cause trouble
@@ -120,6 +146,39 @@ class BassFeatureExtractor(object):
         # print("batch_method %s elapsed time: %.4f"%(self.batch_method, time.time() - t0))
         return features
 
+    def compute_cell_sums(self, images):
+        """
+        Sum the pixels of each cell, by reshaping the images into blocks of cell_size rows and then cell_size columns.
+        Incomplete cells at the bottom and right edges are summed over the pixels they have (as in vectorized_v2).
+        Rows are summed in uint16 (uint32 for large cells) and cells in uint32; non-uint8 images are converted to int as in vectorized_v2.
+
+        :param images: array of shape (batch_size, height, width, channel)
+        :return: cell sums of shape (batch_size, feature_height, feature_width, channel)
+        """
+        if images.dtype == np.uint8:
+            row_dtype = np.uint16 if self.cell_size * 255 < 2 ** 16 else np.uint32
+            cell_dtype = np.uint32
+        else:
+            images = np.asarray(images, dtype=int)
+            row_dtype = cell_dtype = int
+        batch_size, height, width, channel = images.shape
+        dx = dy = self.cell_size
+        feature_height = int(np.ceil(height / dy))
+        feature_width = int(np.ceil(width / dx))
+        full_height = (height // dy) * dy
+
+        # sum the rows of each cell row; the columns are zero-padded to whole cells
+        row_sums = np.zeros((batch_size, feature_height, feature_width * dx, channel), dtype=row_dtype)
+        row_sums[:, :height // dy, :width] = images[:, :full_height].reshape(
+            (batch_size, height // dy, dy, width, channel)
+        ).sum(axis=2, dtype=row_dtype)
+        if full_height < height:
+            row_sums[:, -1, :width] = images[:, full_height:].sum(axis=1, dtype=row_dtype)
+
+        return row_sums.reshape(
+            (batch_size, feature_height, feature_width, dx, channel)
+        ).sum(axis=3, dtype=cell_dtype)
+
     def render_feature_nary(self,feature_nary):
         height,width,channel = self.image_shape
         feature_height = np.ceil(height * self.scale / self.cell_size).astype(int)
@@ -137,7 +196,7 @@ class BassFeatureExtractor(object):
             feature = feature_nary.reshape((feature_height, feature_width, channel))
         elif self.batch_method == "vectorized_v1":
             feature = feature_nary.reshape((feature_height, feature_width, channel))
-        elif self.batch_method == "vectorized_v2":
+        elif self.batch_method == "vectorized_v2" or self.batch_method == "reshape":
             feature = feature_nary.reshape((channel,feature_width,feature_height)).transpose((2,1,0))
         else:
             raise NotImplementedError
@@ -6,6 +6,9 @@ class HOGFeatureExtractor(object):
     Extract histogram of oriented gradients.
     Copied from https://github.com/vlfeat/vlfeat/blob/master/vl/hog.c#L596-L724
     """
+    # per image shape geometry, see get_geometry(); not pickled
+    geometries = None
+
     def __init__(
         self,
         num_orientations,
@@ -46,19 +49,102 @@ class HOGFeatureExtractor(object):
         else:
             self.n_bins = self.num_orientations
 
-        self.feature_shape = None
-        self.last_query_image_shape = ()
+        self.geometries = dict()
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state.pop("geometries", None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.geometries = dict()
+
+    def get_geometry(self, width, height):
+        """
+        Everything that only depends on the image shape, computed once per shape:
+        for each interior pixel (whose gradient is computed), the flat indices of the (up to) four neighboring cells and the bilinear weights of its contribution to them.
+        Weights of cells outside of the hog grid are 0, and their indices are clipped into the grid.
+        @return: dict with hog_width, hog_height, corner_indices of shape (4, n_pixels), corner_weights of shape (4, n_pixels) in float32
+        """
+        if self.geometries is None:
+            # pickled before the geometry cache existed
+            self.geometries = dict()
+        if (width, height) in self.geometries:
+            return self.geometries[(width, height)]
+        cell_size = self.cell_size
+
+        # pixel coordinates (of pixel centers whose grads we computed)
+        x_pixel = np.outer(
+            np.asarray(range(1,width-1)),
+            np.ones(height-2),
+        ).ravel() + 0.5
+        y_pixel = np.outer(
+            np.ones(width-2),
+            np.asarray(range(1,height-1)),
+        ).ravel() + 0.5
+
+        # cell coordinates (top-left cell center is (0,0))
+        x_cell = x_pixel / cell_size - 0.5
+        y_cell = y_pixel / cell_size - 0.5
+
+        # cell indices: range: (0 ~ hog_width-1, 0 ~ hog_height-1)
+        x_bin = np.floor(x_cell)
+        y_bin = np.floor(y_cell)
+
+        # c_ij: cell center at hog row i, hog column j
+        # c_11 ----- c_12
+        # ---- pixel ----
+        # c_21 ----- c_22
+        w_right = x_cell - x_bin
+        w_left = 1. - w_right
+        w_bottom = y_cell - y_bin
+        w_top = 1. - w_bottom
+        if hasattr(self, "contribute_to_single_cell") and self.contribute_to_single_cell:
+            f = lambda w: (np.sign(w - 0.5)+1)*0.5 # 1 if > 0.5; 0 otherwise
+            w_right = f(w_right)
+            w_left = f(w_left)
+            w_bottom = f(w_bottom)
+            w_top = f(w_top)
+
+        hog_width = int((width + cell_size/2) // cell_size)
+        hog_height = int((height + cell_size/2) // cell_size)
+        n_cells = hog_width * hog_height
+
+        # cell indices: (x, y); order: topleft, topright, bottomleft, bottomright
+        index_topleft = (x_bin * hog_height + y_bin).astype(np.int64)
+        corner_indices = np.clip(
+            np.asarray([
+                index_topleft,
+                index_topleft + hog_height,
+                index_topleft + 1,
+                index_topleft + 1 + hog_height,
+            ]),
+            0, n_cells - 1,
+        )
+        corner_weights = np.asarray([
+            w_top * w_left * (x_bin >= 0) * (y_bin >= 0),
+            w_top * w_right * (x_bin < hog_width - 1) * (y_bin >= 0),
+            w_bottom * w_left * (x_bin >= 0) * (y_bin < hog_height - 1),
+            w_bottom * w_right * (x_bin < hog_width - 1) * (y_bin < hog_height - 1),
+        ]).astype(np.float32)
+
+        geometry = dict(
+            hog_width=hog_width,
+            hog_height=hog_height,
+            corner_indices=corner_indices,
+            corner_weights=corner_weights,
+        )
+        self.geometries[(width, height)] = geometry
+        return geometry
 
     def get_feature_shape(self,image_shape):
         """
-        Not optimized yet. Hopefully this function is not called frequently.
         @param image_shape: (n_channel, width, height)
         """
-        if self.feature_shape is None or self.last_query_image_shape != image_shape:
-            features = self.compute_hogs(np.zeros((1,)+image_shape))
-            self.feature_shape = features.shape[1:]
-        self.last_query_image_shape = image_shape
-        return self.feature_shape
+        n_channel, width, height = image_shape
+        geometry = self.get_geometry(width, height)
+        return (self.n_bins, geometry["hog_width"], geometry["hog_height"])
 
     def get_feature_length(self, image_shape):
         return np.prod(self.get_feature_shape(image_shape))
@@ -66,23 +152,15 @@ class HOGFeatureExtractor(object):
 
     def compute_hogs(self,images):
         """
-        @return: histogram of oriented gradients of shape (batch_size, n_bins, width, height)
+        @return: histogram of oriented gradients of shape (batch_size, n_bins, width, height), in float32
         """
         assert len(images.shape) == 4
-        hogs_u = self.compute_unnormalized_hogs(images)
+        hogs = self.compute_unnormalized_hogs(images)
         # shape: (batch_size, n_bins, hog_width, hog_height)
 
         if self.variant == "vanilla":
             # normalize within each cell
-            hogs = []
-            for hog_u in hogs_u:
-                normalizers = np.maximum(1e-6,np.sum(hog_u,axis=0))
-                hog = np.asarray([
-                    h / normalizers
-                    for h in hog_u
-                ])
-                hogs.append(hog)
-            hogs = np.asarray(hogs)
+            hogs /= np.maximum(1e-6, np.sum(hogs, axis=1, keepdims=True))
         else:
             raise NotImplementedError
 
@@ -90,117 +168,48 @@ class HOGFeatureExtractor(object):
 
     def compute_unnormalized_hogs(self, images):
         """
-        @return unnormalized histogram of oriented gradients; shape: (batch_size, n_bins, hog_width, hog_height)
+        Histograms of the whole batch are accumulated in one flat array of shape (batch_size * n_bins * n_cells), by one np.bincount per neighboring cell.
+        @return unnormalized histogram of oriented gradients; shape: (batch_size, n_bins, hog_width, hog_height), in float32
         """
-        cell_size = self.cell_size
-        num_orientations = self.num_orientations
+        batch_size, n_channel, width, height = images.shape
         n_bins = self.n_bins
-        batch_orientations, batch_orientation_weights, batch_grad_norms = self.compute_discretized_grads(images)
-        hogs_u = []
-        for image, orientations, orientation_weights, grad_norms in \
-            zip(images, batch_orientations,batch_orientation_weights,batch_grad_norms):
-            n_channel, width, height = image.shape
-
-            # pixel coordinates (of pixel centers whose grads we computed)
-            x_pixel = np.outer(
-                np.asarray(range(1,width-1)),
-                np.ones(height-2),
-            ) + 0.5
-            y_pixel = np.outer(
-                np.ones(width-2),
-                np.asarray(range(1,height-1)),
-            ) + 0.5
-
-            # cell coordinates (top-left cell center is (0,0))
-            x_cell = x_pixel / cell_size - 0.5
-            y_cell = y_pixel / cell_size - 0.5
-
-            # cell indices: range: (0 ~ hog_width-1, 0 ~ hog_height-1)
-            x_bin = np.floor(x_cell)
-            y_bin = np.floor(y_cell)
-
-            # c_ij: cell center at hog row i, hog column j
-            # c_11 ----- c_12
-            # ---- pixel ----
-            # c_21 ----- c_22
-            w_right = x_cell - x_bin
-            w_left = 1. - w_right
-            w_bottom = y_cell - y_bin
-            w_top = 1. - w_bottom
-            if hasattr(self, "contribute_to_single_cell") and self.contribute_to_single_cell:
-                f = lambda w: (np.sign(w - 0.5)+1)*0.5 # 1 if > 0.5; 0 otherwise
-                w_right = f(w_right)
-                w_left = f(w_left)
-                w_bottom = f(w_bottom)
-                w_top = f(w_top)
-
-            hog_width = int((width + cell_size/2) // cell_size)
-            hog_height = int((height + cell_size/2) // cell_size)
-            hog_flat = np.zeros(
-                n_bins * hog_width * hog_height,
-                dtype=float
-            )
-
-            # hog indices: (bin, x, y)
-            indices_topleft = np.clip(
-                orientations * hog_width * hog_height + x_bin * hog_height + y_bin,
-                0,len(hog_flat)-1,
-            ).astype(int).ravel()
-            indices_topright = np.clip(
-                indices_topleft + hog_height,
-                0,len(hog_flat)-1,
-            )
-            indices_bottomleft = np.clip(
-                indices_topleft + 1,
-                0,len(hog_flat)-1,
-            )
-            indices_bottomright = np.clip(
-                indices_bottomleft + hog_height,
-                0,len(hog_flat)-1,
+        geometry = self.get_geometry(width, height)
+        hog_width, hog_height = geometry["hog_width"], geometry["hog_height"]
+        n_cells = hog_width * hog_height
+        hog_len = batch_size * n_bins * n_cells
+
+        orientations, orientation_weights, grad_norms = self.compute_discretized_grads(images)
+        contributions = (grad_norms * orientation_weights).reshape((batch_size, -1))
+        # hog indices: (image, bin, x, y), without the cell offsets
+        base_indices = (
+            np.arange(batch_size, dtype=np.int64)[:, None] * n_bins + \
+            orientations.reshape((batch_size, -1))
+        ) * n_cells
+
+        hogs_flat = np.zeros(hog_len, dtype=np.float64)
+        for corner_indices, corner_weights in \
+            zip(geometry["corner_indices"], geometry["corner_weights"]):
+            hogs_flat += np.bincount(
+                (base_indices + corner_indices).ravel(),
+                weights=(contributions * corner_weights).ravel(),
+                minlength=hog_len,
             )
-
-            contributions = grad_norms * orientation_weights
-            add_topleft =  contributions * w_top * w_left * \
-                (x_bin >= 0) * (y_bin >= 0)
-            add_topright = contributions * w_top * w_right * \
-                (x_bin < hog_width - 1) * (y_bin >= 0)
-            add_bottomleft = contributions * w_bottom * w_left * \
-                (x_bin >= 0) * (y_bin < hog_height - 1)
-            add_bottomright = contributions * w_bottom * w_right * \
-                (x_bin < hog_width - 1) * (y_bin < hog_height - 1)
-            np.add.at(
-                hog_flat,
-                indices_topleft,
-                add_topleft.ravel(),
-            )
-            np.add.at(
-                hog_flat,
-                indices_topright,
-                add_topright.ravel(),
-            )
-            np.add.at(
-                hog_flat,
-                indices_bottomleft,
-                add_bottomleft.ravel(),
-            )
-            np.add.at(
-                hog_flat,
-                indices_bottomright,
-                add_bottomright.ravel(),
-            )
-            hog = hog_flat.reshape(
-                (n_bins,hog_width,hog_height)
-            )
-            hogs_u.append(hog)
-
-        return np.asarray(hogs_u)
+        return hogs_flat.astype(np.float32).reshape(
+            (batch_size, n_bins, hog_width, hog_height)
+        )
 
 
     def compute_discretized_grads(self, images):
+        """
+        @return: orientations (bin indices), orientation_weights and grad_norms, each of shape (batch_size, width-2, height-2)
+        """
         num_orientations = self.num_orientations
         oriented = self.oriented
-        n_bins = self.n_bins
         # beware that opencv uses (index, height, width, channel)
+        images = np.asarray(images)
+        if not np.issubdtype(images.dtype, np.floating):
+            # also avoids wrapping around in the differences of uint8 images
+            images = images.astype(np.float32)
         batch_size, n_channel, width, height = images.shape
         # x: width / column, y: height / row
 
@@ -209,46 +218,50 @@ class HOGFeatureExtractor(object):
         all_grad_x = images[:,:,2:,1:-1] - images[:,:,:-2,1:-1]
         all_grad_y = images[:,:,1:-1,2:] - images[:,:,1:-1,:-2]
         all_gradnorm2 = all_grad_x ** 2 + all_grad_y ** 2
-        max_gradnorm2_channel = np.argmax(all_gradnorm2,axis=1)
-        grad_x = np.asarray([
-            np.choose(image_max_gradnorm2_channel,image_grad_x)
-            for image_max_gradnorm2_channel, image_grad_x in zip(max_gradnorm2_channel,all_grad_x)
-        ])
-        grad_y = np.asarray([
-            np.choose(image_max_gradnorm2_channel,image_grad_y)
-            for image_max_gradnorm2_channel, image_grad_y in zip(max_gradnorm2_channel,all_grad_y)
-        ])
-        grad_norms = np.sqrt(np.max(all_gradnorm2,axis=1))
-
-        half_orientation_weights = np.asarray(
-            [
-                grad_x * ox + grad_y * oy
-                for ox,oy in zip(self.orientation_x, self.orientation_y)
-            ]
-        ) # shape: (bin_index, batch_index, x, y)
-
-        half_orientations = np.argmax(
-            np.abs(half_orientation_weights),
-            axis=0,
-        )
-        if oriented:
-            signed_orientation_weights = np.choose(
-                half_orientations,
-                half_orientation_weights
-            )
-            orientation_weight_signs = np.sign(signed_orientation_weights)
+        if n_channel == 1:
+            grad_x = all_grad_x[:,0]
+            grad_y = all_grad_y[:,0]
+            grad_norms = np.sqrt(all_gradnorm2[:,0])
+        else:
+            max_gradnorm2_channel = np.argmax(all_gradnorm2,axis=1)[:,None]
+            grad_x = np.take_along_axis(all_grad_x, max_gradnorm2_channel, axis=1)[:,0]
+            grad_y = np.take_along_axis(all_grad_y, max_gradnorm2_channel, axis=1)[:,0]
+            grad_norms = np.sqrt(np.take_along_axis(all_gradnorm2, max_gradnorm2_channel, axis=1)[:,0])
+        # the projections decide the bins, so compute them in double precision regardless of the image dtype
+        grad_x = grad_x.astype(np.float64)
+        grad_y = grad_y.astype(np.float64)
+
+        # argmax of |projection| over the orientations, i.e. the orientation closest to the gradient angle (mod pi).
+        # Round the angle to the closest orientation, then compare the projections on it and its two neighbors, which covers rounding errors;
+        # among equal projections the smallest orientation wins, as with np.argmax over all orientations
+        closest = np.rint(
+            np.arctan2(grad_y, grad_x) * (num_orientations / np.pi)
+        ).astype(np.int64) % num_orientations
+        half_orientations = None
+        for offset in [0, -1, 1]:
+            candidates = (closest + offset) % num_orientations
+            weights = grad_x * self.orientation_x[candidates] + grad_y * self.orientation_y[candidates]
+            abs_weights = np.abs(weights)
+            if half_orientations is None:
+                half_orientations = candidates
+                signed_orientation_weights = weights
+                max_abs_weights = abs_weights
+            else:
+                better = (abs_weights > max_abs_weights) | \
+                    ((abs_weights == max_abs_weights) & (candidates < half_orientations))
+                np.copyto(half_orientations, candidates, where=better)
+                np.copyto(signed_orientation_weights, weights, where=better)
+                np.copyto(max_abs_weights, abs_weights, where=better)
 
+        if oriented:
             # convert to orientations in [0,2*pi]
-            orientations = (
-                half_orientations + \
-                (1 - orientation_weight_signs)/2 * num_orientations
-            ).astype(int)
-            orientation_weights = np.abs(signed_orientation_weights)
+            orientations = half_orientations + \
+                num_orientations * (signed_orientation_weights < 0)
         else:
             orientations = half_orientations
-            orientation_weights = half_orientation_weights
+        orientation_weights = max_abs_weights.astype(np.float32)
 
-        return orientations, orientation_weights, grad_norms
+        return orientations, orientation_weights, grad_norms.astype(np.float32)
 
     def generate_edge_map(self,feature,cell_pixels=20):
         """
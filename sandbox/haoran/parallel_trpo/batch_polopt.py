@@ -11,6 +11,10 @@ import rllab.plotter as plotter
 from rllab.misc import ext
 from sandbox.haoran.parallel_trpo.sampler import WorkerBatchSampler
 from sandbox.adam.parallel.util import SimpleContainer
+from rllab.sampler.shm_transport import SharedCounter
+from sandbox.adam.parallel.sampling_pipeline import SamplingPipeline
+from sandbox.haoran.parallel_trpo.stats_bus import StatsBus, BarrierTimer
+from sandbox.haoran.hashing.bonus_trpo.bonus_evaluators.hash.memmap_count_store import MemmapCountStore
 # from rllab.policies.base import Policy
 
 
@@ -44,6 +48,8 @@ class ParallelBatchPolopt(RLAlgorithm):
             set_cpu_affinity=False,
             cpu_assignments=None,
             serial_compile=True,
+            work_stealing=False,
+            sampling_staleness=0,
             clip_reward=False,
             bonus_evaluator=None,
             extra_bonus_evaluator=None,
@@ -53,6 +59,10 @@ class ParallelBatchPolopt(RLAlgorithm):
             avoid_duplicate_paths=False,
             path_replayer=None,
             tmax=-1,
+            sampling_key_chunk_size=None,
+            keep_count_targets=False,
+            use_stats_bus=False,
+            log_barrier_waits=False,
             **kwargs
     ):
         """
@@ -74,6 +84,21 @@ class ParallelBatchPolopt(RLAlgorithm):
         :param positive_adv: Whether to shift the advantages so that they are always positive. When used in
         conjunction with center_adv the advantages will be standardized before shifting.
         :param store_paths: Whether to save all paths data to the snapshot.
+        :param work_stealing: Whether the ranks collect batch_size samples together, each rank sampling until the
+        total reaches batch_size, instead of batch_size // n_parallel samples each.
+        :param sampling_staleness: If positive, every rank has a sampler process that collects the next batches while
+        the rank optimizes on the current one, with a policy at most this many updates behind (see SamplingPipeline).
+        The algo should then correct for the samples coming from an older policy (see ParallelTRPO).
+        :param sampling_key_chunk_size: If not None, the bonus evaluator's keys are computed while sampling, every
+        this many steps, instead of after sampling. Then only the keys are kept in the paths.
+        :param keep_count_targets: Whether to still store the count targets (env_infos) in the paths when the keys
+        are computed while sampling, e.g. for a resetter that needs them.
+        :param use_stats_bus: Whether the diagnostics, and the statistics of the baseline and bonus evaluator if they
+        support it (init_stats_bus()), go through one StatsBus with one barrier per iteration, instead of a barrier or
+        two per component. The bonus evaluator then increments its counts after the barrier, in place in its hash
+        (the count deltas themselves are not on the bus).
+        :param log_barrier_waits: Whether to log the time the ranks wait at the barriers of each phase (see
+        BarrierTimer).
         """
         self.env = env
         self.policy = policy
@@ -95,8 +120,14 @@ class ParallelBatchPolopt(RLAlgorithm):
         self.set_cpu_affinity = set_cpu_affinity
         self.cpu_assignments = cpu_assignments
         self.serial_compile = serial_compile
+        self.work_stealing = work_stealing
         self.worker_batch_size = batch_size // n_parallel
         self.n_steps_collected = 0  # (set by sampler)
+        self.sampling_time = 0.  # (set by sampler)
+        self.sampling_staleness = sampling_staleness
+        self.batch_staleness = 0  # (set by sampling pipeline)
+        self.sampling_wait_time = 0.  # (set by sampling pipeline)
+        self.itr_n_steps = 0  # (rank 0, set by the diagnostics)
         self.avoid_duplicate_paths = avoid_duplicate_paths
         self.sampler = WorkerBatchSampler(self)
         self.clip_reward = clip_reward
@@ -110,8 +141,20 @@ class ParallelBatchPolopt(RLAlgorithm):
         self.log_memory_usage = log_memory_usage
         self.path_replayer = path_replayer
         self.tmax = tmax
+        self.sampling_key_chunk_size = sampling_key_chunk_size
+        self.keep_count_targets = keep_count_targets
+        if sampling_staleness > 0 and sampling_key_chunk_size is not None:
+            # the samplers' copies of the bonus evaluator would not see its updates
+            raise NotImplementedError
+        self.use_stats_bus = use_stats_bus
+        if use_stats_bus and path_replayer is not None:
+            # the replayed paths would update the counts a second time in the iteration
+            raise NotImplementedError
+        self.log_barrier_waits = log_barrier_waits
+        self.stats_bus = None
+        self.barrier_timer = None
 
-        self.unpicklable_list = ["_par_objs","manager","shared_dict"]
+        self.unpicklable_list = ["_par_objs","manager","shared_dict","stats_bus","barrier_timer"]
 
     def __getstate__(self):
         """ Do not pickle parallel objects. """
@@ -133,37 +176,58 @@ class ParallelBatchPolopt(RLAlgorithm):
         """
         n = self.n_parallel
         self.rank = None
-        shareds = SimpleContainer(
-            sum_discounted_return=mp.RawArray('d', n),
-            num_traj=mp.RawArray('i', n),
-            sum_return=mp.RawArray('d', n),
-            max_return=mp.RawArray('d', n),
-            min_return=mp.RawArray('d', n),
-            sum_raw_return=mp.RawArray('d', n),
-            max_raw_return=mp.RawArray('d', n),
-            min_raw_return=mp.RawArray('d', n),
-            max_bonus=mp.RawArray('d', n),
-            min_bonus=mp.RawArray('d', n),
-            sum_bonus=mp.RawArray('d', n),
-            sum_path_len=mp.RawArray('i',n),
-            max_path_len=mp.RawArray('i',n),
-            min_path_len=mp.RawArray('i',n),
-            num_steps=mp.RawArray('i', n),
-            num_valids=mp.RawArray('d', n),
-            sum_ent=mp.RawArray('d', n),
-        )
+        # (name, typecode): one value per rank, for log_diagnostics()
+        diagnostics_fields = [
+            ("sum_discounted_return", 'd'),
+            ("num_traj", 'i'),
+            ("sum_return", 'd'),
+            ("max_return", 'd'),
+            ("min_return", 'd'),
+            ("sum_raw_return", 'd'),
+            ("max_raw_return", 'd'),
+            ("min_raw_return", 'd'),
+            ("max_bonus", 'd'),
+            ("min_bonus", 'd'),
+            ("sum_bonus", 'd'),
+            ("sum_path_len", 'i'),
+            ("max_path_len", 'i'),
+            ("min_path_len", 'i'),
+            ("num_steps", 'i'),
+            ("num_valids", 'd'),
+            ("sum_ent", 'd'),
+            ("sampling_time", 'd'),
+        ]
         ##HT: for explained variance (yeah I know it's clumsy)
+        baseline_stats_fields = [
+            ("y_sum_vec", 'd'),
+            ("y_square_sum_vec", 'd'),
+            ("y_pred_error_sum_vec", 'd'),
+            ("y_pred_error_square_sum_vec", 'd'),
+        ]
+        if self.use_stats_bus:
+            self.stats_bus = StatsBus(n)
+            for name, typecode in diagnostics_fields + baseline_stats_fields:
+                self.stats_bus.declare(name, typecode)
+            for component in self.stats_bus_components():
+                component.init_stats_bus(self.stats_bus)
+            self.stats_bus.allocate()
+            shareds = self.stats_bus.fields_container([name for name, _ in diagnostics_fields])
+            baseline_stats = self.stats_bus.fields_container([name for name, _ in baseline_stats_fields])
+        else:
+            shareds = SimpleContainer(**dict(
+                (name, mp.RawArray(typecode, n)) for name, typecode in diagnostics_fields))
+            baseline_stats = SimpleContainer(**dict(
+                (name, mp.RawArray(typecode, n)) for name, typecode in baseline_stats_fields))
         shareds.append(
-            baseline_stats=SimpleContainer(
-                y_sum_vec=mp.RawArray('d',n),
-                y_square_sum_vec=mp.RawArray('d',n),
-                y_pred_error_sum_vec=mp.RawArray('d',n),
-                y_pred_error_square_sum_vec=mp.RawArray('d',n),
-            )
+            n_steps_claimed=[SharedCounter(), SharedCounter()],
+            baseline_stats=baseline_stats,
         )
         barriers = SimpleContainer(
             dgnstc=mp.Barrier(n),
+            sampling=mp.Barrier(n),
         )
+        if self.sampling_staleness > 0:
+            shareds.append(sampling_pipeline=SamplingPipeline(self.policy, n, self.sampling_staleness))
         self._par_objs = (shareds, barriers)
         self.baseline.init_par_objs(n_parallel=n)
         if self.bonus_evaluator is not None:
@@ -222,6 +286,8 @@ class ParallelBatchPolopt(RLAlgorithm):
         if self.serial_compile:
             self.force_compile()
         self.init_par_objs()
+        if self.log_barrier_waits:
+            self.init_barrier_timer()
         self.manager = mp.Manager()
         self.shared_dict = self.manager.dict()
 
@@ -235,13 +301,49 @@ class ParallelBatchPolopt(RLAlgorithm):
             for p in processes:
                 p.join()
 
+    def stats_bus_components(self):
+        """ the baseline and bonus evaluator if they put their statistics on the stats bus """
+        return [
+            component for component in [self.baseline, self.bonus_evaluator]
+            if hasattr(component, "init_stats_bus")
+        ]
+
+    def init_barrier_timer(self):
+        """ Times the barriers of all parallel components, by phase. (called after init_par_objs()) """
+        timer = BarrierTimer(
+            self.n_parallel, ["sampling", "diagnostics", "stats_bus", "bonus", "baseline", "optimizer"])
+        _, barriers = self._par_objs
+        timer.wrap(barriers, "sampling", names=["sampling"])
+        timer.wrap(barriers, "diagnostics", names=["dgnstc"])
+        if self.stats_bus is not None:
+            timer.wrap(self.stats_bus.__dict__, "stats_bus", names=["barrier"])
+        for phase, components in [
+                ("bonus", getattr(self.bonus_evaluator, "bonus_evaluators", [self.bonus_evaluator])),
+                ("baseline", [self.baseline]),
+                ("optimizer", [self.optimizer, getattr(self.optimizer, "_hvp_approach", None)])]:
+            for component in components:
+                if hasattr(component, "_par_objs"):
+                    timer.wrap(component._par_objs[1], phase)
+        if hasattr(self.optimizer, "_cg_par_objs"):
+            timer.wrap(self.optimizer._cg_par_objs, "optimizer")
+        self.barrier_timer = timer
+
+    def fuse_bonus_computation(self):
+        """ whether the bonus evaluator computes the bonuses and updates its counts in one pass """
+        return self.bonus_evaluator is not None and hasattr(self.bonus_evaluator, "compute_bonuses")
+
     def process_paths(self, paths):
-        for path in paths:
+        if self.fuse_bonus_computation():
+            # also replaces bonus_evaluator.fit_before_process_samples()
+            all_bonuses = self.bonus_evaluator.compute_bonuses(paths)
+        elif self.bonus_evaluator is not None:
+            all_bonuses = [self.bonus_evaluator.predict(path) for path in paths]
+        for i, path in enumerate(paths):
             path["raw_rewards"] = np.copy(path["rewards"])
             if self.clip_reward:
                 path["rewards"] = np.clip(path["raw_rewards"],-1,1)
             if self.bonus_evaluator is not None:
-                path["bonus_rewards"] = self.bonus_coeff * self.bonus_evaluator.predict(path)
+                path["bonus_rewards"] = self.bonus_coeff * all_bonuses[i]
                 path["rewards"] = path["rewards"] + path["bonus_rewards"]
 
     def init_shared_dict(self,shared_dict):
@@ -252,25 +354,33 @@ class ParallelBatchPolopt(RLAlgorithm):
     def _train(self, rank, shared_dict):
         self.init_rank(rank)
         self.init_shared_dict(shared_dict)
+        if self.sampling_staleness > 0:
+            self._par_objs[0].sampling_pipeline.start(self)
         if self.rank == 0:
             start_time = time.time()
         for itr in range(self.current_itr, self.n_itr):
+            itr_start_time = time.time()
+            if self.barrier_timer is not None:
+                self.barrier_timer.start_itr(itr)
             with logger.prefix('itr #%d | ' % itr):
                 self.update_algo_params(itr)
                 if rank == 0:
                     logger.log("Collecting samples ...")
-                paths = self.sampler.obtain_samples()
+                paths = self.obtain_samples()
                 if rank == 0:
                     logger.log("Processing paths...")
                 self.process_paths(paths)
-                if self.bonus_evaluator is not None:
+                if self.bonus_evaluator is not None and not self.fuse_bonus_computation():
                     if rank == 0:
                         logger.log("fitting bonus evaluator...")
                     self.bonus_evaluator.fit_before_process_samples(paths)
                 if rank == 0:
                     logger.log("processing samples...")
                 samples_data, dgnstc_data = self.sampler.process_samples(paths)
-                self.log_diagnostics(itr, samples_data, dgnstc_data)  # (parallel)
+                if self.stats_bus is not None:
+                    self.sync_stats(itr, samples_data, dgnstc_data, paths)  # (parallel)
+                else:
+                    self.log_diagnostics(itr, samples_data, dgnstc_data)  # (parallel)
                 if rank == 0:
                     logger.log("optimizing policy...")
 
@@ -284,10 +394,13 @@ class ParallelBatchPolopt(RLAlgorithm):
                         ])
                     self.path_replayer.record_paths(paths)
                 self.optimize_policy(itr, samples_data)  # (parallel)
+                if self.sampling_staleness > 0 and rank == 0:
+                    self._par_objs[0].sampling_pipeline.broadcast(self.policy.get_param_values())
                 if rank == 0:
                     logger.log("fitting baseline...")
                 # self.baseline.fit_by_samples_data(samples_data)  # (parallel)
-                self.baseline.fit(paths)
+                if self.stats_bus is None or self.baseline not in self.stats_bus_components():
+                    self.baseline.fit(paths)
                 if rank == 0:
                     logger.log("fitted")
                     logger.log("saving snapshot...")
@@ -296,10 +409,17 @@ class ParallelBatchPolopt(RLAlgorithm):
                     if self.store_paths:
                         # NOTE: Only paths from rank==0 worker will be saved.
                         params["paths"] = samples_data["paths"]
+                    # persistent count tables only write the pages changed since the last iteration
+                    MemmapCountStore.snapshot_all()
                     logger.save_itr_params(itr, params)
                     logger.log("saved")
 
+                    if self.stats_bus is not None and self.bonus_evaluator in self.stats_bus_components():
+                        self.bonus_evaluator.record_stats_after_update()
                     logger.record_tabular("ElapsedTime",time.time()-start_time)
+                    self.record_itr_time(itr_start_time)
+                    if self.barrier_timer is not None:
+                        self.barrier_timer.record_tabular()
                     logger.dump_tabular(with_prefix=False)
                     if self.plot:
                         self.update_plot()
@@ -314,6 +434,23 @@ class ParallelBatchPolopt(RLAlgorithm):
                             process.memory_info().shared / (1024**3)
                         ))
                 self.current_itr = itr + 1
+        if self.sampling_staleness > 0:
+            self._par_objs[0].sampling_pipeline.join()
+
+    def obtain_samples(self):
+        if self.sampling_staleness > 0:
+            return self._par_objs[0].sampling_pipeline.receive(self)
+        return self.sampler.obtain_samples()
+
+    def record_itr_time(self, itr_start_time):
+        """ (rank 0, after log_diagnostics) """
+        itr_time = time.time() - itr_start_time
+        logger.record_tabular('ItrTime', itr_time)
+        logger.record_tabular('SamplesPerSec', self.itr_n_steps / itr_time)
+        if self.sampling_staleness > 0:
+            # the time rank 0 waited for its sampler, and how many updates its batch is behind
+            logger.record_tabular('SamplingWaitTime', self.sampling_wait_time)
+            logger.record_tabular('BatchStaleness', self.batch_staleness)
 
     def update_algo_params(self,itr):
         if self.path_length_scheduler is not None:
@@ -324,117 +461,148 @@ class ParallelBatchPolopt(RLAlgorithm):
     #
 
     def log_diagnostics(self, itr, samples_data, dgnstc_data):
-            shareds, barriers = self._par_objs
-
-            i = self.rank
-            shareds.sum_discounted_return[i] = \
-                np.sum([path["returns"][0] for path in samples_data["paths"]])
-            undiscounted_returns = [sum(path["rewards"]) for path in samples_data["paths"]]
-            undiscounted_raw_returns = [sum(path["raw_rewards"]) for path in samples_data["paths"]]
-            shareds.num_traj[i] = len(undiscounted_returns)
-            shareds.num_steps[i] = self.n_steps_collected
-            # shareds.num_steps[i] = sum([len(path["rewards"]) for path in samples_data["paths"]])
-            shareds.sum_return[i] = np.sum(undiscounted_returns)
-            shareds.min_return[i] = np.min(undiscounted_returns)
-            shareds.max_return[i] = np.max(undiscounted_returns)
-            shareds.sum_raw_return[i] = np.sum(undiscounted_raw_returns)
-            shareds.min_raw_return[i] = np.min(undiscounted_raw_returns)
-            shareds.max_raw_return[i] = np.max(undiscounted_raw_returns)
+        _, barriers = self._par_objs
+        self.put_diagnostics(samples_data, dgnstc_data)
+        barriers.dgnstc.wait()
+        if self.rank == 0:
+            self.record_diagnostics(itr)
 
-            if self.bonus_evaluator is not None:
-                # bonuses
-                bonuses = np.concatenate([path["bonus_rewards"] for path in samples_data["paths"]])
-                shareds.max_bonus[i] = np.max(bonuses)
-                shareds.min_bonus[i] = np.min(bonuses)
-                shareds.sum_bonus[i] = np.sum(bonuses)
-
-            if not self.policy.recurrent:
-                shareds.sum_ent[i] = np.sum(self.policy.distribution.entropy(
-                    samples_data["agent_infos"]))
-                shareds.num_valids[i] = 0
-            else:
-                raise NotImplementedError
-                shareds.sum_ent[i] = np.sum(self.policy.distribution.entropy(
-                    samples_data["agent_infos"]) * samples_data["valids"])
-                shareds.num_valids[i] = np.sum(samples_data["valids"])
-
-            # explained variance
-            y_pred = np.concatenate(dgnstc_data["baselines"])
-            y = np.concatenate(dgnstc_data["returns"])
-            shareds.baseline_stats.y_sum_vec[i] = np.sum(y)
-            shareds.baseline_stats.y_square_sum_vec[i] = np.sum(y**2)
-            shareds.baseline_stats.y_pred_error_sum_vec[i] = np.sum(y-y_pred)
-            shareds.baseline_stats.y_pred_error_square_sum_vec[i] = np.sum((y-y_pred)**2)
-
-            # path lengths
-            path_lens = [len(path["rewards"]) for path in samples_data["paths"]]
-            shareds.sum_path_len[i] = np.sum(path_lens)
-            shareds.max_path_len[i] = np.amax(path_lens)
-            shareds.min_path_len[i] = np.amin(path_lens)
-
-            barriers.dgnstc.wait()
-
-            if self.rank == 0:
-                num_traj = sum(shareds.num_traj)
-                n_steps = sum(shareds.num_steps)
-
-                average_discounted_return = \
-                    sum(shareds.sum_discounted_return) / num_traj
-                if self.policy.recurrent:
-                    ent = sum(shareds.sum_ent) / sum(shareds.num_valids)
-                else:
-                    ent = sum(shareds.sum_ent) / sum(shareds.num_steps)
-                average_return = sum(shareds.sum_return) / num_traj
-                max_return = max(shareds.max_return)
-                min_return = min(shareds.min_return)
-
-                average_raw_return = sum(shareds.sum_raw_return) / num_traj
-                max_raw_return = max(shareds.max_raw_return)
-                min_raw_return = min(shareds.min_raw_return)
-
-                if self.bonus_evaluator is not None:
-                    max_bonus = max(shareds.max_bonus)
-                    min_bonus = min(shareds.min_bonus)
-                    average_bonus = sum(shareds.sum_bonus) / n_steps
-
-                # compute explained variance
-                y_mean = sum(shareds.baseline_stats.y_sum_vec) / n_steps
-                y_square_mean = sum(shareds.baseline_stats.y_square_sum_vec) / n_steps
-                y_pred_error_mean = sum(shareds.baseline_stats.y_pred_error_sum_vec) / n_steps
-                y_pred_error_square_mean = sum(shareds.baseline_stats.y_pred_error_square_sum_vec) / n_steps
-                y_var = y_square_mean - y_mean**2
-                y_pred_error_var = y_pred_error_square_mean - y_pred_error_mean**2
-                if np.isclose(y_var,0):
-                    ev = 0 # different from special.exaplained_variance_1d
-                else:
-                    ev = 1 - y_pred_error_var / (y_var + 1e-8)
-
-                # path lens
-                avg_path_len = sum(shareds.sum_path_len) / float(num_traj)
-                max_path_len = max(shareds.max_path_len)
-                min_path_len = min(shareds.min_path_len)
-
-                logger.record_tabular('Iteration', itr)
-                logger.record_tabular('ExplainedVariance', ev)
-                logger.record_tabular('NumTrajs', num_traj)
-                logger.record_tabular('NumSamples',n_steps)
-                logger.record_tabular('Entropy', ent)
-                logger.record_tabular('Perplexity', np.exp(ent))
-                # logger.record_tabular('StdReturn', np.std(undiscounted_returns))
-                logger.record_tabular('AverageDiscountedReturn', average_discounted_return)
-                logger.record_tabular('ReturnAverage', average_return)
-                logger.record_tabular('ReturnMax', max_return)
-                logger.record_tabular('ReturnMin', min_return)
-                logger.record_tabular('RawReturnAverage', average_raw_return)
-                logger.record_tabular('RawReturnMax', max_raw_return)
-                logger.record_tabular('RawReturnMin', min_raw_return)
-                logger.record_tabular('PathLenAverage',avg_path_len)
-                logger.record_tabular('PathLenMax',max_path_len)
-                logger.record_tabular('PathLenMin',min_path_len)
-                if self.bonus_evaluator is not None:
-                    logger.record_tabular('BonusRewardMax',max_bonus)
-                    logger.record_tabular('BonusRewardMin',min_bonus)
-                    logger.record_tabular('BonusRewardAverage',average_bonus)
+    def sync_stats(self, itr, samples_data, dgnstc_data, paths):
+        """
+        In place of log_diagnostics(), the count update of the bonus evaluator and the fit of the baseline (if they
+        support the stats bus), with one barrier: the ranks put their statistics and the baseline's normal equations
+        on the stats bus, then rank 0 logs and solves, and every rank increments the counts of its keys in place.
+        (before optimize_policy(), whose barriers separate these updates from the next iteration)
+        """
+        self.put_diagnostics(samples_data, dgnstc_data)
+        if self.baseline in self.stats_bus_components():
+            self.baseline.put_stats(paths)
+        self.stats_bus.sync()
+        if self.rank == 0:
+            self.record_diagnostics(itr)
+        for component in self.stats_bus_components():
+            component.reduce_stats()
+
+    def put_diagnostics(self, samples_data, dgnstc_data):
+        shareds, _ = self._par_objs
+
+        i = self.rank
+        shareds.sum_discounted_return[i] = \
+            np.sum([path["returns"][0] for path in samples_data["paths"]])
+        undiscounted_returns = [sum(path["rewards"]) for path in samples_data["paths"]]
+        undiscounted_raw_returns = [sum(path["raw_rewards"]) for path in samples_data["paths"]]
+        shareds.num_traj[i] = len(undiscounted_returns)
+        shareds.num_steps[i] = self.n_steps_collected
+        shareds.sampling_time[i] = self.sampling_time
+        # shareds.num_steps[i] = sum([len(path["rewards"]) for path in samples_data["paths"]])
+        shareds.sum_return[i] = np.sum(undiscounted_returns)
+        shareds.min_return[i] = np.min(undiscounted_returns)
+        shareds.max_return[i] = np.max(undiscounted_returns)
+        shareds.sum_raw_return[i] = np.sum(undiscounted_raw_returns)
+        shareds.min_raw_return[i] = np.min(undiscounted_raw_returns)
+        shareds.max_raw_return[i] = np.max(undiscounted_raw_returns)
+
+        if self.bonus_evaluator is not None:
+            # bonuses
+            bonuses = np.concatenate([path["bonus_rewards"] for path in samples_data["paths"]])
+            shareds.max_bonus[i] = np.max(bonuses)
+            shareds.min_bonus[i] = np.min(bonuses)
+            shareds.sum_bonus[i] = np.sum(bonuses)
+
+        if not self.policy.recurrent:
+            shareds.sum_ent[i] = np.sum(self.policy.distribution.entropy(
+                samples_data["agent_infos"]))
+            shareds.num_valids[i] = 0
+        else:
+            raise NotImplementedError
+            shareds.sum_ent[i] = np.sum(self.policy.distribution.entropy(
+                samples_data["agent_infos"]) * samples_data["valids"])
+            shareds.num_valids[i] = np.sum(samples_data["valids"])
+
+        # explained variance
+        y_pred = np.concatenate(dgnstc_data["baselines"])
+        y = np.concatenate(dgnstc_data["returns"])
+        shareds.baseline_stats.y_sum_vec[i] = np.sum(y)
+        shareds.baseline_stats.y_square_sum_vec[i] = np.sum(y**2)
+        shareds.baseline_stats.y_pred_error_sum_vec[i] = np.sum(y-y_pred)
+        shareds.baseline_stats.y_pred_error_square_sum_vec[i] = np.sum((y-y_pred)**2)
+
+        # path lengths
+        path_lens = [len(path["rewards"]) for path in samples_data["paths"]]
+        shareds.sum_path_len[i] = np.sum(path_lens)
+        shareds.max_path_len[i] = np.amax(path_lens)
+        shareds.min_path_len[i] = np.amin(path_lens)
+
+    def record_diagnostics(self, itr):
+        """ (rank 0) """
+        shareds, _ = self._par_objs
+        num_traj = sum(shareds.num_traj)
+        n_steps = sum(shareds.num_steps)
+        # (the ranks may write the next iteration's before record_itr_time)
+        self.itr_n_steps = n_steps
+
+        average_discounted_return = \
+            sum(shareds.sum_discounted_return) / num_traj
+        if self.policy.recurrent:
+            ent = sum(shareds.sum_ent) / sum(shareds.num_valids)
+        else:
+            ent = sum(shareds.sum_ent) / sum(shareds.num_steps)
+        average_return = sum(shareds.sum_return) / num_traj
+        max_return = max(shareds.max_return)
+        min_return = min(shareds.min_return)
+
+        average_raw_return = sum(shareds.sum_raw_return) / num_traj
+        max_raw_return = max(shareds.max_raw_return)
+        min_raw_return = min(shareds.min_raw_return)
+
+        if self.bonus_evaluator is not None:
+            max_bonus = max(shareds.max_bonus)
+            min_bonus = min(shareds.min_bonus)
+            average_bonus = sum(shareds.sum_bonus) / n_steps
+
+        # compute explained variance
+        y_mean = sum(shareds.baseline_stats.y_sum_vec) / n_steps
+        y_square_mean = sum(shareds.baseline_stats.y_square_sum_vec) / n_steps
+        y_pred_error_mean = sum(shareds.baseline_stats.y_pred_error_sum_vec) / n_steps
+        y_pred_error_square_mean = sum(shareds.baseline_stats.y_pred_error_square_sum_vec) / n_steps
+        y_var = y_square_mean - y_mean**2
+        y_pred_error_var = y_pred_error_square_mean - y_pred_error_mean**2
+        if np.isclose(y_var,0):
+            ev = 0 # different from special.exaplained_variance_1d
+        else:
+            ev = 1 - y_pred_error_var / (y_var + 1e-8)
+
+        # path lens
+        avg_path_len = sum(shareds.sum_path_len) / float(num_traj)
+        max_path_len = max(shareds.max_path_len)
+        min_path_len = min(shareds.min_path_len)
+
+        logger.record_tabular('Iteration', itr)
+        logger.record_tabular('ExplainedVariance', ev)
+        logger.record_tabular('NumTrajs', num_traj)
+        logger.record_tabular('NumSamples',n_steps)
+        logger.record_tabular('Entropy', ent)
+        logger.record_tabular('Perplexity', np.exp(ent))
+        # logger.record_tabular('StdReturn', np.std(undiscounted_returns))
+        logger.record_tabular('AverageDiscountedReturn', average_discounted_return)
+        logger.record_tabular('ReturnAverage', average_return)
+        logger.record_tabular('ReturnMax', max_return)
+        logger.record_tabular('ReturnMin', min_return)
+        logger.record_tabular('RawReturnAverage', average_raw_return)
+        logger.record_tabular('RawReturnMax', max_raw_return)
+        logger.record_tabular('RawReturnMin', min_raw_return)
+        logger.record_tabular('PathLenAverage',avg_path_len)
+        logger.record_tabular('PathLenMax',max_path_len)
+        logger.record_tabular('PathLenMin',min_path_len)
+        # the fastest rank waits for the slowest one for the difference
+        logger.record_tabular('SamplingTimeMax',max(shareds.sampling_time))
+        logger.record_tabular('SamplingTimeMin',min(shareds.sampling_time))
+        logger.record_tabular('RankNumSamplesMax',max(shareds.num_steps))
+        logger.record_tabular('RankNumSamplesMin',min(shareds.num_steps))
+        if self.bonus_evaluator is not None:
+            logger.record_tabular('BonusRewardMax',max_bonus)
+            logger.record_tabular('BonusRewardMin',min_bonus)
+            logger.record_tabular('BonusRewardAverage',average_bonus)
 
 
         # NOTE: These others might only work if all path data is collected
@@ -456,6 +624,8 @@ class ParallelBatchPolopt(RLAlgorithm):
         self.optimizer.init_rank(rank)
         if self.bonus_evaluator is not None:
             self.bonus_evaluator.init_rank(rank)
+        if self.barrier_timer is not None:
+            self.barrier_timer.init_rank(rank)
         seed = ext.get_seed()
         if seed is None:
             # NOTE: Not sure if this is a good source for seed?
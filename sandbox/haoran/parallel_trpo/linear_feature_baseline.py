@@ -17,11 +17,12 @@ class ParallelLinearFeatureBaseline(LinearFeatureBaseline):
             self.feat_mat = np.zeros([self._vec_dim, self._vec_dim])
             self.target_vec = np.zeros([self._vec_dim, ])
             self.path_vec = np.zeros([1, self._vec_dim])
+        self.stats_bus = None
         super().__init__(env_spec, reg_coeff)
 
     def __getstate__(self):
         """ Do not try to serialize parallel objects."""
-        return {k: v for k, v in iter(self.__dict__.items()) if k != "_par_objs"}
+        return {k: v for k, v in iter(self.__dict__.items()) if k not in ["_par_objs", "stats_bus"]}
 
     def force_compile(self):
         pass
@@ -39,14 +40,18 @@ class ParallelLinearFeatureBaseline(LinearFeatureBaseline):
         """
         self.rank = None
         shareds = SimpleContainer(
-            feat_mat=np.reshape(
-                np.frombuffer(mp.RawArray('d', (self._vec_dim ** 2) * n_parallel)),
-                (self._vec_dim, self._vec_dim, n_parallel)),
-            target_vec=np.reshape(
-                np.frombuffer(mp.RawArray('d', self._vec_dim * n_parallel)),
-                (self._vec_dim, n_parallel)),
             coeffs=np.frombuffer(mp.RawArray('d', self._vec_dim)),
         )
+        if self.stats_bus is None:
+            # (on the stats bus otherwise)
+            shareds.append(
+                feat_mat=np.reshape(
+                    np.frombuffer(mp.RawArray('d', (self._vec_dim ** 2) * n_parallel)),
+                    (self._vec_dim, self._vec_dim, n_parallel)),
+                target_vec=np.reshape(
+                    np.frombuffer(mp.RawArray('d', self._vec_dim * n_parallel)),
+                    (self._vec_dim, n_parallel)),
+            )
         barriers = SimpleContainer(
             fit=[mp.Barrier(n_parallel) for _ in range(2)],
         )
@@ -56,6 +61,24 @@ class ParallelLinearFeatureBaseline(LinearFeatureBaseline):
     def init_rank(self, rank):
         self.rank = rank
 
+    def init_stats_bus(self, stats_bus):
+        """ The normal equations go through the stats bus (see ParallelBatchPolopt.sync_stats), instead of fit(). """
+        self.stats_bus = stats_bus
+        stats_bus.declare("baseline_feat_mat", shape=(self._vec_dim, self._vec_dim))
+        stats_bus.declare("baseline_target_vec", shape=(self._vec_dim,))
+
+    def put_stats(self, paths):
+        f_mat, t_vec = self._normal_equations(paths)
+        self.stats_bus.field("baseline_feat_mat")[self.rank] = f_mat
+        self.stats_bus.field("baseline_target_vec")[self.rank] = t_vec
+
+    def reduce_stats(self):
+        if self.rank == 0:
+            self._solve(
+                np.sum(self.stats_bus.field("baseline_feat_mat"), axis=0),
+                np.sum(self.stats_bus.field("baseline_target_vec"), axis=0),
+            )
+
     @overrides
     def fit(self, paths):
         """
@@ -63,35 +86,38 @@ class ParallelLinearFeatureBaseline(LinearFeatureBaseline):
         """
         shareds, barriers = self._par_objs
 
-        if self._low_mem:
-            self._features_and_targets(paths)
-            f_mat = self.feat_mat
-            t_vec = self.target_vec
-        else:
-            featmat = np.concatenate([self._features(path) for path in paths])
-            returns = np.concatenate([path["returns"] for path in paths])
-            f_mat = featmat.T.dot(featmat)
-            t_vec = featmat.T.dot(returns)
-
+        f_mat, t_vec = self._normal_equations(paths)
         shareds.feat_mat[:, :, self.rank] = f_mat
         shareds.target_vec[:, self.rank] = t_vec
         barriers.fit[0].wait()
         if self.rank == 0:
             feat_mat = np.sum(shareds.feat_mat, axis=2)
             target_vec = np.squeeze(np.sum(shareds.target_vec, axis=1))
-
-            reg_coeff = self._reg_coeff
-            for _ in range(5):
-                # NOTE: Could parallelize this loop, but fitting is usually fast.
-                shareds.coeffs[:] = np.linalg.lstsq(
-                    feat_mat + reg_coeff * np.identity(feat_mat.shape[1]),
-                    target_vec
-                )[0]
-                if not np.any(np.isnan(shareds.coeffs)):
-                    break
-                reg_coeff *= 10
+            self._solve(feat_mat, target_vec)
         barriers.fit[1].wait()
 
+    def _normal_equations(self, paths):
+        if self._low_mem:
+            self._features_and_targets(paths)
+            return self.feat_mat, self.target_vec
+        featmat = np.concatenate([self._features(path) for path in paths])
+        returns = np.concatenate([path["returns"] for path in paths])
+        return featmat.T.dot(featmat), featmat.T.dot(returns)
+
+    def _solve(self, feat_mat, target_vec):
+        """ (rank 0) """
+        shareds, _ = self._par_objs
+        reg_coeff = self._reg_coeff
+        for _ in range(5):
+            # NOTE: Could parallelize this loop, but fitting is usually fast.
+            shareds.coeffs[:] = np.linalg.lstsq(
+                feat_mat + reg_coeff * np.identity(feat_mat.shape[1]),
+                target_vec
+            )[0]
+            if not np.any(np.isnan(shareds.coeffs)):
+                break
+            reg_coeff *= 10
+
     def _features_and_targets(self, paths):
         """
         Optional: sum path data (in matrix form) rather than concatenate, to
@@ -105,7 +131,7 @@ class ParallelLinearFeatureBaseline(LinearFeatureBaseline):
         t2 = t ** 2
         t3 = t ** 3
         for path in paths:
-            obs = np.clip(path["observations"], -10, 10)
+            obs = self._observations(path)
             for o, al, al2, al3, ret in zip(obs, t, t2, t3, path["returns"]):
                 self.path_vec[:] = np.concatenate([o, o ** 2, al, al2, al3, [1.]])
                 self.feat_mat += self.path_vec.T.dot(self.path_vec)
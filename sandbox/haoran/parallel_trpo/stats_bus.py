@@ -0,0 +1,128 @@
+import multiprocessing as mp
+import multiprocessing.synchronize
+import numpy as np
+import os
+import time
+from collections import OrderedDict
+
+import rllab.misc.logger as logger
+from sandbox.adam.parallel.util import SimpleContainer
+
+# offsets of the fields in the region are multiples of this
+ALIGNMENT = 8
+
+
+class StatsBus(object):
+    """
+    One shared-memory region for the per-iteration statistics of the ranks of ParallelBatchPolopt (diagnostics,
+    state count statistics, baseline normal equations...), synchronized by a single barrier per iteration instead of
+    one or two per component.
+    Before forking, the components declare() their fields, then the bus is allocate()d. Every rank writes its row
+    of field(name), all ranks sync(), and then each component reduces the rows (usually on rank 0).
+    The region is not double-buffered: rank 0 must be done reading before the ranks pass another barrier, which
+    the barriers of the policy optimizer ensure as long as the reductions come before optimize_policy.
+    Count deltas do not go through the bus: after the barrier, each rank increments the shared counts of its own
+    keys in place, under the locks of the hash (e.g. ShardLocks), which takes no further barrier.
+    """
+
+    def __init__(self, n_parallel):
+        self.n_parallel = n_parallel
+        self.fields = OrderedDict()
+        self.size = 0
+        self.region = None
+        self.barrier = mp.Barrier(n_parallel)
+
+    def declare(self, name, typecode='d', shape=()):
+        """ a field with a value of the given shape and type (as in mp.RawArray) per rank """
+        assert self.region is None and name not in self.fields
+        dtype = np.dtype(typecode)
+        offset = -(-self.size // ALIGNMENT) * ALIGNMENT
+        self.fields[name] = (offset, dtype, tuple(shape))
+        self.size = offset + self.n_parallel * int(np.prod(shape)) * dtype.itemsize
+
+    def allocate(self):
+        """ (before forking, after all declarations) """
+        self.region = np.frombuffer(mp.RawArray('b', max(self.size, 1)), dtype=np.uint8)
+
+    def field(self, name):
+        """ :return: a view of the field, with one row per rank """
+        offset, dtype, shape = self.fields[name]
+        n_bytes = self.n_parallel * int(np.prod(shape)) * dtype.itemsize
+        return self.region[offset:offset + n_bytes].view(dtype).reshape((self.n_parallel,) + shape)
+
+    def fields_container(self, names):
+        return SimpleContainer(**dict((name, self.field(name)) for name in names))
+
+    def sync(self):
+        self.barrier.wait()
+
+
+class TimedBarrier(object):
+    """ An mp.Barrier that adds the time spent in wait() to a phase of a BarrierTimer """
+
+    def __init__(self, barrier, timer, phase):
+        self.barrier = barrier
+        self.timer = timer
+        self.phase = phase
+
+    def wait(self, timeout=None):
+        start = time.time()
+        index = self.barrier.wait(timeout)
+        self.timer.add(self.phase, time.time() - start)
+        return index
+
+
+class BarrierTimer(object):
+    """
+    Time every rank waits at the barriers of each phase of an iteration, and the number of waits, in shared memory
+    so that rank 0 can log the maximum over the ranks. Every rank starts each iteration with start_itr(); the
+    iterations alternate between two buffers, so that a rank that is ahead does not overwrite the one rank 0 logs.
+    """
+
+    def __init__(self, n_parallel, phases):
+        self.phases = list(phases)
+        shape = (2, n_parallel, len(self.phases))
+        self.wait_times = np.frombuffer(mp.RawArray('d', int(np.prod(shape)))).reshape(shape)
+        self.n_waits = np.frombuffer(mp.RawArray('l', int(np.prod(shape))), dtype=np.int_).reshape(shape)
+        self.rank = None
+        self.pid = None
+        self.buffer = 0
+
+    def init_rank(self, rank):
+        self.rank = rank
+        # processes forked by the rank (e.g. its sampler) do not count
+        self.pid = os.getpid()
+
+    def wrap(self, barriers, phase, names=None):
+        """
+        Replaces the barriers (and lists of barriers) in barriers, a SimpleContainer (e.g. the second element of
+        _par_objs) or a dict, by TimedBarriers of the phase; only the attributes in names if given.
+        (before forking)
+        """
+        phase = self.phases.index(phase)
+        items = barriers if isinstance(barriers, dict) else barriers.__dict__
+        for k, v in list(items.items()):
+            if names is not None and k not in names:
+                continue
+            if isinstance(v, mp.synchronize.Barrier):
+                items[k] = TimedBarrier(v, self, phase)
+            elif isinstance(v, list) and all(isinstance(b, mp.synchronize.Barrier) for b in v):
+                items[k] = [TimedBarrier(b, self, phase) for b in v]
+
+    def start_itr(self, itr):
+        self.buffer = itr % 2
+        self.wait_times[self.buffer, self.rank] = 0.
+        self.n_waits[self.buffer, self.rank] = 0
+
+    def add(self, phase, wait_time):
+        if os.getpid() == self.pid:
+            self.wait_times[self.buffer, self.rank, phase] += wait_time
+            self.n_waits[self.buffer, self.rank, phase] += 1
+
+    def record_tabular(self):
+        """ (rank 0, after the last barrier of the iteration) """
+        wait_times = np.max(self.wait_times[self.buffer], axis=0)
+        for phase, wait_time in zip(self.phases, wait_times):
+            logger.record_tabular('BarrierWait%s' % phase.title().replace("_", ""), wait_time)
+        logger.record_tabular('BarrierWaitTotal', np.sum(wait_times))
+        logger.record_tabular('BarrierCount', np.sum(self.n_waits[self.buffer, self.rank]))
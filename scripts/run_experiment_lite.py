@@ -30,6 +30,9 @@ def run_experiment(argv):
     parser = argparse.ArgumentParser()
     parser.add_argument('--n_parallel', type=int, default=1,
                         help='Number of parallel workers to perform rollouts. 0 => don\'t start any workers')
+    parser.add_argument('--path_transport', type=str, default='pickle',
+                        help='How the workers return the sampled paths: "pickle" (through the pool\'s pipe) or "shm" '
+                             '(arrays written to shared memory)')
     parser.add_argument(
         '--exp_name', type=str, default=default_exp_name, help='Name of the experiment.')
     parser.add_argument('--log_dir', type=str, default=None,
@@ -70,7 +73,7 @@ def run_experiment(argv):
 
     if args.n_parallel > 0:
         from rllab.sampler import parallel_sampler
-        parallel_sampler.initialize(n_parallel=args.n_parallel)
+        parallel_sampler.initialize(n_parallel=args.n_parallel, path_transport=args.path_transport)
         if args.seed is not None:
             parallel_sampler.set_seed(args.seed)
 